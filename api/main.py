@@ -1,28 +1,159 @@
-from fastapi import FastAPI, Header, File, UploadFile, Depends, HTTPException, BackgroundTasks
-from starlette.responses import FileResponse
+import asyncio
+import os
+import secrets
+import time
+from contextlib import asynccontextmanager, nullcontext
+from pathlib import Path
+
+from dotenv import load_dotenv
+from fastapi import FastAPI, Header, File, UploadFile, Depends, HTTPException, BackgroundTasks, Request, WebSocket, \
+    WebSocketDisconnect
+from fastapi.responses import Response, PlainTextResponse, FileResponse
 from datetime import datetime
-
-from data.enums import APIStatus, Platform
-from data.schemas import AnalysisResponse, AnalysisItemSchema, CropBoxSchema, TaskResponse, TaskStatus
+from typing import Optional, List
+
+from api.result_delivery import build_result_response
+from api.upload_ingest import ingest_upload, UploadLimitMiddleware, UploadRejected, MAX_UPLOAD_BYTES
+from bot_core import BOT_MODE, WEBHOOK_PATH, WEBHOOK_SECRET, build_bot_application, start_webhook_bot, \
+    stop_webhook_bot, feed_webhook_update
+from data.enums import APIStatus, Platform, BotMode, ProcessImageStatus
+from data.schemas import AnalysisResponse, AnalysisItemSchema, CropBoxSchema, TaskResponse, TaskStatus, \
+    BatchAnalysisResponse, TaskChildSchema
+from data.image_processing_results import AnalyseServiceResult
 from database.database import DeviceRegisterResponse, DeviceRegisterRequest, Connection
 from database.database_worker import DatabaseWorker
+from engine.threading_profile import threading_config
 from files.file_manager import file_manager
+from files.result_store import result_store
+from files.result_url_signer import result_url_signer
+from files.scratch_janitor import scratch_janitor
+from image.memory_budget import memory_budget
+from image.shared_image_pool import SharedImage, shared_image_pool
+from monitoring.memory_watchdog import memory_watchdog
+from monitoring.metrics import metrics, METRICS_TOKEN
+from monitoring.process_stats import process_stats
+from monitoring.profiling import profiler
+from monitoring.tracing import tracer, TraceContext
 from handler.auth_handler import notify_device_connection
 from service.analysis_service import AnalysisService
+from service.stream_analysis_service import CameraStreamSession, FrameRejected
+from storage.redis_client import redis_connection
+from tasks.inference_queue import inference_queue
+from tasks.task_cancellation import TaskCancelled, TaskCheckpoint
 from tasks.task_manager import task_manager
 from transflate.translator import translator
 
+load_dotenv()
+TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", 10))
+UPLOAD_MULTIPART_OVERHEAD = 64 * 1024
+UPLOAD_LIMITS = {
+    "/analyze": MAX_UPLOAD_BYTES + UPLOAD_MULTIPART_OVERHEAD,
+    "/analyze/batch": (MAX_UPLOAD_BYTES + UPLOAD_MULTIPART_OVERHEAD) * MAX_BATCH_FILES
+}
+
+
+@asynccontextmanager
+async def lifespan(fastapi_app: FastAPI):
+    fastapi_app.state.bot_application = None
+    scratch_janitor.start()
+    memory_watchdog.start()
+    process_stats.start()
+    if not inference_queue.enabled:
+        await asyncio.to_thread(AnalysisService.load_models)
+    if BOT_MODE == BotMode.WEBHOOK and TOKEN:
+        fastapi_app.state.bot_application = build_bot_application(TOKEN)
+        await start_webhook_bot(fastapi_app.state.bot_application)
+
+    try:
+        yield
+    finally:
+        if fastapi_app.state.bot_application is not None:
+            await stop_webhook_bot(fastapi_app.state.bot_application)
+        await scratch_janitor.stop()
+        await process_stats.stop()
+        await redis_connection.close()
+        tracer.shutdown()
+
+
 app = FastAPI(
     title="SkinAnalysis API",
     description="SkinAnalysis API",
     version="1.0",
+    lifespan=lifespan,
 )
 
+app.add_middleware(UploadLimitMiddleware, limits=UPLOAD_LIMITS)
+
+
+async def build_task_response(task: dict) -> TaskResponse:
+    task_id = task['task_id']
+    return TaskResponse(
+        task_id=task_id,
+        status=task['status'],
+        message=task['message'],
+        created_at=datetime.fromisoformat(task['created_at']),
+        updated_at=datetime.fromisoformat(task['updated_at']) if task.get('updated_at') else None,
+        progress=task.get('progress'),
+        result_url=f"/tasks/{task_id}/result" if task.get('result') else None,
+        deadline=datetime.fromtimestamp(task['deadline']) if task.get('deadline') else None,
+        trace_id=task.get('trace_id'),
+        children=[
+            TaskChildSchema(task_id=child['task_id'], status=child['status'], progress=child.get('progress'))
+            for child in await task_manager.get_tasks(task['children']) if child
+        ] if task.get('children') else None
+    )
+
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    context = tracer.new_context(request.headers.get("traceparent"))
+    with tracer.trace(f"{request.method} {request.url.path}", context, **{"http.method": request.method}) as span:
+        response = await call_next(request)
+        if span is not None:
+            span.set_attribute("http.status_code", response.status_code)
+    response.headers["X-Trace-Id"] = context.trace_id
+    return response
+
+
+def get_request_language(accept_language: str = Header("en", alias="Accept-Language")) -> str:
+    return translator.negotiate(accept_language)
+
+
+def dispatch_task(background_tasks: BackgroundTasks, job, **kwargs):
+    try:
+        if inference_queue.enabled:
+            # held by the supervisor while queued, the inference worker claims it when it picks the job up
+            file_manager.claim_scratch(kwargs["scratch_dir"], inference_queue.owner_pid)
+        if not inference_queue.submit(job, **kwargs):
+            background_tasks.add_task(job, **kwargs)
+    except BaseException:
+        # the job never ran, so nothing else would free its shared slots or scratch directory
+        for shared_image in [kwargs.get("shared_image"), *(kwargs.get("shared_images") or [])]:
+            shared_image_pool.release(shared_image)
+        file_manager.release_scratch(kwargs["scratch_dir"])
+        raise
+
+
+def ensure_accepting_work(lang: str = Depends(get_request_language)):
+    if memory_watchdog.draining:
+        raise HTTPException(
+            status_code=503,
+            detail=translator.translate("errors.server.worker_recycling", Platform.API, lang),
+            headers={"Retry-After": "5"}
+        )
+
+
+def get_request_deadline(
+        timeout: Optional[float] = Header(None, alias="X-Request-Timeout", gt=0)
+) -> Optional[float]:
+    return time.time() + timeout if timeout is not None else None
+
 
 async def verify_token(
         connection_id: str = Header(...),
         device_uid: str = Header(..., alias="X-Device-ID"),
-        lang: str = Header("en", alias="Accept-Language")
+        lang: str = Depends(get_request_language)
 ):
     stats = await DatabaseWorker.get_connection_by_id(connection_id)
 
@@ -48,14 +179,18 @@ async def verify_token(
     return stats
 
 
-@app.post("/analyze", response_model=TaskResponse)
+@app.post("/analyze", response_model=TaskResponse, dependencies=[Depends(ensure_accepting_work)])
 async def analyze_image(
+        response: Response,
         background_tasks: BackgroundTasks,
         connection_id: str = Header(...),
         device_uid: str = Header(..., alias="X-Device-ID"),
+        idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
+        profile_token: Optional[str] = Header(None, alias="X-Profile-Token"),
         file: UploadFile = File(...),
         connection: Connection = Depends(verify_token),
-        lang: str = Header("en", alias="Accept-Language")
+        lang: str = Depends(get_request_language),
+        deadline: Optional[float] = Depends(get_request_deadline)
 ):
     user_id = connection.user_id
 
@@ -65,41 +200,218 @@ async def analyze_image(
             detail=translator.translate("errors.validation.file_not_image", Platform.API, lang)
         )
 
-    task_id = await task_manager.create_task(user_id)
-    content = await file.read()
+    if idempotency_key:
+        existing = await task_manager.find_dedupe_task(user_id, f"key:{idempotency_key}")
+        if existing:
+            response.headers["Idempotent-Replayed"] = "true"
+            return await build_task_response(existing)
 
-    background_tasks.add_task(
+    scratch_dir = await file_manager.create_scratch_async(user_id)
+    try:
+        with tracer.span("upload.ingest"):
+            upload = await ingest_upload(file, scratch_dir)
+
+        dedupe_key = f"key:{idempotency_key}" if idempotency_key else f"sha256:{upload.digest}"
+        task, created = await task_manager.create_or_attach_task(user_id, dedupe_key, deadline, tracer.get_trace_id(),
+                                                                 replay_completed=idempotency_key is not None)
+        if not created:
+            await file_manager.release_scratch_async(scratch_dir)
+            response.headers["Idempotent-Replayed"] = "true"
+            return await build_task_response(task)
+
+        task_id = task['task_id']
+
+        await task_manager.update_task(
+            task_id=task_id,
+            status=TaskStatus.PROCESSING,
+            message=translator.translate("status.upload.image_uploaded", Platform.API, lang),
+            progress=10
+        )
+
+        # decoded here so the inference worker reads the pixels straight out of shared memory
+        shared_image = await asyncio.to_thread(shared_image_pool.store, upload.path) \
+            if shared_image_pool.enabled else None
+    except UploadRejected as e:
+        await file_manager.release_scratch_async(scratch_dir)
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=translator.translate(e.message_key, Platform.API, lang, **e.params)
+        )
+    except BaseException:
+        await file_manager.release_scratch_async(scratch_dir)
+        raise
+
+    dispatch_task(
+        background_tasks,
         process_image_task,
         task_id=task_id,
         user_id=user_id,
-        content=content,
-        filename=file.filename,
-        lang=lang
+        photo_path=upload.path,
+        scratch_dir=scratch_dir,
+        lang=lang,
+        deadline=deadline,
+        enqueued_at=time.perf_counter(),
+        trace_context=tracer.get_context(),
+        profile=profiler.should_profile(profile_token),
+        shared_image=shared_image
     )
 
-    await task_manager.update_task(
+    return TaskResponse(
         task_id=task_id,
         status=TaskStatus.PROCESSING,
-        message=translator.translate("status.upload.image_uploaded", Platform.API, lang),
-        progress=10
+        message=translator.translate("success.tasks.analysis_started", Platform.API, lang),
+        created_at=datetime.now(),
+        result_url=f"/tasks/{task_id}/result",
+        trace_id=tracer.get_trace_id()
+    )
+
+
+@app.post("/analyze/batch", response_model=TaskResponse, dependencies=[Depends(ensure_accepting_work)])
+async def analyze_images_batch(
+        background_tasks: BackgroundTasks,
+        connection_id: str = Header(...),
+        device_uid: str = Header(..., alias="X-Device-ID"),
+        profile_token: Optional[str] = Header(None, alias="X-Profile-Token"),
+        files: List[UploadFile] = File(...),
+        connection: Connection = Depends(verify_token),
+        lang: str = Depends(get_request_language),
+        deadline: Optional[float] = Depends(get_request_deadline)
+):
+    user_id = connection.user_id
+
+    if len(files) > MAX_BATCH_FILES:
+        raise HTTPException(
+            status_code=400,
+            detail=translator.translate("errors.validation.too_many_files", Platform.API, lang, max_files=MAX_BATCH_FILES)
+        )
+
+    if not all(file.content_type.startswith('image/') for file in files):
+        raise HTTPException(
+            status_code=400,
+            detail=translator.translate("errors.validation.file_not_image", Platform.API, lang)
+        )
+
+    scratch_dir = await file_manager.create_scratch_async(user_id)
+    try:
+        with tracer.span("upload.ingest", **{"upload.files": len(files)}):
+            uploads = [await ingest_upload(file, scratch_dir) for file in files]
+
+        task_id, child_ids = await task_manager.create_batch_task(user_id, len(uploads), deadline,
+                                                                  tracer.get_trace_id())
+
+        await task_manager.update_task(
+            task_id=task_id,
+            status=TaskStatus.PROCESSING,
+            message=translator.translate("status.upload.image_uploaded", Platform.API, lang),
+            progress=10
+        )
+
+        shared_images = [
+            await asyncio.to_thread(shared_image_pool.store, upload.path) for upload in uploads
+        ] if shared_image_pool.enabled else None
+    except UploadRejected as e:
+        await file_manager.release_scratch_async(scratch_dir)
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=translator.translate(e.message_key, Platform.API, lang, **e.params)
+        )
+    except BaseException:
+        await file_manager.release_scratch_async(scratch_dir)
+        raise
+
+    dispatch_task(
+        background_tasks,
+        process_batch_task,
+        task_id=task_id,
+        child_ids=child_ids,
+        user_id=user_id,
+        photo_paths=[upload.path for upload in uploads],
+        scratch_dir=scratch_dir,
+        lang=lang,
+        deadline=deadline,
+        enqueued_at=time.perf_counter(),
+        trace_context=tracer.get_context(),
+        profile=profiler.should_profile(profile_token),
+        shared_images=shared_images
     )
 
     return TaskResponse(
         task_id=task_id,
         status=TaskStatus.PROCESSING,
-        message=translator.translate("success.tasks.analysis_started", Platform.API, lang),
+        message=translator.translate("success.tasks.batch_started", Platform.API, lang, count=len(uploads)),
         created_at=datetime.now(),
-        result_url=f"/tasks/{task_id}/result"
+        result_url=f"/tasks/{task_id}/result",
+        trace_id=tracer.get_trace_id(),
+        children=[TaskChildSchema(task_id=child_id, status=TaskStatus.PENDING, progress=0) for child_id in child_ids]
     )
 
 
+@app.websocket("/analyze/stream")
+async def analyze_stream(websocket: WebSocket):
+    lang = translator.negotiate(websocket.headers.get("accept-language", "en"))
+    try:
+        connection = await verify_token(
+            websocket.headers.get("connection-id", ""),
+            websocket.headers.get("x-device-id", ""),
+            lang
+        )
+    except HTTPException as e:
+        await websocket.close(code=1008, reason=str(e.detail))
+        return
+
+    # 1013 is "try again later": a draining worker or one at its stream cap turns new streams away
+    if memory_watchdog.draining:
+        await websocket.close(code=1013, reason=translator.translate("errors.server.worker_recycling", Platform.API, lang))
+        return
+    if CameraStreamSession.is_full():
+        await websocket.close(code=1013, reason=translator.translate("errors.server.stream_limit", Platform.API, lang))
+        return
+
+    await websocket.accept()
+    session = CameraStreamSession(connection.user_id)
+    CameraStreamSession.active += 1
+
+    async def receive_frames():
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                if message.get("bytes"):
+                    try:
+                        session.submit(message["bytes"])
+                    except FrameRejected as e:
+                        await websocket.send_json({"type": "error", "reason": e.reason})
+                elif message.get("text") == "stats":
+                    await websocket.send_json(session.get_stats())
+        finally:
+            session.close()
+
+    receiver = asyncio.create_task(receive_frames())
+    try:
+        while (next_frame := await session.next_frame()) is not None:
+            if memory_watchdog.draining:
+                await websocket.send_json({"type": "error", "frame": next_frame[0], "reason": "worker_recycling"})
+                await websocket.close(code=1013)
+                break
+            try:
+                await websocket.send_json(await session.analyze_frame(*next_frame))
+            except FrameRejected as e:
+                await websocket.send_json({"type": "error", "frame": next_frame[0], "reason": e.reason})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        CameraStreamSession.active -= 1
+        receiver.cancel()
+
+
 @app.get("/tasks/{task_id}/status", response_model=TaskResponse)
 async def get_task_status(
         task_id: str,
         connection_id: str = Header(...),
         device_uid: str = Header(..., alias="X-Device-ID"),
         connection: Connection = Depends(verify_token),
-        lang: str = Header("en", alias="Accept-Language")
+        lang: str = Depends(get_request_language)
 ):
     task = await task_manager.get_task(task_id)
     if not task:
@@ -108,15 +420,29 @@ async def get_task_status(
             detail=translator.translate("errors.tasks.task_not_found", Platform.API, lang)
         )
 
-    return TaskResponse(
-        task_id=task_id,
-        status=task['status'],
-        message=task['message'],
-        created_at=datetime.fromisoformat(task['created_at']),
-        updated_at=datetime.fromisoformat(task['updated_at']) if task.get('updated_at') else None,
-        progress=task.get('progress'),
-        result_url=f"/tasks/{task_id}/result" if task.get('result') else None
+    return await build_task_response(task)
+
+
+@app.delete("/tasks/{task_id}", response_model=TaskResponse)
+async def cancel_task(
+        task_id: str,
+        connection_id: str = Header(...),
+        device_uid: str = Header(..., alias="X-Device-ID"),
+        connection: Connection = Depends(verify_token),
+        lang: str = Depends(get_request_language)
+):
+    task = await task_manager.get_task(task_id)
+    if not task or task['user_id'] != connection.user_id:
+        raise HTTPException(
+            status_code=404,
+            detail=translator.translate("errors.tasks.task_not_found", Platform.API, lang)
+        )
+
+    task = await task_manager.cancel_task(
+        task_id,
+        translator.translate("errors.tasks.task_cancelled", Platform.API, lang)
     )
+    return await build_task_response(task)
 
 
 @app.get("/tasks/{task_id}/result")
@@ -125,7 +451,7 @@ async def get_task_result(
         connection_id: str = Header(...),
         device_uid: str = Header(..., alias="X-Device-ID"),
         connection: Connection = Depends(verify_token),
-        lang: str = Header("en", alias="Accept-Language")
+        lang: str = Depends(get_request_language)
 ):
     task = await task_manager.get_task(task_id)
     if not task:
@@ -152,88 +478,243 @@ async def get_task_result(
 
 @app.get("/result/{user_id}/{image_name}")
 async def get_result_image(
+        request: Request,
         user_id: str,
         image_name: str,
-        connection_id: str = Header(...),
-        device_uid: str = Header(..., alias="X-Device-ID"),
-        connection: Connection = Depends(verify_token),
-        lang: str = Header("en", alias="Accept-Language")
+        expires: Optional[int] = None,
+        signature: Optional[str] = None,
+        connection_id: Optional[str] = Header(None),
+        device_uid: Optional[str] = Header(None, alias="X-Device-ID"),
+        lang: str = Depends(get_request_language)
 ):
-    file_path = file_manager.get_user_folder(user_id) / image_name
-    if not file_path.exists():
+    if signature is not None and expires is not None:
+        if not result_url_signer.verify(user_id, image_name, expires, signature):
+            raise HTTPException(
+                status_code=403,
+                detail=translator.translate("errors.resources.invalid_signature", Platform.API, lang)
+            )
+    else:
+        if not connection_id or not device_uid:
+            raise HTTPException(
+                status_code=403,
+                detail=translator.translate("errors.auth.invalid_connection_id", Platform.API, lang)
+            )
+        connection = await verify_token(connection_id, device_uid, lang)
+        if str(connection.user_id) != user_id:
+            raise HTTPException(
+                status_code=404,
+                detail=translator.translate("errors.resources.image_not_found", Platform.API, lang)
+            )
+
+    stored = await result_store.resolve(user_id, Path(image_name).stem)
+    if stored is None:
         raise HTTPException(
             status_code=404,
             detail=translator.translate("errors.resources.image_not_found", Platform.API, lang)
         )
-    return FileResponse(file_path)
+    return build_result_response(request, stored)
+
+
+def build_analysis_response(user_id: int, result: AnalyseServiceResult) -> AnalysisResponse:
+    return AnalysisResponse(
+        status=result.get_status(),
+        message=result.get_message_key(),
+        image_url=result_url_signer.sign(user_id, result.get_image_name()) if result.get_image_name() else None,
+        analysis_results=[
+            AnalysisItemSchema(
+                label=res.get_label(),
+                confidence=res.get_confidence(),
+                box=CropBoxSchema(
+                    x=res.crop.x,
+                    y=res.crop.y,
+                    w=res.crop.w,
+                    h=res.crop.h
+                )
+            ) for res in result.get_analysis_results()
+        ]
+    )
 
 
 async def process_image_task(
         task_id: str,
         user_id: int,
-        content: bytes,
-        filename: str,
-        lang: str = "en"
+        photo_path: Path,
+        scratch_dir: Path,
+        lang: str = "en",
+        deadline: Optional[float] = None,
+        enqueued_at: Optional[float] = None,
+        trace_context: Optional[TraceContext] = None,
+        profile: bool = False,
+        shared_image: Optional[SharedImage] = None
 ):
-    try:
-        await task_manager.update_task(
-            task_id=task_id,
-            message=translator.translate("status.upload.saving_image", Platform.API, lang),
-            progress=20
-        )
+    with (
+        tracer.trace("task.process_image", trace_context, **{"task.id": task_id}),
+        profiler.profile("task.process_image", task_id) if profile else nullcontext()
+    ):
+        if enqueued_at is not None:
+            metrics.queue_wait_seconds.observe(time.perf_counter() - enqueued_at, "task", Platform.API.value)
+
+        checkpoint = TaskCheckpoint(task_id, deadline)
+        try:
+            await checkpoint("queued")
+            await task_manager.update_task(
+                task_id=task_id,
+                message=translator.translate("status.processing.processing_ai", Platform.API, lang),
+                progress=40
+            )
+
+            result = await AnalysisService.analyze(user_id, photo_path, scratch_dir, ref_id=task_id, checkpoint=checkpoint,
+                                                   shared_image=shared_image)
+
+            await task_manager.update_task(
+                task_id=task_id,
+                message=translator.translate("status.processing.generating_result", Platform.API, lang),
+                progress=80
+            )
+
+            analysis_response = build_analysis_response(user_id, result)
+
+            await task_manager.update_task(
+                task_id=task_id,
+                status=TaskStatus.COMPLETED,
+                message=translator.translate("success.tasks.analysis_completed", Platform.API, lang),
+                progress=100,
+                result=analysis_response.dict()
+            )
+
+        except TaskCancelled as e:
+            await task_manager.update_task(
+                task_id=task_id,
+                status=TaskStatus.CANCELLED,
+                message=translator.translate(e.message_key, Platform.API, lang)
+            )
+        except Exception as e:
+            import logging
+            logging.error(f"Task {task_id} failed: {str(e)}", exc_info=True)
+
+            await task_manager.update_task(
+                task_id=task_id,
+                status=TaskStatus.FAILED,
+                message=translator.translate("errors.tasks.task_failed", Platform.API, lang, task_id=task_id, error=str(e)),
+                progress=0
+            )
+        finally:
+            shared_image_pool.release(shared_image)
+            await file_manager.release_scratch_async(scratch_dir)
+
+
+async def process_batch_task(
+        task_id: str,
+        child_ids: List[str],
+        user_id: int,
+        photo_paths: List[Path],
+        scratch_dir: Path,
+        lang: str = "en",
+        deadline: Optional[float] = None,
+        enqueued_at: Optional[float] = None,
+        trace_context: Optional[TraceContext] = None,
+        profile: bool = False,
+        shared_images: Optional[List[Optional[SharedImage]]] = None
+):
+    with (
+        tracer.trace("task.process_batch", trace_context, **{"task.id": task_id}),
+        profiler.profile("task.process_batch", task_id) if profile else nullcontext()
+    ):
+        if enqueued_at is not None:
+            metrics.queue_wait_seconds.observe(time.perf_counter() - enqueued_at, "task", Platform.API.value)
+
+        checkpoint = TaskCheckpoint(task_id, deadline)
+        try:
+            await checkpoint("queued")
+            for child_id in [task_id, *child_ids]:
+                await task_manager.update_task(
+                    task_id=child_id,
+                    status=TaskStatus.PROCESSING,
+                    message=translator.translate("status.processing.processing_ai", Platform.API, lang),
+                    progress=40
+                )
 
-        temp_path = file_manager.save_temporary_photo(content, user_id, filename)
+            results = await AnalysisService.analyze_batch(user_id, photo_paths, scratch_dir, ref_ids=child_ids,
+                                                          checkpoint=checkpoint, shared_images=shared_images)
+
+            await task_manager.update_task(
+                task_id=task_id,
+                message=translator.translate("status.processing.generating_result", Platform.API, lang),
+                progress=80
+            )
+
+            responses = []
+            for child_id, result in zip(child_ids, results):
+                analysis_response = build_analysis_response(user_id, result)
+                responses.append(analysis_response)
+                await task_manager.update_task(
+                    task_id=child_id,
+                    status=TaskStatus.COMPLETED,
+                    message=translator.translate("success.tasks.analysis_completed", Platform.API, lang),
+                    progress=100,
+                    result=analysis_response.dict()
+                )
 
-        await task_manager.update_task(
-            task_id=task_id,
-            message=translator.translate("status.processing.processing_ai", Platform.API, lang),
-            progress=40
-        )
+            succeeded = any(response.status == ProcessImageStatus.SUCCESS for response in responses)
+            batch_response = BatchAnalysisResponse(
+                status=ProcessImageStatus.SUCCESS if succeeded else responses[0].status,
+                message=translator.translate("success.tasks.analysis_completed", Platform.API, lang),
+                results=responses
+            )
+
+            await task_manager.update_task(
+                task_id=task_id,
+                status=TaskStatus.COMPLETED,
+                message=translator.translate("success.tasks.analysis_completed", Platform.API, lang),
+                progress=100,
+                result=batch_response.dict()
+            )
+
+        except TaskCancelled as e:
+            for child_id in [task_id, *child_ids]:
+                await task_manager.update_task(
+                    task_id=child_id,
+                    status=TaskStatus.CANCELLED,
+                    message=translator.translate(e.message_key, Platform.API, lang)
+                )
+        except Exception as e:
+            import logging
+            logging.error(f"Batch task {task_id} failed: {str(e)}", exc_info=True)
+
+            for child_id in [task_id, *child_ids]:
+                await task_manager.update_task(
+                    task_id=child_id,
+                    status=TaskStatus.FAILED,
+                    message=translator.translate("errors.tasks.task_failed", Platform.API, lang, task_id=child_id, error=str(e)),
+                    progress=0
+                )
+        finally:
+            for shared_image in shared_images or []:
+                shared_image_pool.release(shared_image)
+            await file_manager.release_scratch_async(scratch_dir)
 
-        result = await AnalysisService.analyze(user_id, temp_path)
 
-        await task_manager.update_task(
-            task_id=task_id,
-            message=translator.translate("status.processing.generating_result", Platform.API, lang),
-            progress=80
-        )
+@app.post(WEBHOOK_PATH, include_in_schema=False)
+async def telegram_webhook(
+        request: Request,
+        secret_token: str = Header("", alias="X-Telegram-Bot-Api-Secret-Token")
+):
+    application = request.app.state.bot_application
+    if application is None:
+        raise HTTPException(status_code=404)
 
-        analysis_response = AnalysisResponse(
-            status=result.get_status(),
-            message=result.get_message_key(),
-            image_url=f"/result/{user_id}/{result.get_image_path().name}" if result.get_image_path() else None,
-            analysis_results=[
-                AnalysisItemSchema(
-                    label=res.get_label(),
-                    confidence=res.get_confidence(),
-                    box=CropBoxSchema(
-                        x=res.crop.x,
-                        y=res.crop.y,
-                        w=res.crop.w,
-                        h=res.crop.h
-                    )
-                ) for res in result.get_analysis_results()
-            ]
-        )
+    if not secrets.compare_digest(secret_token.encode(), WEBHOOK_SECRET.encode()):
+        raise HTTPException(status_code=403)
 
-        await task_manager.update_task(
-            task_id=task_id,
-            status=TaskStatus.COMPLETED,
-            message=translator.translate("success.tasks.analysis_completed", Platform.API, lang),
-            progress=100,
-            result=analysis_response.dict()
-        )
+    try:
+        data = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400)
 
-    except Exception as e:
-        import logging
-        logging.error(f"Task {task_id} failed: {str(e)}", exc_info=True)
+    if not isinstance(data, dict) or not await feed_webhook_update(application, data):
+        raise HTTPException(status_code=400)
 
-        await task_manager.update_task(
-            task_id=task_id,
-            status=TaskStatus.FAILED,
-            message=translator.translate("errors.tasks.task_failed", Platform.API, lang, task_id=task_id, error=str(e)),
-            progress=0
-        )
+    return {"ok": True}
 
 
 @app.post("/auth/register-device", response_model=DeviceRegisterResponse)
@@ -242,7 +723,7 @@ async def register_device(
         connection_id: str = Header(...),
         device_uid: str = Header(..., alias="X-Device-ID"),
         connection: Connection = Depends(verify_token),
-        lang: str = Header("en", alias="Accept-Language")
+        lang: str = Depends(get_request_language)
 ):
     try:
         user_id = connection.user_id
@@ -294,7 +775,7 @@ async def check(
         connection_id: str = Header(...),
         device_uid: str = Header(..., alias="X-Device-ID"),
         connection: Connection = Depends(verify_token),
-        lang: str = Header("en", alias="Accept-Language")
+        lang: str = Depends(get_request_language)
 ):
     return {
         "status": "success",
@@ -302,8 +783,72 @@ async def check(
     }
 
 
+@app.get("/health")
+async def health():
+    redis_available = await redis_connection.ping()
+    if not redis_available:
+        raise HTTPException(status_code=503, detail={"redis": redis_connection.get_stats()})
+    if memory_watchdog.draining:
+        raise HTTPException(status_code=503, detail={"watchdog": memory_watchdog.get_stats()})
+
+    return {
+        "status": "success",
+        "redis": redis_connection.get_stats(),
+        "memory": memory_budget.get_stats(),
+        "profiling": profiler.get_stats(),
+        "watchdog": memory_watchdog.get_stats(),
+        "shared_images": shared_image_pool.get_stats(),
+        "threading": threading_config.get_stats(),
+        "processes": [
+            {key: peer[key] for key in ("pid", "role", "updated_at", "watchdog", "profiling")}
+            for peer in await asyncio.to_thread(process_stats.read_peers) if peer["alive"]
+        ]
+    }
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics(authorization: str = Header("")):
+    if METRICS_TOKEN and not secrets.compare_digest(authorization.encode(), f"Bearer {METRICS_TOKEN}".encode()):
+        raise HTTPException(status_code=403)
+
+    peers = await asyncio.to_thread(process_stats.read_peers)
+    return PlainTextResponse(metrics.render(peer["histograms"] for peer in peers), media_type="text/plain; version=0.0.4")
+
+
+def verify_profile_access(authorization: str = Header("")):
+    token = authorization.removeprefix("Bearer ")
+    if not profiler.is_authorized(token):
+        raise HTTPException(status_code=403)
+
+
+@app.get("/admin/profiles", include_in_schema=False, dependencies=[Depends(verify_profile_access)])
+async def list_profiles():
+    return {
+        "profiler": profiler.get_stats(),
+        "processes": [
+            {"pid": peer["pid"], "role": peer["role"], "profiler": peer["profiling"]}
+            for peer in await asyncio.to_thread(process_stats.read_peers) if peer["alive"]
+        ],
+        "profiles": profiler.list_profiles()
+    }
+
+
+@app.get("/admin/profiles/{name}", include_in_schema=False, dependencies=[Depends(verify_profile_access)])
+async def get_profile(name: str, format: str = "prof", sort: str = "cumulative", limit: int = 40):
+    path = profiler.get_profile_path(name)
+    if path is None:
+        raise HTTPException(status_code=404)
+
+    if format == "text":
+        try:
+            return PlainTextResponse(profiler.render_text(path, sort, limit))
+        except KeyError:
+            raise HTTPException(status_code=400, detail=f"Unknown sort key: {sort}")
+    return FileResponse(path, media_type="application/octet-stream", filename=name)
+
+
 @app.get("/")
-async def root(lang: str = Header("en", alias="Accept-Language")):
+async def root(lang: str = Depends(get_request_language)):
     message = translator.translate(
         "success.api_running",
         Platform.API,
@@ -0,0 +1,97 @@
+import os
+from typing import Optional
+
+from dotenv import load_dotenv
+from starlette.requests import Request
+from starlette.responses import Response, FileResponse, StreamingResponse
+
+from files.file_manager import file_manager
+from files.result_store import StoredResult
+
+load_dotenv()
+RESULT_SENDFILE_MODE = os.getenv("RESULT_SENDFILE_MODE", "none").lower()
+RESULT_ACCEL_PREFIX = os.getenv("RESULT_ACCEL_PREFIX", "/protected-results/")
+RESULT_CACHE_SECONDS = int(os.getenv("RESULT_CACHE_SECONDS", 3600))
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(candidate.strip().removeprefix("W/") == etag for candidate in if_none_match.split(","))
+
+
+def parse_range(range_header: Optional[str], size: int) -> Optional[tuple[int, int]]:
+    if not range_header or not range_header.startswith("bytes="):
+        return None
+
+    spec = range_header[len("bytes="):].strip()
+    if "," in spec:
+        return None
+
+    start_text, _, end_text = spec.partition("-")
+    try:
+        if not start_text:
+            suffix = int(end_text)
+            if suffix <= 0:
+                raise RangeNotSatisfiable()
+            return max(0, size - suffix), size - 1
+
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    except ValueError:
+        return None
+
+    if start >= size or end < start:
+        raise RangeNotSatisfiable()
+    return start, min(end, size - 1)
+
+
+def build_result_response(request: Request, stored: StoredResult) -> Response:
+    etag = f'"{stored.digest}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"private, max-age={RESULT_CACHE_SECONDS}",
+        "Accept-Ranges": "bytes"
+    }
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    if stored.path is not None:
+        if RESULT_SENDFILE_MODE == "x-accel":
+            headers["X-Accel-Redirect"] = f"{RESULT_ACCEL_PREFIX.rstrip('/')}/{stored.key}"
+            return Response(media_type=stored.get_content_type(), headers=headers)
+        if RESULT_SENDFILE_MODE == "x-sendfile":
+            headers["X-Sendfile"] = str(stored.path.resolve())
+            return Response(media_type=stored.get_content_type(), headers=headers)
+        return FileResponse(stored.path, media_type=stored.get_content_type(), headers=headers)
+
+    if_range = request.headers.get("if-range")
+    try:
+        byte_range = parse_range(request.headers.get("range"), stored.size) if not if_range or if_range == etag else None
+    except RangeNotSatisfiable:
+        return Response(status_code=416, headers={"Content-Range": f"bytes */{stored.size}"})
+
+    if byte_range is None:
+        headers["Content-Length"] = str(stored.size)
+        return StreamingResponse(
+            file_manager.results_backend.iter_chunks(stored.key),
+            media_type=stored.get_content_type(),
+            headers=headers
+        )
+
+    start, end = byte_range
+    headers["Content-Length"] = str(end - start + 1)
+    headers["Content-Range"] = f"bytes {start}-{end}/{stored.size}"
+    return StreamingResponse(
+        file_manager.results_backend.iter_chunks(stored.key, start=start, length=end - start + 1),
+        status_code=206,
+        media_type=stored.get_content_type(),
+        headers=headers
+    )
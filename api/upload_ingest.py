@@ -0,0 +1,134 @@
+import asyncio
+import hashlib
+import os
+import uuid
+from pathlib import Path
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from data.enums import Platform
+from image.image_header import ImageHeader, InvalidImageHeader, sniff_image_header
+from transflate.translator import translator
+
+load_dotenv()
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", 20 * 1024 * 1024))
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", 40_000_000))
+MAX_IMAGE_SIDE = int(os.getenv("MAX_IMAGE_SIDE", 12000))
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", 256 * 1024))
+UPLOAD_SNIFF_BYTES = int(os.getenv("UPLOAD_SNIFF_BYTES", 512 * 1024))
+
+EXTENSIONS = {"jpeg": ".jpg", "png": ".png", "webp": ".webp", "bmp": ".bmp"}
+
+
+class UploadRejected(Exception):
+    def __init__(self, message_key: str, status_code: int = 400, **params):
+        self.message_key = message_key
+        self.status_code = status_code
+        self.params = params
+        super().__init__(self.message_key)
+
+
+class IngestedUpload:
+    def __init__(self, path: Path, header: ImageHeader, size: int, digest: str):
+        self.path = path
+        self.header = header
+        self.size = size
+        self.digest = digest
+
+
+class UploadLimitMiddleware:
+    def __init__(self, app: ASGIApp, limits: dict[str, int]):
+        self.app = app
+        self.limits = limits
+
+    @staticmethod
+    def get_rejection_detail(headers: Headers) -> str:
+        lang = translator.negotiate(headers.get("accept-language", "en"))
+        return translator.translate("errors.validation.file_too_large", Platform.API, lang,
+                                    max_mb=MAX_UPLOAD_BYTES // (1024 * 1024))
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" and scope["method"] == "POST" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        content_length = headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > limit:
+            response = JSONResponse(status_code=413, content={"detail": self.get_rejection_detail(headers)})
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        # Starlette spools the whole multipart body before the endpoint runs and chunked requests
+        # declare no length, so the body is counted as it arrives
+        async def receive_limited() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise HTTPException(status_code=413, detail=self.get_rejection_detail(headers))
+            return message
+
+        await self.app(scope, receive_limited, send)
+
+
+def check_header(header: ImageHeader):
+    if header.width <= 0 or header.height <= 0:
+        raise UploadRejected("errors.validation.unsupported_format", 415)
+    if header.width > MAX_IMAGE_SIDE or header.height > MAX_IMAGE_SIDE or header.get_pixels() > MAX_IMAGE_PIXELS:
+        raise UploadRejected("errors.validation.image_too_large", 413, width=header.width, height=header.height)
+
+
+async def ingest_upload(upload: UploadFile, scratch_dir: Path) -> IngestedUpload:
+    head = bytearray()
+    hasher = hashlib.sha256()
+    header = None
+    size = 0
+    target = None
+    f = None
+
+    try:
+        while chunk := await upload.read(UPLOAD_CHUNK_BYTES):
+            size += len(chunk)
+            if size > MAX_UPLOAD_BYTES:
+                raise UploadRejected("errors.validation.file_too_large", 413, max_mb=MAX_UPLOAD_BYTES // (1024 * 1024))
+
+            if header is None:
+                head += chunk
+                try:
+                    header = sniff_image_header(bytes(head))
+                except InvalidImageHeader:
+                    raise UploadRejected("errors.validation.unsupported_format", 415)
+                if header is None:
+                    if len(head) > UPLOAD_SNIFF_BYTES:
+                        raise UploadRejected("errors.validation.unsupported_format", 415)
+                    continue
+
+                check_header(header)
+                target = scratch_dir / f"upload_{uuid.uuid4().hex[:8]}{EXTENSIONS[header.format]}"
+                f = await asyncio.to_thread(open, target, "wb")
+                chunk = bytes(head)
+                head = bytearray()
+
+            hasher.update(chunk)
+            await asyncio.to_thread(f.write, chunk)
+
+        if header is None:
+            raise UploadRejected("errors.validation.unsupported_format", 415)
+    except BaseException:
+        if f is not None:
+            f.close()
+        if target is not None:
+            target.unlink(missing_ok=True)
+        raise
+
+    await asyncio.to_thread(f.close)
+    return IngestedUpload(path=target, header=header, size=size, digest=hasher.hexdigest())
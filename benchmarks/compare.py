@@ -0,0 +1,40 @@
+import argparse
+import json
+from pathlib import Path
+
+
+def load(path: Path) -> dict:
+    return json.loads(path.read_text())
+
+
+def iter_medians(report: dict):
+    for size, result in report["results"].items():
+        for stage, stats in result["stages"].items():
+            yield size, stage, stats["median_ms"]
+        if "median_ms" in result.get("end_to_end", {}):
+            yield size, "end_to_end", result["end_to_end"]["median_ms"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two pipeline benchmark JSON reports")
+    parser.add_argument("base", type=Path)
+    parser.add_argument("head", type=Path)
+    parser.add_argument("--threshold", type=float, default=5.0, help="flag changes larger than this percentage")
+    args = parser.parse_args()
+
+    base, head = load(args.base), load(args.head)
+    head_medians = {(size, stage): value for size, stage, value in iter_medians(head)}
+
+    print(f"base {base['meta'].get('commit')}  ->  head {head['meta'].get('commit')}")
+    print(f"{'size':<6} {'stage':<18} {'base ms':>10} {'head ms':>10} {'change':>9}")
+    for size, stage, base_value in iter_medians(base):
+        head_value = head_medians.get((size, stage))
+        if head_value is None:
+            continue
+        change = (head_value - base_value) / base_value * 100 if base_value else 0.0
+        flag = " <" if abs(change) >= args.threshold else ""
+        print(f"{size:<6} {stage:<18} {base_value:>10.2f} {head_value:>10.2f} {change:>+8.1f}%{flag}")
+
+
+if __name__ == "__main__":
+    main()
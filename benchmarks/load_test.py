@@ -0,0 +1,271 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from benchmarks.pipeline_benchmark import prepare_environment, get_commit
+from benchmarks.synthetic_images import RESOLUTIONS
+
+FINAL_STATUSES = {"completed", "failed", "cancelled"}
+
+
+def percentile(ordered: list[float], fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, max(0, int(round(len(ordered) * fraction)) - 1))]
+
+
+class EndpointStats:
+    def __init__(self):
+        self.latencies: list[float] = []
+        self.errors = 0
+        self.status_codes: dict[str, int] = {}
+
+    def record(self, seconds: float, status_code: int | str, ok: bool):
+        self.latencies.append(seconds)
+        self.status_codes[str(status_code)] = self.status_codes.get(str(status_code), 0) + 1
+        if not ok:
+            self.errors += 1
+
+    def summarize(self, elapsed: float) -> dict:
+        ordered = sorted(self.latencies)
+        summary = {
+            "count": len(ordered),
+            "errors": self.errors,
+            "error_rate": self.errors / len(ordered) if ordered else 0.0,
+            "throughput_rps": len(ordered) / elapsed if elapsed else 0.0,
+            "status_codes": self.status_codes
+        }
+        if ordered:
+            summary.update({
+                "p50_ms": percentile(ordered, 0.50) * 1000,
+                "p95_ms": percentile(ordered, 0.95) * 1000,
+                "p99_ms": percentile(ordered, 0.99) * 1000,
+                "max_ms": ordered[-1] * 1000,
+            })
+        return summary
+
+
+class LoadGenerator:
+    def __init__(self, client, image_bytes: bytes, poll_interval: float, task_timeout: float, coalesce: bool):
+        self.client = client
+        self.image_bytes = image_bytes
+        self.poll_interval = poll_interval
+        self.task_timeout = task_timeout
+        self.coalesce = coalesce
+        self.stats: dict[str, EndpointStats] = {}
+
+    async def request(self, endpoint: str, method: str, url: str, ok_codes: tuple[int, ...] = (200,), **kwargs):
+        stats = self.stats.setdefault(endpoint, EndpointStats())
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except Exception as e:
+            stats.record(time.perf_counter() - started, type(e).__name__, False)
+            return None
+        stats.record(time.perf_counter() - started, response.status_code, response.status_code in ok_codes)
+        return response if response.status_code in ok_codes else None
+
+    async def register_device(self, connection_id: str) -> dict[str, str] | None:
+        device_uid = f"load-{uuid.uuid4().hex[:12]}"
+        headers = {"connection-id": connection_id, "X-Device-ID": device_uid}
+        response = await self.request(
+            "POST /auth/register-device", "POST", "/auth/register-device", headers=headers,
+            json={"device_uid": device_uid, "name": "load test", "platform": "bench", "model": "stub",
+                  "os_version": "1"}
+        )
+        return headers if response is not None else None
+
+    async def run_session(self, headers: dict[str, str], arrived: float):
+        stats = self.stats.setdefault("session", EndpointStats())
+        ok = await self.analyze_and_fetch(headers)
+        # measured from arrival so time spent waiting for a concurrency slot counts against the session
+        stats.record(time.perf_counter() - arrived, "ok" if ok else "error", ok)
+
+    async def analyze_and_fetch(self, headers: dict[str, str]) -> bool:
+        request_headers = dict(headers)
+        if not self.coalesce:
+            request_headers["Idempotency-Key"] = uuid.uuid4().hex
+
+        response = await self.request(
+            "POST /analyze", "POST", "/analyze", headers=request_headers,
+            files={"file": ("skin.jpg", self.image_bytes, "image/jpeg")}
+        )
+        if response is None:
+            return False
+        task_id = response.json()["task_id"]
+
+        status = response.json()["status"]
+        deadline = time.perf_counter() + self.task_timeout
+        while status not in FINAL_STATUSES:
+            if time.perf_counter() > deadline:
+                self.stats.setdefault("GET /tasks/{id}/status", EndpointStats()).record(0.0, "timeout", False)
+                return False
+            await asyncio.sleep(self.poll_interval)
+            response = await self.request("GET /tasks/{id}/status", "GET", f"/tasks/{task_id}/status",
+                                          headers=headers)
+            if response is None:
+                return False
+            status = response.json()["status"]
+
+        if status != "completed":
+            return False
+
+        response = await self.request("GET /tasks/{id}/result", "GET", f"/tasks/{task_id}/result", headers=headers)
+        if response is None:
+            return False
+
+        image_url = response.json().get("image_url")
+        if image_url:
+            return await self.request("GET /result/{user_id}/{image_name}", "GET", image_url) is not None
+        return True
+
+
+def find_free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def skip_notification(**kwargs):
+    pass
+
+
+async def run_load(args, image_bytes: bytes) -> dict:
+    import httpx
+    import uvicorn
+
+    import api.main
+    from benchmarks.pipeline_benchmark import use_fake_redis
+    from database.database import init_db, engine
+    from database.database_worker import DatabaseWorker
+
+    if not use_fake_redis():
+        raise SystemExit("fakeredis is required: pip install -r benchmarks/requirements.txt")
+    # device registration would otherwise message the owner through the Telegram bot
+    api.main.notify_device_connection = skip_notification
+    await init_db()
+
+    port = find_free_port()
+    server = uvicorn.Server(uvicorn.Config(api.main.app, host="127.0.0.1", port=port, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        if server_task.done():
+            server_task.result()
+        await asyncio.sleep(0.05)
+
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=args.task_timeout,
+                                 limits=limits) as client:
+        generator = LoadGenerator(client, image_bytes, args.poll_interval, args.task_timeout, args.coalesce)
+
+        devices = []
+        for index in range(args.users):
+            connection, _ = await DatabaseWorker.create_connection(100000 + index, f"load-{uuid.uuid4().hex[:8]}")
+            headers = await generator.register_device(connection.connection_id)
+            if headers is not None:
+                devices.append(headers)
+        if not devices:
+            raise SystemExit("No device could be registered")
+
+        semaphore = asyncio.Semaphore(args.concurrency)
+        rng = random.Random(args.seed)
+
+        async def session(index: int):
+            arrived = time.perf_counter()
+            async with semaphore:
+                await generator.run_session(devices[index % len(devices)], arrived)
+
+        started = time.perf_counter()
+        sessions = []
+        for index in range(args.sessions):
+            sessions.append(asyncio.create_task(session(index)))
+            if args.rate > 0:
+                # open loop: Poisson arrivals, independent of how fast the server answers
+                await asyncio.sleep(rng.expovariate(args.rate))
+        await asyncio.gather(*sessions)
+        elapsed = time.perf_counter() - started
+
+    server.should_exit = True
+    await server_task
+    # pooled aiosqlite connections run on non-daemon threads and would keep the interpreter alive
+    await engine.dispose()
+
+    return {
+        "elapsed_seconds": elapsed,
+        "devices": len(devices),
+        "endpoints": {name: stats.summarize(elapsed) for name, stats in generator.stats.items()}
+    }
+
+
+def print_table(report: dict):
+    print(f"{'endpoint':<36} {'count':>6} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}",
+          file=sys.stderr)
+    for name, stats in report["endpoints"].items():
+        print(f"{name:<36} {stats['count']:>6} {stats['throughput_rps']:>8.2f} {stats.get('p50_ms', 0):>9.1f} "
+              f"{stats.get('p95_ms', 0):>9.1f} {stats.get('p99_ms', 0):>9.1f} {stats['error_rate']:>6.1%}",
+              file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive the API with concurrent analysis sessions against stub models")
+    parser.add_argument("--users", type=int, default=4, help="devices to register")
+    parser.add_argument("--sessions", type=int, default=40, help="analyze -> poll -> download sessions to run")
+    parser.add_argument("--concurrency", type=int, default=8, help="maximum sessions in flight")
+    parser.add_argument("--rate", type=float, default=0.0, help="session arrivals per second, 0 starts them at once")
+    parser.add_argument("--size", choices=list(RESOLUTIONS), default="vga")
+    parser.add_argument("--poll-interval", type=float, default=0.2)
+    parser.add_argument("--task-timeout", type=float, default=120.0)
+    parser.add_argument("--coalesce", action="store_true", help="omit Idempotency-Key so identical uploads coalesce")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", type=Path, default=None, help="reuse generated models and images")
+    parser.add_argument("--output", type=Path, default=None, help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or Path(tempfile.mkdtemp(prefix="skin-load-"))
+    prepare_environment(work_dir, work_dir / "models")
+    os.environ["BOT_MODE"] = "polling"
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{work_dir / 'load_test.db'}"
+    os.environ["DATABASE_ECHO"] = "false"
+    (work_dir / "load_test.db").unlink(missing_ok=True)
+
+    from benchmarks.stub_models import build_stub_models
+    from benchmarks.synthetic_images import write_images
+
+    build_stub_models(work_dir / "models")
+    image_path = write_images(work_dir / "images", {args.size: RESOLUTIONS[args.size]})[args.size]
+
+    report = {
+        "meta": {
+            "commit": get_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "cpu_count": os.cpu_count(),
+            "users": args.users,
+            "sessions": args.sessions,
+            "concurrency": args.concurrency,
+            "rate": args.rate,
+            "size": args.size,
+            "coalesce": args.coalesce,
+        },
+        **asyncio.run(run_load(args, image_path.read_bytes()))
+    }
+
+    print_table(report)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output)
+        print(f"Results written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from benchmarks.synthetic_images import RESOLUTIONS
+
+
+def prepare_environment(work_dir: Path, models_dir: Path):
+    # must run before any project module is imported: file_manager and the engines read these at import time
+    os.environ["CUDA_VISIBLE_DEVICES"] = ""
+    os.environ["TF_CPP_MIN_LOG_LEVEL"] = "2"
+    os.environ["MODELS_PATH"] = str(models_dir)
+    os.environ["SCRATCH_PATH"] = str(work_dir / "scratch")
+    os.environ["STORAGE_BACKEND"] = "memory"
+    os.environ["TRACE_EXPORTER"] = "none"
+
+
+def summarize(samples: list[float]) -> dict[str, float]:
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "median_ms": statistics.median(ordered) * 1000,
+        "p90_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))] * 1000,
+        "min_ms": ordered[0] * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def get_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_stages(path: Path, scratch_dir: Path, repeat: int, warmup: int) -> dict:
+    from engine.inference_engine import inference_engine
+    from image.image_processor import ImageProcessor
+    from image.skin_not_found import SkinNotFound
+    from monitoring.metrics import StageTimings
+    from service.analysis_service import AnalysisService
+
+    samples: dict[str, list[float]] = {}
+    peak_memory = 0
+    crops_found = 0
+
+    for index in range(warmup + repeat):
+        timings = StageTimings()
+        processor = ImageProcessor(str(path), 0, tag=f"bench{index}", work_dir=scratch_dir, timings=timings)
+        try:
+            processor.ensure_skin_present()
+        except SkinNotFound:
+            pass
+
+        crops = processor.extract_crops(processor.detect())
+        with timings.stage("classify"):
+            predictions = [inference_engine.predict_crop(crop.path) for crop in crops]
+        with timings.stage("classify_batched"):
+            inference_engine.predict_crops([crop.path for crop in crops])
+        processor.annotate_image(AnalysisService.select_results(crops, predictions))
+
+        if index < warmup:
+            continue
+        for stage, seconds in timings.durations.items():
+            samples.setdefault(stage, []).append(seconds)
+        peak_memory = max(peak_memory, processor.peak_memory_bytes)
+        crops_found = len(crops)
+
+    return {
+        "stages": {stage: summarize(values) for stage, values in samples.items()},
+        "peak_memory_bytes": peak_memory,
+        "crops": crops_found
+    }
+
+
+def measure_allocations(path: Path, scratch_dir: Path, repeat: int) -> dict:
+    from engine.inference_engine import inference_engine
+    from engine.tensor_buffers import tensor_buffers
+    from image.image_processor import ImageProcessor
+
+    # a separate pass because tracing every allocation distorts the stage timings;
+    # tracemalloc only exposes the high-water mark, so transient churn is reported as peak bytes over the baseline
+    peaks = []
+    collections = []
+    tracemalloc.start()
+    try:
+        for index in range(repeat):
+            gc_before = sum(stats["collections"] for stats in gc.get_stats())
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+
+            processor = ImageProcessor(str(path), 0, tag=f"alloc{index}", work_dir=scratch_dir)
+            crops = processor.extract_crops(processor.detect())
+            inference_engine.predict_crops([crop.path for crop in crops])
+
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+            collections.append(sum(stats["collections"] for stats in gc.get_stats()) - gc_before)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "peak_traced_bytes_per_image": int(statistics.median(peaks)),
+        "gc_collections_per_image": statistics.fmean(collections),
+        "tensor_buffers": tensor_buffers.get_stats()
+    }
+
+
+async def run_end_to_end(path: Path, scratch_dir: Path, repeat: int, warmup: int) -> dict:
+    from service.analysis_service import AnalysisService
+
+    samples = []
+    for index in range(warmup + repeat):
+        started = time.perf_counter()
+        result = await AnalysisService.analyze(0, path, scratch_dir, ref_id=f"bench-{index}")
+        elapsed = time.perf_counter() - started
+        if index >= warmup:
+            samples.append(elapsed)
+
+    return {"status": result.get_message_key() or "success", **summarize(samples)}
+
+
+def use_fake_redis() -> bool:
+    try:
+        import fakeredis
+    except ImportError:
+        return False
+
+    from storage.redis_client import redis_connection
+    redis_connection._client = fakeredis.FakeAsyncRedis()
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the analysis pipeline against stub models")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--sizes", nargs="+", choices=list(RESOLUTIONS), default=list(RESOLUTIONS))
+    parser.add_argument("--work-dir", type=Path, default=None, help="reuse generated models and images")
+    parser.add_argument("--output", type=Path, default=None, help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or Path(tempfile.mkdtemp(prefix="skin-bench-"))
+    prepare_environment(work_dir, work_dir / "models")
+
+    from benchmarks.stub_models import build_stub_models
+    from benchmarks.synthetic_images import write_images
+
+    build_stub_models(work_dir / "models")
+    images = write_images(work_dir / "images", {name: RESOLUTIONS[name] for name in args.sizes})
+
+    import cv2
+    import numpy as np
+    import tensorflow as tf
+    from files.file_manager import file_manager
+
+    scratch_dir = file_manager.create_scratch(0)
+    has_redis = use_fake_redis()
+
+    results = {}
+    for name, path in images.items():
+        print(f"Benchmarking {name} ({RESOLUTIONS[name][0]}x{RESOLUTIONS[name][1]})", file=sys.stderr)
+        results[name] = run_stages(path, scratch_dir, args.repeat, args.warmup)
+        results[name]["allocations"] = measure_allocations(path, scratch_dir, args.repeat)
+        results[name]["end_to_end"] = (
+            asyncio.run(run_end_to_end(path, scratch_dir, args.repeat, args.warmup))
+            if has_redis else {"skipped": "fakeredis is not installed"}
+        )
+
+    file_manager.release_scratch(scratch_dir)
+
+    report = {
+        "meta": {
+            "commit": get_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "tensorflow": tf.__version__,
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+            "repeat": args.repeat,
+            "warmup": args.warmup,
+        },
+        "results": results
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output)
+        print(f"Results written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
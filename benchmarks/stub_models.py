@@ -0,0 +1,71 @@
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+
+DETECTOR_NAME = "SkinAnalysisDetector"
+CLASSIFIER_NAME = "SkinAnalysis_AI.keras"
+
+# y1, x1, y2, x2 in detector (640x640) coordinates, with the confidence the stub reports for each box
+STUB_BOXES = np.array([
+    [80, 80, 200, 200, 0.92],
+    [90, 90, 210, 210, 0.88],
+    [300, 120, 380, 220, 0.81],
+    [420, 400, 520, 540, 0.74],
+    [150, 450, 230, 560, 0.63],
+    [500, 60, 600, 180, 0.55],
+    [40, 300, 90, 360, 0.35],
+    [600, 600, 630, 630, 0.20],
+], dtype=np.float32)
+
+
+class StubDetector(tf.Module):
+    def __init__(self):
+        super().__init__()
+        self.kernel = tf.Variable(tf.random.stateless_normal([3, 3, 3, 16], seed=[1, 2]) * 0.1)
+        self.boxes = tf.constant(STUB_BOXES)
+
+    @tf.function(input_signature=[tf.TensorSpec([None, 640, 640, 3], tf.float32)])
+    def serve(self, images):
+        features = tf.nn.relu(tf.nn.conv2d(images, self.kernel, strides=2, padding="SAME"))
+        features = tf.nn.max_pool2d(features, 4, 4, "VALID")
+        activity = tf.sigmoid(tf.reduce_mean(features, axis=[1, 2, 3]))
+
+        batch = tf.shape(images)[0]
+        boxes = tf.tile(self.boxes[tf.newaxis, ...], [batch, 1, 1])
+        scale = tf.concat([
+            tf.ones([batch, tf.shape(self.boxes)[0], 4]),
+            tf.tile((0.95 + 0.05 * activity)[:, tf.newaxis, tf.newaxis], [1, tf.shape(self.boxes)[0], 1])
+        ], axis=-1)
+        detections = boxes * scale
+        classes = tf.zeros([batch, tf.shape(self.boxes)[0], 1])
+        return {"output_0": tf.concat([detections, classes], axis=-1)}
+
+
+def build_stub_detector(path: Path) -> Path:
+    detector = StubDetector()
+    tf.saved_model.save(detector, str(path), signatures={"serving_default": detector.serve})
+    return path
+
+
+def build_stub_classifier(path: Path) -> Path:
+    tf.keras.utils.set_random_seed(7)
+    model = tf.keras.Sequential([
+        tf.keras.Input((224, 224, 3)),
+        tf.keras.layers.Rescaling(1 / 255.0),
+        tf.keras.layers.Conv2D(16, 3, strides=2, activation="relu"),
+        tf.keras.layers.Conv2D(32, 3, strides=2, activation="relu"),
+        tf.keras.layers.GlobalAveragePooling2D(),
+        tf.keras.layers.Dense(3, activation="softmax")
+    ])
+    model.save(str(path))
+    return path
+
+
+def build_stub_models(models_dir: Path) -> Path:
+    models_dir.mkdir(parents=True, exist_ok=True)
+    if not (models_dir / DETECTOR_NAME).exists():
+        build_stub_detector(models_dir / DETECTOR_NAME)
+    if not (models_dir / CLASSIFIER_NAME).exists():
+        build_stub_classifier(models_dir / CLASSIFIER_NAME)
+    return models_dir
@@ -0,0 +1,48 @@
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+RESOLUTIONS = {
+    "vga": (640, 480),
+    "hd": (1280, 720),
+    "fhd": (1920, 1080),
+    "12mp": (4032, 3024),
+}
+
+SKIN_BGR = (120, 160, 220)
+NEVUS_BGR = (40, 60, 90)
+SPOT_BGR = (70, 70, 200)
+
+
+def make_skin_image(width: int, height: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+
+    gradient = np.linspace(0.9, 1.1, width, dtype=np.float32)[np.newaxis, :, np.newaxis]
+    image = np.empty((height, width, 3), np.float32)
+    image[:] = SKIN_BGR
+    image *= gradient
+    image += rng.normal(0, 6, (height, width, 1)).astype(np.float32)
+    image = np.clip(image, 0, 255).astype(np.uint8)
+
+    scale = min(width, height) / 480
+    for _ in range(6):
+        center = (int(rng.uniform(0.1, 0.9) * width), int(rng.uniform(0.1, 0.9) * height))
+        axes = (int(rng.uniform(6, 18) * scale), int(rng.uniform(6, 18) * scale))
+        cv2.ellipse(image, center, axes, float(rng.uniform(0, 180)), 0, 360, NEVUS_BGR, -1, cv2.LINE_AA)
+    for _ in range(4):
+        center = (int(rng.uniform(0.1, 0.9) * width), int(rng.uniform(0.1, 0.9) * height))
+        cv2.circle(image, center, int(rng.uniform(4, 10) * scale), SPOT_BGR, -1, cv2.LINE_AA)
+
+    return cv2.GaussianBlur(image, (5, 5), 0)
+
+
+def write_images(images_dir: Path, resolutions: dict[str, tuple[int, int]] = RESOLUTIONS) -> dict[str, Path]:
+    images_dir.mkdir(parents=True, exist_ok=True)
+    paths = {}
+    for index, (name, (width, height)) in enumerate(resolutions.items()):
+        path = images_dir / f"skin_{name}.jpg"
+        if not path.exists():
+            cv2.imwrite(str(path), make_skin_image(width, height, seed=index), [cv2.IMWRITE_JPEG_QUALITY, 90])
+        paths[name] = path
+    return paths
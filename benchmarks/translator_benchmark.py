@@ -0,0 +1,31 @@
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from data.enums import Platform
+from transflate.translator import JsonTranslator
+
+NUMBER = 200_000
+
+CASES = {
+    "static_hit": lambda t: t.translate("status.processing.processing_ai", Platform.API, "en"),
+    "static_fallback": lambda t: t.translate("status.processing.processing_ai", Platform.API, "de"),
+    "raw_accept_language": lambda t: t.translate("status.processing.processing_ai", Platform.API, "ru-RU,ru;q=0.9,en;q=0.8"),
+    "with_params": lambda t: t.translate("errors.tasks.task_failed", Platform.API, "ru", task_id="42", error="boom"),
+    "missing_key": lambda t: t.translate("errors.not.there", Platform.TELEGRAM, "en"),
+    "negotiate": lambda t: t.negotiate("en-US,en;q=0.9,ru;q=0.8"),
+}
+
+
+def main():
+    translator = JsonTranslator(translations_path=str(Path(__file__).resolve().parent.parent / "locales"))
+
+    for name, case in CASES.items():
+        seconds = timeit.timeit(lambda: case(translator), number=NUMBER)
+        print(f"{name:<22} {seconds / NUMBER * 1e9:8.1f} ns/call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+import argparse
+import multiprocessing
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from benchmarks.pipeline_benchmark import get_commit, prepare_environment
+from benchmarks.synthetic_images import RESOLUTIONS
+from engine.threading_profile import THREADING_PROFILE_PATH, ThreadingProfile
+
+
+def powers_of_two(limit: int) -> list[int]:
+    values = [1]
+    while values[-1] * 2 <= limit:
+        values.append(values[-1] * 2)
+    if values[-1] != limit:
+        values.append(limit)
+    return values
+
+
+def run_request(paths: list[Path], scratch_dir: Path, tag: str):
+    from engine.inference_engine import inference_engine
+    from image.image_processor import ImageProcessor
+
+    processors = [ImageProcessor(str(path), 0, tag=f"{tag}-{i}", work_dir=scratch_dir) for i, path in enumerate(paths)]
+    crops = [
+        crop
+        for processor, raw_data in zip(processors, ImageProcessor.detect_batch(processors))
+        for crop in processor.extract_crops(raw_data)
+    ]
+    inference_engine.predict_crops([crop.path for crop in crops])
+
+
+def run_trial_worker(index: int, workers: int, paths: list[Path], requests: int, barrier, results):
+    # a fresh interpreter per worker: TF threading can only be set before its runtime starts
+    from engine.threading_profile import threading_config
+    from files.file_manager import file_manager
+    from service.analysis_service import AnalysisService
+
+    threading_config.pin_worker(index, workers)
+    AnalysisService.load_models()
+    scratch_dir = file_manager.create_scratch(index)
+    run_request(paths, scratch_dir, f"warmup{index}")
+
+    barrier.wait()
+    latencies = []
+    for step in range(requests):
+        started = time.perf_counter()
+        run_request(paths, scratch_dir, f"w{index}r{step}")
+        latencies.append(time.perf_counter() - started)
+    file_manager.release_scratch(scratch_dir)
+    results.put(latencies)
+
+
+def run_trial(profile: ThreadingProfile, paths: list[Path], requests: int, timeout: float) -> dict:
+    os.environ["TF_INTRA_OP_THREADS"] = str(profile.intra_op_threads)
+    os.environ["TF_INTER_OP_THREADS"] = str(profile.inter_op_threads)
+    os.environ["INFERENCE_BATCH_SIZE"] = str(profile.batch_size)
+    os.environ["INFERENCE_CPU_AFFINITY"] = str(profile.cpu_affinity).lower()
+
+    context = multiprocessing.get_context("spawn")
+    workers = profile.inference_workers
+    barrier = context.Barrier(workers + 1)
+    results = context.Queue()
+    processes = [
+        context.Process(target=run_trial_worker, args=(index, workers, paths, requests, barrier, results))
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    try:
+        barrier.wait(timeout)
+        started = time.perf_counter()
+        latencies = [latency for _ in processes for latency in results.get(timeout=timeout)]
+        elapsed = time.perf_counter() - started
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+    finally:
+        for process in processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.kill()
+
+    ordered = sorted(latencies)
+    return {
+        "images_per_second": len(latencies) * len(paths) / elapsed,
+        "median_ms": statistics.median(ordered) * 1000,
+        "p90_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))] * 1000
+    }
+
+
+def describe(profile: ThreadingProfile) -> str:
+    return (f"intra={profile.intra_op_threads:<3} inter={profile.inter_op_threads:<3} "
+            f"workers={profile.inference_workers:<3} batch={profile.batch_size or 'all':<4}")
+
+
+def pick_best(trials: list[tuple[ThreadingProfile, dict]], max_p90_ms: float | None) -> tuple[ThreadingProfile, dict]:
+    usable = [(profile, result) for profile, result in trials if "error" not in result]
+    if max_p90_ms:
+        usable = [(profile, result) for profile, result in usable if result["p90_ms"] <= max_p90_ms] or usable
+    if not usable:
+        raise RuntimeError("every tuning trial failed")
+    return max(usable, key=lambda trial: trial[1]["images_per_second"])
+
+
+def sweep(candidates: list[ThreadingProfile], args, paths: list[Path]) -> list[tuple[ThreadingProfile, dict]]:
+    trials = []
+    for profile in candidates:
+        result = run_trial(profile, paths, args.requests, args.timeout)
+        trials.append((profile, result))
+        summary = result.get("error") or (f"{result['images_per_second']:7.2f} img/s  "
+                                          f"median {result['median_ms']:7.1f} ms  p90 {result['p90_ms']:7.1f} ms")
+        print(f"{describe(profile)} {summary}", file=sys.stderr)
+    return trials
+
+
+def main():
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+
+    parser = argparse.ArgumentParser(description="Sweep TensorFlow threading, worker counts and batch sizes "
+                                                 "against the benchmark workload and write a threading profile")
+    parser.add_argument("--intra", nargs="+", type=int, default=powers_of_two(cpus))
+    parser.add_argument("--inter", nargs="+", type=int, default=[1, 2])
+    parser.add_argument("--workers", nargs="+", type=int, default=powers_of_two(cpus))
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[0, 1, 4, 16], help="0 runs the whole batch")
+    parser.add_argument("--size", choices=list(RESOLUTIONS), default="fhd")
+    parser.add_argument("--request-images", type=int, default=4, help="images per request, as in /analyze/batch")
+    parser.add_argument("--requests", type=int, default=5, help="timed requests per worker")
+    parser.add_argument("--oversubscribe", action="store_true", help="also try intra * workers above the CPU count")
+    parser.add_argument("--affinity", action="store_true", help="pin each worker to its own group of CPUs")
+    parser.add_argument("--max-p90-ms", type=float, default=None, help="prefer profiles under this request p90")
+    parser.add_argument("--timeout", type=float, default=600.0)
+    parser.add_argument("--work-dir", type=Path, default=None, help="reuse generated models and images")
+    parser.add_argument("--output", type=Path, default=ROOT / THREADING_PROFILE_PATH)
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or Path(tempfile.mkdtemp(prefix="skin-tune-"))
+    prepare_environment(work_dir, work_dir / "models")
+
+    from benchmarks.stub_models import build_stub_models
+    from benchmarks.synthetic_images import write_images
+
+    build_stub_models(work_dir / "models")
+    image = write_images(work_dir / "images", {args.size: RESOLUTIONS[args.size]})[args.size]
+    paths = [image] * args.request_images
+
+    # threads and workers interact, so they are swept together; batch size is tuned on the winner
+    candidates = [
+        ThreadingProfile(intra, inter, workers, args.batch_sizes[0], args.affinity)
+        for workers in args.workers
+        for intra in args.intra
+        for inter in args.inter
+        if args.oversubscribe or intra * workers <= cpus
+    ]
+    print(f"Tuning on {cpus} CPUs: {len(candidates)} thread/worker trials, then {len(args.batch_sizes) - 1} "
+          f"batch size trials", file=sys.stderr)
+    trials = sweep(candidates, args, paths)
+    best, _ = pick_best(trials, args.max_p90_ms)
+
+    trials += sweep([
+        ThreadingProfile(best.intra_op_threads, best.inter_op_threads, best.inference_workers, batch_size,
+                         args.affinity)
+        for batch_size in args.batch_sizes[1:]
+    ], args, paths)
+    best, result = pick_best(trials, args.max_p90_ms)
+
+    best.tuned = {
+        "commit": get_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "platform": platform.platform(),
+        "cpus": cpus,
+        "workload": {"size": args.size, "request_images": args.request_images, "requests": args.requests},
+        "result": result,
+        "trials": [
+            {"intra_op_threads": profile.intra_op_threads, "inter_op_threads": profile.inter_op_threads,
+             "inference_workers": profile.inference_workers, "batch_size": profile.batch_size, **trial_result}
+            for profile, trial_result in trials
+        ]
+    }
+    best.save(args.output)
+    print(f"Best: {describe(best)} {result['images_per_second']:.2f} img/s, profile written to {args.output}",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
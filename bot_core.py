@@ -1,16 +1,31 @@
 import asyncio
+import os
 
+from dotenv import load_dotenv
+from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, CallbackQueryHandler
 
+from data.enums import BotMode
 from database.database import init_db
+from files.scratch_janitor import scratch_janitor
 from handler.callback_handler import handle_callback
 from handler.command_handler import start_command, help_command, create_new_connection_id_command, \
     remove_connection_by_name_command, get_user_connections_command
 from handler.photo_handler import handle_user_photo
+from monitoring.process_stats import process_stats
+
+load_dotenv()
+BOT_MODE = BotMode(os.getenv("BOT_MODE", BotMode.POLLING.value).lower())
+WEBHOOK_URL = os.getenv("TELEGRAM_WEBHOOK_URL")
+WEBHOOK_PATH = os.getenv("TELEGRAM_WEBHOOK_PATH", "/telegram/webhook")
+WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET", "")
 
 
 def build_bot_application(token: str) -> Application:
-    application = Application.builder().token(token).build()
+    builder = Application.builder().token(token)
+    if BOT_MODE == BotMode.WEBHOOK:
+        builder = builder.updater(None)
+    application = builder.build()
 
     application.add_handler(CommandHandler("start", start_command))
     application.add_handler(CommandHandler("help", help_command))
@@ -26,6 +41,8 @@ def build_bot_application(token: str) -> Application:
 async def start_polling_bot(application):
     try:
         await init_db()
+        scratch_janitor.start()
+        process_stats.start()
         await application.initialize()
         await application.start()
         await application.updater.start_polling()
@@ -37,6 +54,40 @@ async def start_polling_bot(application):
     except Exception as e:
         print(f"Bot error: {e}")
     finally:
+        await process_stats.stop()
         await application.updater.stop()
         await application.stop()
-        await application.shutdown()
\ No newline at end of file
+        await application.shutdown()
+
+async def start_webhook_bot(application: Application):
+    # without the secret anyone who can reach the API could post forged updates as any Telegram user
+    if not WEBHOOK_SECRET:
+        raise ValueError("TELEGRAM_WEBHOOK_SECRET must be set in webhook mode")
+
+    await init_db()
+    await application.initialize()
+    await application.start()
+
+    if WEBHOOK_URL:
+        await application.bot.set_webhook(
+            url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=Update.ALL_TYPES,
+            drop_pending_updates=False
+        )
+        print(f"Bot webhook registered at {WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}")
+    else:
+        print("TELEGRAM_WEBHOOK_URL not set, accepting locally posted updates only")
+
+async def stop_webhook_bot(application: Application):
+    try:
+        await application.stop()
+    finally:
+        await application.shutdown()
+
+async def feed_webhook_update(application: Application, data: dict) -> bool:
+    update = Update.de_json(data, application.bot)
+    if update is None:
+        return False
+    await application.update_queue.put(update)
+    return True
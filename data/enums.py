@@ -28,4 +28,8 @@ class SkinDetectType(str, Enum):
 
 class Platform(str, Enum):
     API = "api",
-    TELEGRAM = "telegram"
\ No newline at end of file
+    TELEGRAM = "telegram"
+
+class BotMode(str, Enum):
+    POLLING = "polling",
+    WEBHOOK = "webhook"
\ No newline at end of file
@@ -44,13 +44,18 @@ class AnalysisResult:
         return self.label
 
 class AnalyseServiceResult():
-    def __init__(self, status: ProcessImageStatus, message_key: str = None, image_path: Path = None, analysis_results: list[AnalysisResult] = None):
+    def __init__(self, status: ProcessImageStatus, message_key: str = None, image_path: Path = None, analysis_results: list[AnalysisResult] = None,
+                 image_name: str = None, peak_memory_bytes: int = 0):
         self.status = status
         self.message_key = message_key
         self.image_path = image_path
         self.analysis_results = analysis_results
+        self.image_name = image_name
+        self.peak_memory_bytes = peak_memory_bytes
 
     def get_status(self): return self.status
     def get_message_key(self): return self.message_key if self.message_key is not None else ""
     def get_image_path(self): return self.image_path if self.image_path is not None else ""
+    def get_image_name(self): return self.image_name if self.image_name is not None else ""
+    def get_peak_memory_bytes(self): return self.peak_memory_bytes
     def get_analysis_results(self): return self.analysis_results if self.analysis_results is not None and not [Any] else []
\ No newline at end of file
@@ -22,11 +22,22 @@ class AnalysisResponse(BaseModel):
     image_url: Optional[str] = None
     analysis_results: List[AnalysisItemSchema] = []
 
+class BatchAnalysisResponse(BaseModel):
+    status: ProcessImageStatus
+    message: str
+    results: List[AnalysisResponse] = []
+
 class TaskStatus(str, Enum):
     PENDING = "pending"
     PROCESSING = "processing"
     COMPLETED = "completed"
     FAILED = "failed"
+    CANCELLED = "cancelled"
+
+class TaskChildSchema(BaseModel):
+    task_id: str
+    status: TaskStatus
+    progress: Optional[int] = None
 
 class TaskResponse(BaseModel):
     task_id: str
@@ -35,4 +46,7 @@ class TaskResponse(BaseModel):
     created_at: datetime
     updated_at: Optional[datetime] = None
     result_url: Optional[str] = None
-    progress: Optional[int] = None
\ No newline at end of file
+    progress: Optional[int] = None
+    deadline: Optional[datetime] = None
+    trace_id: Optional[str] = None
+    children: Optional[List[TaskChildSchema]] = None
\ No newline at end of file
@@ -1,6 +1,8 @@
+import os
 import uuid
 from typing import Optional
 
+from dotenv import load_dotenv
 from pydantic import BaseModel
 from sqlalchemy import Column, Integer, BigInteger, ForeignKey, String, Boolean, DateTime, func
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
@@ -9,10 +11,12 @@ from sqlalchemy.orm import relationship
 
 from files.file_manager import file_manager
 
-DATABASE_URL = f"sqlite+aiosqlite:///{file_manager.get_database_path()}"
+load_dotenv()
+DATABASE_URL = os.getenv("DATABASE_URL") or f"sqlite+aiosqlite:///{file_manager.get_database_path()}"
+DATABASE_ECHO = os.getenv("DATABASE_ECHO", "true").lower() == "true"
 Base = declarative_base()
 
-engine = create_async_engine(DATABASE_URL, echo=True)
+engine = create_async_engine(DATABASE_URL, echo=DATABASE_ECHO)
 AsyncSessionLocal = async_sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 class User(Base):
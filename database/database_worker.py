@@ -6,11 +6,13 @@ from sqlalchemy.orm import selectinload
 
 from data.enums import APIStatus
 from database.database import get_db, Connection, Device, User
+from monitoring.metrics import timed_db_call
 from transflate.translator import translator
 
 
 class DatabaseWorker:
     @staticmethod
+    @timed_db_call
     async def create_connection(user_id: int, name: str, max_devices: int = 3) -> Tuple[Optional[Connection], APIStatus]:
         async for db in get_db():
             try:
@@ -36,6 +38,7 @@ class DatabaseWorker:
                 raise sqlex
 
     @staticmethod
+    @timed_db_call
     async def remove_connection(user_id: int, name: str) -> APIStatus:
         async for db in get_db():
             try:
@@ -55,6 +58,7 @@ class DatabaseWorker:
                 raise sqlex
 
     @staticmethod
+    @timed_db_call
     async def get_user_connections(user_id: int):
         async for db in get_db():
             try:
@@ -71,6 +75,7 @@ class DatabaseWorker:
                 raise sqlex
 
     @staticmethod
+    @timed_db_call
     async def add_device(connection_id: str, device_info: dict) -> Tuple[Optional[Device], APIStatus]:
         async for db in get_db():
             try:
@@ -130,6 +135,7 @@ class DatabaseWorker:
                 raise sqlex
 
     @staticmethod
+    @timed_db_call
     async def disconnect_device(device_uid: str, connection_id: str = None) -> APIStatus:
         async for db in get_db():
             try:
@@ -157,6 +163,7 @@ class DatabaseWorker:
                 raise sqlex
 
     @staticmethod
+    @timed_db_call
     async def get_device_active_status(connection_id: str, device_uid: str) -> Tuple[bool, APIStatus]:
         async for db in get_db():
             stmt = select(Device).join(Connection).where(
@@ -171,6 +178,7 @@ class DatabaseWorker:
             return device.is_active, APIStatus.SUCCESS
 
     @staticmethod
+    @timed_db_call
     async def get_active_devices(connection_id: str) -> Tuple[Optional[list[Device]], APIStatus]:
         async for db in get_db():
             if not connection_id:
@@ -191,6 +199,7 @@ class DatabaseWorker:
                 raise sqlex
 
     @staticmethod
+    @timed_db_call
     async def get_connection_by_id(connection_id: str) -> Optional[Connection]:
         async for db in get_db():
             try:
@@ -206,6 +215,7 @@ class DatabaseWorker:
                 raise sqlex
 
     @staticmethod
+    @timed_db_call
     async def get_or_update_user(user_id: int, lang_from_tg: str):
         lang = lang_from_tg[:2].lower() if lang_from_tg else "en"
         if lang not in translator.get_available_languages():
@@ -235,6 +245,7 @@ class DatabaseWorker:
                 raise sqlex
 
     @staticmethod
+    @timed_db_call
     async def get_language_by_user_id(user_id: int):
         async for db in get_db():
             try:
@@ -249,6 +260,7 @@ class DatabaseWorker:
                 raise sqlex
 
     @staticmethod
+    @timed_db_call
     async def get_language_by_connection_id(connection_id: str):
         async for db in get_db():
             try:
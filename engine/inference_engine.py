@@ -1,27 +1,91 @@
 from pathlib import Path
 
+import cv2
 import numpy as np
 import tensorflow as tf
 
 from data.model_results import ModelPredictResult
+from engine.tensor_buffers import CLASSIFIER_SIZE, tensor_buffers
+from engine.threading_profile import threading_config
 from files.file_manager import file_manager
 
 
+def get_nearest_indices(src: int, dst: int) -> np.ndarray:
+    # PIL's nearest resize, which keras load_img used, walks the source by adding the scale once per output
+    # pixel from half a step in; cv2's nearest modes compute each index directly and round differently for
+    # some sizes, so the same doubles are accumulated here
+    scale = src / dst
+    steps = np.full(dst, scale)
+    steps[0] = scale * 0.5
+    return np.minimum(np.add.accumulate(steps).astype(np.intp), src - 1)
+
+
 class InferenceEngine:
     def __init__(self):
-        self.model: tf.keras.Model = tf.keras.models.load_model(str(file_manager.get_classification_model_path()))
+        self._model: tf.keras.Model | None = None
         self.class_names = ["healthy", "nevus", "problem"]
 
+    @property
+    def model(self) -> tf.keras.Model:
+        # loaded on first use so a supervisor can import this module and fork before TF starts its thread pools
+        if self._model is None:
+            threading_config.apply()
+            self._model = tf.keras.models.load_model(str(file_manager.get_classification_model_path()))
+        return self._model
+
     def predict_crop(self, crop_path: Path):
-        img = tf.keras.utils.load_img(str(crop_path), target_size=(224, 224))
-        img_array = tf.keras.utils.img_to_array(img)
-        img_array = np.expand_dims(img_array, axis=0)
-        predictions = self.model.predict(img_array, verbose=0)
-        class_idx = np.argmax(predictions[0])
+        return self.predict_crops([crop_path])[0]
+
+    def predict_crops(self, crop_paths: list[Path]) -> list[ModelPredictResult]:
+        if not crop_paths:
+            return []
+
+        batch = tensor_buffers.classifier_batch(len(crop_paths))
+        for crop_path, slot in zip(crop_paths, batch):
+            image = cv2.imread(str(crop_path), cv2.IMREAD_COLOR)
+            if image is None:
+                raise ValueError(f"Could not read crop at path: {crop_path}")
+            self.write_crop_input(image, slot)
+        return self.classify(batch)
+
+    def predict_images(self, images: list[np.ndarray]) -> list[ModelPredictResult]:
+        if not images:
+            return []
+
+        batch = tensor_buffers.classifier_batch(len(images))
+        for image, slot in zip(images, batch):
+            self.write_classifier_input(image, slot, cv2.INTER_NEAREST)
+        return self.classify(batch)
+
+    @staticmethod
+    def write_crop_input(image: np.ndarray, out: np.ndarray):
+        height, width = image.shape[:2]
+        pixels = tensor_buffers.classifier_pixels
+        np.multiply(get_nearest_indices(height, CLASSIFIER_SIZE)[:, None], width, out=pixels)
+        np.add(pixels, get_nearest_indices(width, CLASSIFIER_SIZE), out=pixels)
+        np.take(image.reshape(-1, 3), pixels, axis=0, out=tensor_buffers.classifier_resized)
+        np.copyto(out, tensor_buffers.classifier_resized[..., ::-1])
+
+    @staticmethod
+    def write_classifier_input(image: np.ndarray, out: np.ndarray, interpolation: int):
+        resized = cv2.resize(image, (CLASSIFIER_SIZE, CLASSIFIER_SIZE), dst=tensor_buffers.classifier_resized,
+                             interpolation=interpolation)
+        np.copyto(out, resized[..., ::-1])
+
+    def classify(self, batch: np.ndarray) -> list[ModelPredictResult]:
+        # a direct call skips the tf.data pipeline model.predict builds on every invocation
+        results = []
+        for chunk in threading_config.profile.split(len(batch)):
+            predictions = self.model(batch[chunk], training=False)
+            results.extend(self.to_predict_result(prediction) for prediction in np.asarray(predictions))
+        return results
+
+    def to_predict_result(self, prediction: np.ndarray) -> ModelPredictResult:
+        class_idx = np.argmax(prediction)
 
         return ModelPredictResult(
             label=self.class_names[class_idx],
-            confidence=float(np.max(predictions[0]))
+            confidence=float(np.max(prediction))
         )
 
 
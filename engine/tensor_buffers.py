@@ -0,0 +1,43 @@
+import threading
+
+import numpy as np
+
+DETECTOR_SIZE = 640
+CLASSIFIER_SIZE = 224
+
+
+class TensorBuffers(threading.local):
+    def __init__(self):
+        self.detector_resized = np.empty((DETECTOR_SIZE, DETECTOR_SIZE, 3), np.uint8)
+        self.classifier_resized = np.empty((CLASSIFIER_SIZE, CLASSIFIER_SIZE, 3), np.uint8)
+        self.classifier_pixels = np.empty((CLASSIFIER_SIZE, CLASSIFIER_SIZE), np.intp)
+        self._detector_batch = np.empty((1, DETECTOR_SIZE, DETECTOR_SIZE, 3), np.float32)
+        self._classifier_batch = np.empty((8, CLASSIFIER_SIZE, CLASSIFIER_SIZE, 3), np.float32)
+        self.grows = 0
+
+    def _grow(self, buffer: np.ndarray, size: int) -> np.ndarray:
+        # doubling keeps a worker that sees gradually larger batches from reallocating on every new maximum
+        self.grows += 1
+        return np.empty((max(size, buffer.shape[0] * 2), *buffer.shape[1:]), buffer.dtype)
+
+    def detector_batch(self, size: int) -> np.ndarray:
+        if self._detector_batch.shape[0] < size:
+            self._detector_batch = self._grow(self._detector_batch, size)
+        return self._detector_batch[:size]
+
+    def classifier_batch(self, size: int) -> np.ndarray:
+        if self._classifier_batch.shape[0] < size:
+            self._classifier_batch = self._grow(self._classifier_batch, size)
+        return self._classifier_batch[:size]
+
+    def get_stats(self) -> dict[str, int]:
+        return {
+            "detector_capacity": self._detector_batch.shape[0],
+            "classifier_capacity": self._classifier_batch.shape[0],
+            "bytes": self._detector_batch.nbytes + self._classifier_batch.nbytes
+                     + self.detector_resized.nbytes + self.classifier_resized.nbytes + self.classifier_pixels.nbytes,
+            "grows": self.grows
+        }
+
+
+tensor_buffers = TensorBuffers()
@@ -0,0 +1,105 @@
+import json
+import os
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+THREADING_PROFILE_PATH = os.getenv("THREADING_PROFILE_PATH", "files/threading_profile.json")
+TF_INTRA_OP_THREADS = os.getenv("TF_INTRA_OP_THREADS")
+TF_INTER_OP_THREADS = os.getenv("TF_INTER_OP_THREADS")
+INFERENCE_BATCH_SIZE = os.getenv("INFERENCE_BATCH_SIZE")
+INFERENCE_CPU_AFFINITY = os.getenv("INFERENCE_CPU_AFFINITY")
+
+
+@dataclass
+class ThreadingProfile:
+    intra_op_threads: int = 0
+    inter_op_threads: int = 0
+    inference_workers: int = 0
+    batch_size: int = 0
+    cpu_affinity: bool = False
+    tuned: dict = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, path: Path | str = THREADING_PROFILE_PATH) -> "ThreadingProfile":
+        profile = cls()
+        try:
+            data = json.loads(Path(path).read_text())
+            profile = cls(**{key: value for key, value in data.items() if key in cls.__dataclass_fields__})
+            print(f"Loaded threading profile from {path}")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, TypeError) as e:
+            print(f"Ignoring threading profile {path}: {e}")
+
+        # explicit env settings win over the tuned profile so one worker can be adjusted without retuning
+        if TF_INTRA_OP_THREADS:
+            profile.intra_op_threads = int(TF_INTRA_OP_THREADS)
+        if TF_INTER_OP_THREADS:
+            profile.inter_op_threads = int(TF_INTER_OP_THREADS)
+        if INFERENCE_BATCH_SIZE:
+            profile.batch_size = int(INFERENCE_BATCH_SIZE)
+        if INFERENCE_CPU_AFFINITY:
+            profile.cpu_affinity = INFERENCE_CPU_AFFINITY.lower() == "true"
+        return profile
+
+    def save(self, path: Path | str = THREADING_PROFILE_PATH):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(asdict(self), indent=2))
+
+    def split(self, size: int) -> list[slice]:
+        step = self.batch_size if self.batch_size > 0 else max(size, 1)
+        return [slice(start, start + step) for start in range(0, size, step)]
+
+    def get_worker_cpus(self, index: int, workers: int) -> Optional[set[int]]:
+        if not self.cpu_affinity or not hasattr(os, "sched_getaffinity"):
+            return None
+        cpus = sorted(os.sched_getaffinity(0))
+        # contiguous groups keep a worker's threads on neighbouring cores, workers beyond the core count share groups
+        group = max(1, self.intra_op_threads or len(cpus) // max(workers, 1))
+        start = (index * group) % len(cpus)
+        return set(cpus[start:start + group])
+
+
+class ThreadingConfig:
+    def __init__(self):
+        self.profile = ThreadingProfile.load()
+        self.applied = False
+
+    def apply(self):
+        # TF fixes its pools when the runtime starts, so this has to run before the first model load or op
+        if self.applied:
+            return
+        self.applied = True
+        import tensorflow as tf
+
+        try:
+            if self.profile.intra_op_threads:
+                tf.config.threading.set_intra_op_parallelism_threads(self.profile.intra_op_threads)
+            if self.profile.inter_op_threads:
+                tf.config.threading.set_inter_op_parallelism_threads(self.profile.inter_op_threads)
+        except RuntimeError as e:
+            print(f"TensorFlow threading left at defaults, runtime already initialized: {e}")
+            return
+        if self.profile.intra_op_threads or self.profile.inter_op_threads:
+            print(f"TensorFlow threads: intra-op {self.profile.intra_op_threads or 'default'}, "
+                  f"inter-op {self.profile.inter_op_threads or 'default'}")
+
+    def pin_worker(self, index: int, workers: int):
+        cpus = self.profile.get_worker_cpus(index, workers)
+        if cpus:
+            os.sched_setaffinity(0, cpus)
+            print(f"Inference worker {os.getpid()} pinned to CPUs {sorted(cpus)}")
+
+    def get_stats(self) -> dict:
+        stats = asdict(self.profile)
+        stats.pop("tuned")
+        stats["applied"] = self.applied
+        return stats
+
+
+threading_config = ThreadingConfig()
@@ -1,23 +1,52 @@
+import asyncio
 import os
+import uuid
+from contextlib import asynccontextmanager
 from pathlib import Path
 import shutil
+from typing import AsyncIterator, Optional
+
+from dotenv import load_dotenv
+
+from files.storage_backend import StorageBackend, create_storage_backend
+
+load_dotenv()
+SCRATCH_PATH = os.getenv("SCRATCH_PATH")
+MODELS_PATH = os.getenv("MODELS_PATH")
+
+SCRATCH_OWNER_FILE = ".owner"
+SCRATCH_PENDING_PREFIX = "."
+
+
+def is_process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
 
 class FileManager:
-    def __init__(self, base_path: str = "files"):
+    def __init__(self, base_path: str = "files", scratch_path: str = None, models_path: str = None):
         self.base_path = Path(base_path)
-        self.temp_path = self.base_path / "temp"
-        self.models_path = self.base_path / "models"
+        self.temp_path = Path(scratch_path) if scratch_path else self.base_path / "temp"
+        self.models_path = Path(models_path) if models_path else self.base_path / "models"
         self.users_files_path = self.base_path / "users_files"
+        self.results_path = self.base_path / "results"
         self.classification_model_name = "SkinAnalysis_AI.keras"
         self.detector_model_name = "SkinAnalysisDetector"
         self.database_name = "skin_analysis_BotAndAPI_data.db"
         self.setup_directories()
+        self.results_backend: StorageBackend = create_storage_backend(self.results_path)
 
     def setup_directories(self):
         self.base_path.mkdir(parents=True, exist_ok=True)
         self.temp_path.mkdir(parents=True, exist_ok=True)
         self.models_path.mkdir(parents=True, exist_ok=True)
         self.users_files_path.mkdir(parents=True, exist_ok=True)
+        self.results_path.mkdir(parents=True, exist_ok=True)
 
     def get_user_folder(self, user_id: int) -> Path:
         user_path = self.users_files_path / str(user_id)
@@ -25,39 +54,72 @@ class FileManager:
             user_path.mkdir(parents=True, exist_ok=True)
         return user_path
 
+    def get_blob_key(self, digest: str, extension: str = ".png") -> str:
+        return f"{digest[:2]}/{digest}{extension}"
+
     def write_file_data(self, file_data: bytes, file_path: str | Path) -> str:
         with open(file_path, "wb") as f:
             f.write(file_data)
 
         return str(file_path)
 
-    def save_temporary_photo(self, photo_data: bytes, user_id: int, photo_name: str = None) -> Path:
-        if photo_name is not None:
-            name, extension = os.path.splitext(photo_name)
-            exit_file_path = self.temp_path / f"{name}_{user_id}{extension or '.png'}"
-        else:
-            exit_file_path = self.temp_path / f"UserPhoto_{user_id}.png"
+    async def write_file_data_async(self, file_data: bytes, file_path: str | Path) -> str:
+        return await asyncio.to_thread(self.write_file_data, file_data, file_path)
+
+    def create_scratch(self, user_id: int) -> Path:
+        scratch_dir = self.temp_path / f"task_{user_id}_{uuid.uuid4().hex}"
+        # built under a hidden name and renamed into place, so no janitor ever sees it without an owner
+        pending = scratch_dir.with_name(f"{SCRATCH_PENDING_PREFIX}{scratch_dir.name}")
+        pending.mkdir(parents=True)
+        self.claim_scratch(pending)
+        os.rename(pending, scratch_dir)
+        return scratch_dir
+
+    def claim_scratch(self, scratch_dir: Path, pid: Optional[int] = None):
+        # ownership is recorded in the directory itself: under the supervisor one process creates it,
+        # another releases it, and every process runs a janitor that must leave it alone meanwhile
+        marker = scratch_dir / SCRATCH_OWNER_FILE
+        pending = marker.with_name(f"{SCRATCH_OWNER_FILE}.{os.getpid()}")
+        pending.write_text(str(pid or os.getpid()))
+        os.replace(pending, marker)
+
+    @staticmethod
+    def get_scratch_owner(scratch_dir: Path) -> Optional[int]:
+        try:
+            return int((scratch_dir / SCRATCH_OWNER_FILE).read_text())
+        except (OSError, ValueError):
+            return None
 
-        self.write_file_data(photo_data, exit_file_path)
-        return exit_file_path
+    def is_scratch_active(self, scratch_dir: Path) -> bool:
+        pid = self.get_scratch_owner(scratch_dir)
+        return pid is not None and is_process_alive(pid)
+
+    def release_scratch(self, scratch_dir: Path):
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    async def create_scratch_async(self, user_id: int) -> Path:
+        return await asyncio.to_thread(self.create_scratch, user_id)
 
-    def clear_user_temp(self, user_id: int):
-        for file in self.temp_path.iterdir():
-            if str(user_id) in file.name:
-                file.unlink()
+    async def release_scratch_async(self, scratch_dir: Path):
+        await asyncio.to_thread(self.release_scratch, scratch_dir)
 
+    @asynccontextmanager
+    async def scratch(self, user_id: int) -> AsyncIterator[Path]:
+        scratch_dir = await asyncio.to_thread(self.create_scratch, user_id)
         try:
-            shutil.rmtree(self.get_crops_directory(user_id), ignore_errors=True)
-        except FileNotFoundError:
-            pass
+            yield scratch_dir
+        finally:
+            await asyncio.to_thread(self.release_scratch, scratch_dir)
 
-    def get_crops_directory(self, user_id: int) -> Path:
-        return self.temp_path / f"user_{user_id}_crops"
+    def save_temporary_photo(self, photo_data: bytes, scratch_dir: Path, photo_name: str = None) -> Path:
+        extension = os.path.splitext(photo_name)[1] if photo_name is not None else ""
+        exit_file_path = scratch_dir / f"photo_{uuid.uuid4().hex[:8]}{extension or '.png'}"
 
-    def ensure_crops_directory(self, user_id: int) -> Path:
-        crops_path = self.get_crops_directory(user_id)
-        crops_path.mkdir(parents=True, exist_ok=True)
-        return crops_path
+        self.write_file_data(photo_data, exit_file_path)
+        return exit_file_path
+
+    async def save_temporary_photo_async(self, photo_data: bytes, scratch_dir: Path, photo_name: str = None) -> Path:
+        return await asyncio.to_thread(self.save_temporary_photo, photo_data, scratch_dir, photo_name)
 
     def get_classification_model_path(self) -> Path:
         model_path = self.models_path / self.classification_model_name
@@ -87,6 +149,9 @@ class FileManager:
 
         raise FileNotFoundError(f"File not found: {path_to_file}")
 
+    async def get_file_async(self, file_path: str) -> bytes:
+        return await asyncio.to_thread(self.get_file, file_path)
+
     def delete_file(self, file_path: str):
         path_to_file = Path(file_path)
         if path_to_file.exists():
@@ -95,5 +160,11 @@ class FileManager:
                 return
         raise FileNotFoundError(f"File not found: {path_to_file}")
 
+    async def delete_file_async(self, file_path: str):
+        await asyncio.to_thread(self.delete_file, file_path)
+
+    async def file_exists_async(self, file_path: str | Path) -> bool:
+        return await asyncio.to_thread(Path(file_path).is_file)
+
 
-file_manager = FileManager()
\ No newline at end of file
+file_manager = FileManager(scratch_path=SCRATCH_PATH, models_path=MODELS_PATH)
@@ -0,0 +1,216 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+
+from dotenv import load_dotenv
+from redis.asyncio import Redis
+
+from files.file_manager import file_manager, FileManager
+from files.storage_backend import StorageBackend
+from storage.redis_client import redis_connection
+
+load_dotenv()
+RESULT_USER_QUOTA_BYTES = int(os.getenv("RESULT_USER_QUOTA_BYTES", 200 * 1024 * 1024))
+RESULT_GLOBAL_QUOTA_BYTES = int(os.getenv("RESULT_GLOBAL_QUOTA_BYTES", 10 * 1024 * 1024 * 1024))
+
+
+CONTENT_TYPES = {".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".webp": "image/webp"}
+
+
+class StoredResult:
+    def __init__(self, ref_id: str, digest: str, key: str, path: Optional[Path], size: int, extension: str):
+        self.ref_id = ref_id
+        self.digest = digest
+        self.key = key
+        self.path = path
+        self.size = size
+        self.extension = extension
+
+    def get_content_type(self) -> str:
+        return CONTENT_TYPES.get(self.extension, "application/octet-stream")
+
+    def get_image_name(self) -> str:
+        return f"{self.ref_id}{self.extension}"
+
+
+class ResultStore:
+    def __init__(self, manager: FileManager, prefix: str = "results:",
+                 user_quota_bytes: int = RESULT_USER_QUOTA_BYTES,
+                 global_quota_bytes: int = RESULT_GLOBAL_QUOTA_BYTES):
+        self.manager = manager
+        self.prefix = prefix
+        self.user_quota_bytes = user_quota_bytes
+        self.global_quota_bytes = global_quota_bytes
+
+    @property
+    def redis(self) -> Redis:
+        return redis_connection.client
+
+    def _ref_key(self, ref_id: str) -> str: return f"{self.prefix}ref:{ref_id}"
+    def _blob_key(self, digest: str) -> str: return f"{self.prefix}blob:{digest}"
+    def _blob_refs_key(self, digest: str) -> str: return f"{self.prefix}blob:{digest}:refs"
+    def _user_lru_key(self, user_id: int) -> str: return f"{self.prefix}user:{user_id}:lru"
+    def _global_lru_key(self) -> str: return f"{self.prefix}lru"
+    def _user_usage_key(self) -> str: return f"{self.prefix}usage:users"
+    def _global_usage_key(self) -> str: return f"{self.prefix}usage:total"
+
+    @property
+    def backend(self) -> StorageBackend:
+        return self.manager.results_backend
+
+    @staticmethod
+    def _hash_file(file_path: Path, chunk_size: int = 1024 * 1024) -> tuple[str, int]:
+        digest = hashlib.sha256()
+        size = 0
+        with open(file_path, "rb") as f:
+            while chunk := f.read(chunk_size):
+                digest.update(chunk)
+                size += len(chunk)
+        return digest.hexdigest(), size
+
+    def _stored(self, ref_id: str, digest: str, size: int, extension: str) -> StoredResult:
+        key = self.manager.get_blob_key(digest, extension)
+        return StoredResult(ref_id=ref_id, digest=digest, key=key, path=self.backend.local_path(key), size=size,
+                            extension=extension)
+
+    async def put(self, user_id: int, data: bytes, ref_id: str = None, extension: str = ".png") -> StoredResult:
+        ref_id = ref_id or uuid.uuid4().hex
+        await self.release(ref_id)
+
+        digest = hashlib.sha256(data).hexdigest()
+        key = self.manager.get_blob_key(digest, extension)
+        if not await self.backend.exists(key):
+            await self.backend.put_bytes(key, data, CONTENT_TYPES.get(extension, "application/octet-stream"))
+
+        return await self._add_ref(user_id, ref_id, digest, len(data), extension)
+
+    async def put_file(self, user_id: int, file_path: Path, ref_id: str = None) -> StoredResult:
+        ref_id = ref_id or uuid.uuid4().hex
+        await self.release(ref_id)
+
+        extension = Path(file_path).suffix or ".png"
+        digest, size = await asyncio.to_thread(self._hash_file, Path(file_path))
+        key = self.manager.get_blob_key(digest, extension)
+        if not await self.backend.exists(key):
+            await self.backend.put_file(key, Path(file_path), CONTENT_TYPES.get(extension, "application/octet-stream"))
+
+        return await self._add_ref(user_id, ref_id, digest, size, extension)
+
+    async def _add_ref(self, user_id: int, ref_id: str, digest: str, size: int, extension: str) -> StoredResult:
+        now = time.time()
+
+        async with redis_connection.pipeline(transaction=True) as pipe:
+            pipe.set(self._ref_key(ref_id), json.dumps({
+                "digest": digest,
+                "user_id": user_id,
+                "size": size,
+                "extension": extension
+            }))
+            pipe.hsetnx(self._blob_key(digest), "size", size)
+            pipe.hsetnx(self._blob_key(digest), "extension", extension)
+            pipe.sadd(self._blob_refs_key(digest), ref_id)
+            pipe.zadd(self._global_lru_key(), {digest: now})
+            pipe.zadd(self._user_lru_key(user_id), {ref_id: now})
+            pipe.hincrby(self._user_usage_key(), str(user_id), size)
+            is_new_blob = (await redis_connection.execute_pipeline(pipe))[1]
+
+        if is_new_blob:
+            await self.redis.incrby(self._global_usage_key(), size)
+
+        await self.enforce_quotas(user_id, keep_ref_id=ref_id)
+        return self._stored(ref_id, digest, size, extension)
+
+    async def resolve(self, user_id: int | str, ref_id: str) -> Optional[StoredResult]:
+        raw_ref = await self.redis.get(self._ref_key(ref_id))
+        if not raw_ref:
+            return None
+
+        ref = json.loads(raw_ref)
+        if str(ref["user_id"]) != str(user_id):
+            return None
+
+        stored = self._stored(ref_id, ref["digest"], ref["size"], ref["extension"])
+        if not await self.backend.exists(stored.key):
+            await self.release(ref_id)
+            return None
+
+        now = time.time()
+        async with redis_connection.pipeline(transaction=False) as pipe:
+            pipe.zadd(self._global_lru_key(), {ref["digest"]: now}, xx=True)
+            pipe.zadd(self._user_lru_key(ref["user_id"]), {ref_id: now}, xx=True)
+            await redis_connection.execute_pipeline(pipe)
+
+        return stored
+
+    async def read_image(self, user_id: int | str, image_name: str) -> Optional[bytes]:
+        stored = await self.resolve(user_id, Path(image_name).stem)
+        if stored is None:
+            return None
+        return await self.backend.get_bytes(stored.key)
+
+    async def release(self, ref_id: str) -> bool:
+        raw_ref = await self.redis.getdel(self._ref_key(ref_id))
+        if not raw_ref:
+            return False
+
+        ref = json.loads(raw_ref)
+        digest = ref["digest"]
+
+        async with redis_connection.pipeline(transaction=True) as pipe:
+            pipe.srem(self._blob_refs_key(digest), ref_id)
+            pipe.zrem(self._user_lru_key(ref["user_id"]), ref_id)
+            pipe.hincrby(self._user_usage_key(), str(ref["user_id"]), -ref["size"])
+            pipe.scard(self._blob_refs_key(digest))
+            remaining_refs = (await redis_connection.execute_pipeline(pipe))[3]
+
+        if remaining_refs == 0:
+            await self._delete_blob(digest, ref["extension"])
+        return True
+
+    async def _delete_blob(self, digest: str, extension: str):
+        async with redis_connection.pipeline(transaction=True) as pipe:
+            pipe.hget(self._blob_key(digest), "size")
+            pipe.delete(self._blob_key(digest))
+            pipe.zrem(self._global_lru_key(), digest)
+            size, deleted, _ = await redis_connection.execute_pipeline(pipe)
+
+        if deleted:
+            await self.redis.decrby(self._global_usage_key(), int(size or 0))
+            await self.backend.delete(self.manager.get_blob_key(digest, extension))
+
+    async def evict_blob(self, digest: str):
+        ref_ids = await self.redis.smembers(self._blob_refs_key(digest))
+        for ref_id in ref_ids:
+            await self.release(ref_id.decode("utf-8"))
+
+        extension = await self.redis.hget(self._blob_key(digest), "extension")
+        if extension is not None:
+            await self._delete_blob(digest, extension.decode("utf-8"))
+        else:
+            await self.redis.zrem(self._global_lru_key(), digest)
+
+    async def enforce_quotas(self, user_id: int, keep_ref_id: str = None):
+        while int(await self.redis.hget(self._user_usage_key(), str(user_id)) or 0) > self.user_quota_bytes:
+            oldest = await self.redis.zrange(self._user_lru_key(user_id), 0, 0)
+            if not oldest or oldest[0].decode("utf-8") == keep_ref_id:
+                break
+            await self.release(oldest[0].decode("utf-8"))
+
+        keep_digest = None
+        if keep_ref_id:
+            raw_ref = await self.redis.get(self._ref_key(keep_ref_id))
+            keep_digest = json.loads(raw_ref)["digest"] if raw_ref else None
+
+        while int(await self.redis.get(self._global_usage_key()) or 0) > self.global_quota_bytes:
+            oldest = await self.redis.zrange(self._global_lru_key(), 0, 0)
+            if not oldest or oldest[0].decode("utf-8") == keep_digest:
+                break
+            await self.evict_blob(oldest[0].decode("utf-8"))
+
+
+result_store = ResultStore(file_manager)
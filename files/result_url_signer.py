@@ -0,0 +1,38 @@
+import hashlib
+import hmac
+import os
+import time
+from typing import Optional
+from urllib.parse import quote
+
+from dotenv import load_dotenv
+
+from storage.callback_token import derive_secret
+
+load_dotenv()
+RESULT_URL_SECRET = os.getenv("RESULT_URL_SECRET")
+RESULT_URL_TTL_SECONDS = int(os.getenv("RESULT_URL_TTL_SECONDS", 3600))
+TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+
+
+class ResultUrlSigner:
+    def __init__(self, secret: bytes, ttl_seconds: int = RESULT_URL_TTL_SECONDS):
+        self.secret = secret
+        self.ttl_seconds = ttl_seconds
+
+    def _signature(self, user_id: int | str, image_name: str, expires: int) -> str:
+        message = f"{user_id}/{image_name}:{expires}".encode("utf-8")
+        return hmac.new(self.secret, message, hashlib.sha256).hexdigest()[:32]
+
+    def sign(self, user_id: int | str, image_name: str, ttl_seconds: Optional[int] = None) -> str:
+        expires = int(time.time()) + (ttl_seconds if ttl_seconds is not None else self.ttl_seconds)
+        signature = self._signature(user_id, image_name, expires)
+        return f"/result/{quote(str(user_id))}/{quote(image_name)}?expires={expires}&signature={signature}"
+
+    def verify(self, user_id: int | str, image_name: str, expires: int, signature: str) -> bool:
+        if expires < time.time():
+            return False
+        return hmac.compare_digest(self._signature(user_id, image_name, expires), signature)
+
+
+result_url_signer = ResultUrlSigner(derive_secret(RESULT_URL_SECRET, TOKEN, "result-url"))
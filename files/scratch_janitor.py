@@ -0,0 +1,113 @@
+import asyncio
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from files.file_manager import SCRATCH_PENDING_PREFIX, file_manager, FileManager
+
+load_dotenv()
+SCRATCH_MAX_AGE_SECONDS = int(os.getenv("SCRATCH_MAX_AGE_SECONDS", 3600))
+SCRATCH_MAX_BYTES = int(os.getenv("SCRATCH_MAX_BYTES", 1024 * 1024 * 1024))
+SCRATCH_JANITOR_INTERVAL = int(os.getenv("SCRATCH_JANITOR_INTERVAL", 300))
+
+
+class ScratchJanitor:
+    def __init__(self, manager: FileManager, max_age_seconds: int = SCRATCH_MAX_AGE_SECONDS,
+                 max_bytes: int = SCRATCH_MAX_BYTES, interval_seconds: int = SCRATCH_JANITOR_INTERVAL):
+        self.manager = manager
+        self.max_age_seconds = max_age_seconds
+        self.max_bytes = max_bytes
+        self.interval_seconds = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                removed = await asyncio.to_thread(self.sweep)
+                if removed:
+                    print(f"Scratch janitor removed {removed} orphaned entries")
+            except Exception as e:
+                print(f"Scratch janitor error: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+    def sweep(self) -> int:
+        now = time.time()
+        entries: list[tuple[float, int, Path]] = []
+        total_bytes = 0
+        removed = 0
+
+        for entry in self.manager.get_temp_path().iterdir():
+            if entry.is_dir() and self.manager.is_scratch_active(entry):
+                total_bytes += self._size(entry)
+                continue
+
+            try:
+                mtime = entry.stat().st_mtime
+            except FileNotFoundError:
+                continue
+
+            if now - mtime > self.max_age_seconds:
+                self._remove(entry)
+                removed += 1
+                continue
+            if entry.name.startswith(SCRATCH_PENDING_PREFIX):
+                # a scratch directory still being set up, only left behind for good if its creator crashed
+                continue
+
+            size = self._size(entry)
+            total_bytes += size
+            entries.append((mtime, size, entry))
+
+        entries.sort(key=lambda item: item[0])
+        for mtime, size, entry in entries:
+            if total_bytes <= self.max_bytes:
+                break
+            self._remove(entry)
+            total_bytes -= size
+            removed += 1
+
+        return removed
+
+    @staticmethod
+    def _size(entry: Path) -> int:
+        try:
+            if entry.is_file():
+                return entry.stat().st_size
+            total = 0
+            for root, _, files in os.walk(entry):
+                for name in files:
+                    try:
+                        total += os.path.getsize(os.path.join(root, name))
+                    except FileNotFoundError:
+                        pass
+            return total
+        except FileNotFoundError:
+            return 0
+
+    @staticmethod
+    def _remove(entry: Path):
+        if entry.is_dir():
+            shutil.rmtree(entry, ignore_errors=True)
+        else:
+            entry.unlink(missing_ok=True)
+
+
+scratch_janitor = ScratchJanitor(file_manager)
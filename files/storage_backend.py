@@ -0,0 +1,225 @@
+import asyncio
+import os
+import shutil
+import uuid
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local").lower()
+S3_BUCKET = os.getenv("S3_BUCKET")
+S3_PREFIX = os.getenv("S3_PREFIX", "results/")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")
+S3_REGION = os.getenv("S3_REGION")
+S3_ACCESS_KEY_ID = os.getenv("S3_ACCESS_KEY_ID")
+S3_SECRET_ACCESS_KEY = os.getenv("S3_SECRET_ACCESS_KEY")
+S3_MULTIPART_CHUNK_BYTES = int(os.getenv("S3_MULTIPART_CHUNK_BYTES", 8 * 1024 * 1024))
+
+DEFAULT_CHUNK_SIZE = 256 * 1024
+
+
+class StorageBackend(ABC):
+    @abstractmethod
+    async def put_file(self, key: str, file_path: Path, content_type: str = "application/octet-stream"):
+        pass
+
+    @abstractmethod
+    async def put_bytes(self, key: str, data: bytes, content_type: str = "application/octet-stream"):
+        pass
+
+    @abstractmethod
+    def iter_chunks(self, key: str, chunk_size: int = DEFAULT_CHUNK_SIZE, start: int = 0,
+                    length: Optional[int] = None) -> AsyncIterator[bytes]:
+        pass
+
+    @abstractmethod
+    async def exists(self, key: str) -> bool:
+        pass
+
+    @abstractmethod
+    async def delete(self, key: str):
+        pass
+
+    def local_path(self, key: str) -> Optional[Path]:
+        return None
+
+    async def get_bytes(self, key: str) -> bytes:
+        return b"".join([chunk async for chunk in self.iter_chunks(key)])
+
+
+class LocalStorageBackend(StorageBackend):
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def local_path(self, key: str) -> Optional[Path]:
+        return self.root / key
+
+    def _copy_into(self, key: str, file_path: Path):
+        target = self.root / key
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = target.with_name(f".{target.name}.{uuid.uuid4().hex}")
+        try:
+            os.link(file_path, tmp_path)
+        except OSError:
+            shutil.copyfile(file_path, tmp_path)
+        os.replace(tmp_path, target)
+
+    def _write_into(self, key: str, data: bytes):
+        target = self.root / key
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = target.with_name(f".{target.name}.{uuid.uuid4().hex}")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, target)
+
+    async def put_file(self, key: str, file_path: Path, content_type: str = "application/octet-stream"):
+        await asyncio.to_thread(self._copy_into, key, file_path)
+
+    async def put_bytes(self, key: str, data: bytes, content_type: str = "application/octet-stream"):
+        await asyncio.to_thread(self._write_into, key, data)
+
+    async def iter_chunks(self, key: str, chunk_size: int = DEFAULT_CHUNK_SIZE, start: int = 0,
+                          length: Optional[int] = None) -> AsyncIterator[bytes]:
+        f = await asyncio.to_thread(open, self.root / key, "rb")
+        try:
+            if start:
+                f.seek(start)
+            remaining = length
+            while remaining is None or remaining > 0:
+                chunk = await asyncio.to_thread(f.read, chunk_size if remaining is None else min(chunk_size, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+        finally:
+            f.close()
+
+    async def exists(self, key: str) -> bool:
+        return await asyncio.to_thread((self.root / key).is_file)
+
+    async def delete(self, key: str):
+        await asyncio.to_thread((self.root / key).unlink, missing_ok=True)
+
+
+class S3StorageBackend(StorageBackend):
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: str = None, region: str = None,
+                 access_key_id: str = None, secret_access_key: str = None,
+                 multipart_chunk_bytes: int = S3_MULTIPART_CHUNK_BYTES):
+        import boto3
+        from boto3.s3.transfer import TransferConfig
+        from botocore.config import Config
+        from botocore.exceptions import ClientError
+
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client_error = ClientError
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            region_name=region,
+            aws_access_key_id=access_key_id,
+            aws_secret_access_key=secret_access_key,
+            config=Config(retries={"max_attempts": 3, "mode": "standard"}, max_pool_connections=32)
+        )
+        self.transfer_config = TransferConfig(
+            multipart_threshold=multipart_chunk_bytes,
+            multipart_chunksize=multipart_chunk_bytes,
+            use_threads=True
+        )
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    async def put_file(self, key: str, file_path: Path, content_type: str = "application/octet-stream"):
+        await asyncio.to_thread(
+            self.client.upload_file,
+            str(file_path),
+            self.bucket,
+            self._key(key),
+            ExtraArgs={"ContentType": content_type},
+            Config=self.transfer_config
+        )
+
+    async def put_bytes(self, key: str, data: bytes, content_type: str = "application/octet-stream"):
+        await asyncio.to_thread(
+            self.client.put_object,
+            Bucket=self.bucket,
+            Key=self._key(key),
+            Body=data,
+            ContentType=content_type
+        )
+
+    async def iter_chunks(self, key: str, chunk_size: int = DEFAULT_CHUNK_SIZE, start: int = 0,
+                          length: Optional[int] = None) -> AsyncIterator[bytes]:
+        if length == 0:
+            # an empty range has no valid Range header, bytes=start-(start-1) is rejected
+            return
+        params = {"Bucket": self.bucket, "Key": self._key(key)}
+        if start or length is not None:
+            params["Range"] = f"bytes={start}-{'' if length is None else start + length - 1}"
+        response = await asyncio.to_thread(self.client.get_object, **params)
+        body = response["Body"]
+        try:
+            while chunk := await asyncio.to_thread(body.read, chunk_size):
+                yield chunk
+        finally:
+            body.close()
+
+    async def exists(self, key: str) -> bool:
+        try:
+            await asyncio.to_thread(self.client.head_object, Bucket=self.bucket, Key=self._key(key))
+            return True
+        except self.client_error as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    async def delete(self, key: str):
+        await asyncio.to_thread(self.client.delete_object, Bucket=self.bucket, Key=self._key(key))
+
+
+class MemoryStorageBackend(StorageBackend):
+    def __init__(self):
+        self.objects: dict[str, bytes] = {}
+
+    async def put_file(self, key: str, file_path: Path, content_type: str = "application/octet-stream"):
+        self.objects[key] = await asyncio.to_thread(Path(file_path).read_bytes)
+
+    async def put_bytes(self, key: str, data: bytes, content_type: str = "application/octet-stream"):
+        self.objects[key] = bytes(data)
+
+    async def iter_chunks(self, key: str, chunk_size: int = DEFAULT_CHUNK_SIZE, start: int = 0,
+                          length: Optional[int] = None) -> AsyncIterator[bytes]:
+        data = self.objects[key][start:None if length is None else start + length]
+        for offset in range(0, len(data), chunk_size):
+            yield data[offset:offset + chunk_size]
+
+    async def exists(self, key: str) -> bool:
+        return key in self.objects
+
+    async def delete(self, key: str):
+        self.objects.pop(key, None)
+
+
+def create_storage_backend(local_root: Path, backend: str = STORAGE_BACKEND) -> StorageBackend:
+    match backend:
+        case "s3":
+            if not S3_BUCKET:
+                raise ValueError("S3_BUCKET must be set for the s3 storage backend")
+            return S3StorageBackend(
+                bucket=S3_BUCKET,
+                prefix=S3_PREFIX,
+                endpoint_url=S3_ENDPOINT_URL,
+                region=S3_REGION,
+                access_key_id=S3_ACCESS_KEY_ID,
+                secret_access_key=S3_SECRET_ACCESS_KEY
+            )
+        case "memory":
+            return MemoryStorageBackend()
+        case _:
+            return LocalStorageBackend(local_root)
@@ -13,7 +13,7 @@ async def handle_callback(update: Update, context: CallbackContext):
 
     data = query.data
 
-    if data.startswith(callback_storage.get_prefix()):
+    if callback_storage.is_stored(data):
         stored_data = await callback_storage.get(data)
         if not stored_data:
             await query.edit_message_text(
@@ -21,7 +21,6 @@ async def handle_callback(update: Update, context: CallbackContext):
             )
             return
         data = stored_data
-        print(data)
 
     patrs = data.split(":")
     action = patrs[0]
@@ -1,13 +1,48 @@
-from telegram import Update
+import asyncio
+from contextlib import nullcontext
+from pathlib import Path
+
+from telegram import Update, Message, InputMediaPhoto
 from telegram.ext import CallbackContext
 
 from data.enums import ProcessImageStatus, Platform
+from data.image_processing_results import AnalyseServiceResult
 from files.file_manager import file_manager
+from files.result_store import result_store
+from monitoring.memory_watchdog import memory_watchdog
+from monitoring.profiling import profiler
 from service.analysis_service import AnalysisService
+from storage.media_group_storage import media_group_storage
+from tasks.inference_queue import inference_queue
 from transflate.translator import translator
 
 
+async def analyze_photo(user_id: int, path: Path, scratch_dir: Path, profile: bool) -> AnalyseServiceResult:
+    with profiler.profile("telegram.analyze") if profile else nullcontext():
+        return await AnalysisService.analyze(user_id, path, scratch_dir, platform=Platform.TELEGRAM)
+
+
+async def analyze_album(user_id: int, paths: list[Path], scratch_dir: Path,
+                        profile: bool) -> list[AnalyseServiceResult]:
+    with profiler.profile("telegram.analyze_batch") if profile else nullcontext():
+        return await AnalysisService.analyze_batch(user_id, paths, scratch_dir, platform=Platform.TELEGRAM)
+
+
+def get_user_lang(message: Message) -> str:
+    return message.from_user.language_code if message.from_user.language_code == "ru" else "en"
+
+
 async def handle_user_photo(update: Update, context: CallbackContext):
+    if memory_watchdog.draining:
+        await update.message.reply_text(
+            translator.translate("errors.analysis.worker_recycling", Platform.TELEGRAM, get_user_lang(update.message))
+        )
+        return
+
+    if update.message.media_group_id is not None:
+        await media_group_storage.add(update.message, handle_user_album)
+        return
+
     user = update.effective_user
     user_id = user.id
     lang = user.language_code if user.language_code == "ru" else "en"
@@ -16,33 +51,89 @@ async def handle_user_photo(update: Update, context: CallbackContext):
         photo = await update.message.photo[-1].get_file()
         photo_bytes = await photo.download_as_bytearray()
 
-        path = file_manager.save_temporary_photo(photo_bytes, user_id)
         check_message = await update.message.reply_text(
             translator.translate("info.analysis.checking", Platform.TELEGRAM, lang)
         )
 
-        result = await AnalysisService.analyze(user_id, path)
+        async with file_manager.scratch(user_id) as scratch_dir:
+            path = await file_manager.save_temporary_photo_async(photo_bytes, scratch_dir)
+            # under the supervisor this runs in an inference worker, keeping the models out of this process
+            result = await inference_queue.run(analyze_photo, user_id=user_id, path=path, scratch_dir=scratch_dir,
+                                               profile=profiler.should_profile())
+
         if result.get_status() == ProcessImageStatus.SUCCESS:
-            with open(result.get_image_path(), "rb") as file:
-                try:
-                    await update.message.reply_photo(
-                        photo=file,
-                        caption=translator.translate(
-                            result.get_message_key() if result.get_message_key() else "success.analysis.completed",
-                            Platform.TELEGRAM,
-                            lang,
-                        )
+            try:
+                await update.message.reply_photo(
+                    photo=await result_store.read_image(user_id, result.get_image_name()),
+                    caption=translator.translate(
+                        result.get_message_key() if result.get_message_key() else "success.analysis.completed",
+                        Platform.TELEGRAM,
+                        lang,
                     )
-                    await check_message.delete()
-                except Exception as e:
-                    print(f"Error on sending photo: {e}")
-                    await check_message.edit_text(translator.translate("errors.analysis.send_failed", Platform.TELEGRAM, lang))
-                finally:
-                    try:
-                        file_manager.clear_user_temp(user_id)
-                    except Exception as e:
-                        print(f"Cleanup error (ignored): {e}")
+                )
+                await check_message.delete()
+            except Exception as e:
+                print(f"Error on sending photo: {e}")
+                await check_message.edit_text(translator.translate("errors.analysis.send_failed", Platform.TELEGRAM, lang))
         elif result.get_status() == ProcessImageStatus.CLEANED:
             await check_message.edit_text("✅ " + translator.translate(result.get_message_key(), Platform.TELEGRAM, lang))
         else:
-            await check_message.edit_text("❌ " + translator.translate(result.get_message_key(), Platform.TELEGRAM, lang))
\ No newline at end of file
+            await check_message.edit_text("❌ " + translator.translate(result.get_message_key(), Platform.TELEGRAM, lang))
+
+
+async def download_photo(message: Message) -> bytearray:
+    photo = await message.photo[-1].get_file()
+    return await photo.download_as_bytearray()
+
+
+async def handle_user_album(messages: list[Message]):
+    first_message = messages[0]
+    user_id = first_message.from_user.id
+    lang = get_user_lang(first_message)
+
+    check_message = await first_message.reply_text(
+        translator.translate("info.analysis.checking", Platform.TELEGRAM, lang)
+    )
+
+    try:
+        photos = await asyncio.gather(*(download_photo(message) for message in messages))
+        async with file_manager.scratch(user_id) as scratch_dir:
+            paths = await asyncio.gather(*(
+                file_manager.save_temporary_photo_async(photo_bytes, scratch_dir) for photo_bytes in photos
+            ))
+            results = await inference_queue.run(analyze_album, user_id=user_id, paths=list(paths),
+                                                scratch_dir=scratch_dir, profile=profiler.should_profile())
+
+        annotated = [result for result in results if result.get_status() == ProcessImageStatus.SUCCESS]
+        notes = []
+        for index, result in enumerate(results):
+            if result.get_status() == ProcessImageStatus.SUCCESS:
+                continue
+            prefix = "✅ " if result.get_status() == ProcessImageStatus.CLEANED else "❌ "
+            notes.append(f"{index + 1}. {prefix}" + translator.translate(result.get_message_key(), Platform.TELEGRAM, lang))
+
+        if not annotated:
+            await check_message.edit_text("\n".join(notes))
+            return
+
+        caption = translator.translate("info.analysis.completed", Platform.TELEGRAM, lang)
+        images = await asyncio.gather(*(
+            result_store.read_image(user_id, result.get_image_name()) for result in annotated
+        ))
+        if len(images) == 1:
+            await first_message.reply_photo(photo=images[0], caption=caption)
+        else:
+            await first_message.reply_media_group(
+                media=[
+                    InputMediaPhoto(media=image, caption=caption if index == 0 else None)
+                    for index, image in enumerate(images)
+                ]
+            )
+
+        if notes:
+            await check_message.edit_text("\n".join(notes))
+        else:
+            await check_message.delete()
+    except Exception as e:
+        print(f"Error on sending album: {e}")
+        await check_message.edit_text(translator.translate("errors.analysis.send_failed", Platform.TELEGRAM, lang))
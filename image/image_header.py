@@ -0,0 +1,97 @@
+import struct
+from typing import NamedTuple, Optional
+
+
+class ImageHeader(NamedTuple):
+    format: str
+    width: int
+    height: int
+
+    def get_pixels(self) -> int: return self.width * self.height
+
+
+class InvalidImageHeader(Exception):
+    def __init__(self, message: str):
+        self.message = message
+        super().__init__(self.message)
+
+
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def sniff_image_header(data: bytes) -> Optional[ImageHeader]:
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return _sniff_png(data)
+    if data.startswith(b"\xff\xd8"):
+        return _sniff_jpeg(data)
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return _sniff_webp(data)
+    if data.startswith(b"BM"):
+        return _sniff_bmp(data)
+    if len(data) >= 12:
+        raise InvalidImageHeader("Unsupported image format")
+    return None
+
+
+def _sniff_png(data: bytes) -> Optional[ImageHeader]:
+    if len(data) < 24:
+        return None
+    if data[12:16] != b"IHDR":
+        raise InvalidImageHeader("PNG without IHDR chunk")
+    width, height = struct.unpack(">II", data[16:24])
+    return ImageHeader("png", width, height)
+
+
+def _sniff_jpeg(data: bytes) -> Optional[ImageHeader]:
+    offset = 2
+    while True:
+        while offset < len(data) and data[offset] == 0xFF:
+            offset += 1
+        if offset >= len(data):
+            return None
+
+        marker = data[offset]
+        offset += 1
+        if marker == 0xD8 or marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            continue
+        if marker in (0xD9, 0xDA):
+            raise InvalidImageHeader("JPEG without frame header")
+
+        if offset + 2 > len(data):
+            return None
+        segment_length = struct.unpack(">H", data[offset:offset + 2])[0]
+        if segment_length < 2:
+            raise InvalidImageHeader("Malformed JPEG segment")
+
+        if marker in _JPEG_SOF_MARKERS:
+            if offset + 7 > len(data):
+                return None
+            height, width = struct.unpack(">HH", data[offset + 3:offset + 7])
+            return ImageHeader("jpeg", width, height)
+
+        offset += segment_length
+
+
+def _sniff_webp(data: bytes) -> Optional[ImageHeader]:
+    if len(data) < 30:
+        return None
+
+    chunk = data[12:16]
+    if chunk == b"VP8 ":
+        width, height = struct.unpack("<HH", data[26:30])
+        return ImageHeader("webp", width & 0x3FFF, height & 0x3FFF)
+    if chunk == b"VP8L":
+        bits = int.from_bytes(data[21:25], "little")
+        return ImageHeader("webp", (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1)
+    if chunk == b"VP8X":
+        width = int.from_bytes(data[24:27], "little") + 1
+        height = int.from_bytes(data[27:30], "little") + 1
+        return ImageHeader("webp", width, height)
+    raise InvalidImageHeader("Unsupported WebP chunk")
+
+
+def _sniff_bmp(data: bytes) -> Optional[ImageHeader]:
+    if len(data) < 26:
+        return None
+    width, height = struct.unpack("<ii", data[18:26])
+    return ImageHeader("bmp", abs(width), abs(height))
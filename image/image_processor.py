@@ -1,19 +1,111 @@
+import os
+import time
+
 import cv2
 import numpy as np
 from pathlib import Path
+from typing import Optional
+
+from dotenv import load_dotenv
 
 from data.enums import ProcessImageStatus
 from data.image_processing_results import ProcessImageResult, CropData, AnalysisResult
+from engine.tensor_buffers import DETECTOR_SIZE, tensor_buffers
+from engine.threading_profile import threading_config
 from files.file_manager import file_manager
+from image.image_header import ImageHeader, InvalidImageHeader, sniff_image_header
 from image.skin_not_found import SkinNotFound
+from monitoring.metrics import StageTimings
 import tensorflow as tf
 
+load_dotenv()
+MAX_WORKING_SIDE = int(os.getenv("MAX_WORKING_SIDE", 2048))
+
+HEADER_PROBE_BYTES = 512 * 1024
+DETECTOR_INPUT_BYTES = 640 * 640 * 3 * (1 + 1 + 4)
+_JPEG_REDUCED_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2)
+)
+
+
+def read_image_header(img_path: Path | str) -> Optional[ImageHeader]:
+    try:
+        with open(img_path, "rb") as f:
+            return sniff_image_header(f.read(HEADER_PROBE_BYTES))
+    except (OSError, InvalidImageHeader):
+        return None
+
+
+def get_working_size(width: int, height: int) -> tuple[int, int]:
+    longest = max(width, height)
+    if MAX_WORKING_SIDE <= 0 or longest <= MAX_WORKING_SIDE:
+        return width, height
+    scale = MAX_WORKING_SIDE / longest
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def estimate_analysis_bytes(header: Optional[ImageHeader]) -> int:
+    if header is None:
+        side = MAX_WORKING_SIDE if MAX_WORKING_SIDE > 0 else 4096
+        return side * side * 8 + DETECTOR_INPUT_BYTES
+
+    width, height = get_working_size(header.width, header.height)
+    decode_bytes = header.get_pixels() * 3 if header.format != "jpeg" else width * height * 3 * 4
+    # working BGR image + YCrCb copy + mask and its morphology output, alongside the decode buffer
+    return max(decode_bytes, width * height * 3) + width * height * 5 + DETECTOR_INPUT_BYTES
+
+
+def get_decode_reduction(header: Optional[ImageHeader]) -> tuple[int, int]:
+    if header is None or header.format != "jpeg" or MAX_WORKING_SIDE <= 0:
+        return 1, cv2.IMREAD_COLOR
+    factor = max(header.width, header.height) // MAX_WORKING_SIDE
+    return next(((reduce, flag) for reduce, flag in _JPEG_REDUCED_FLAGS if factor >= reduce), (1, cv2.IMREAD_COLOR))
+
+
+def get_decoded_size(header: Optional[ImageHeader]) -> Optional[tuple[int, int]]:
+    if header is None:
+        return None
+    reduce, _ = get_decode_reduction(header)
+    return -(-header.width // reduce), -(-header.height // reduce)
+
+
+def decode_image(img_path: str, dst: Optional[np.ndarray] = None) -> tuple[np.ndarray, int, int]:
+    header = read_image_header(img_path)
+    _, flags = get_decode_reduction(header)
+
+    decoded = None
+    if dst is not None:
+        try:
+            decoded = cv2.imread(img_path, dst, flags)
+        except cv2.error:
+            # an EXIF rotation or a header the codec disagrees with changes the shape, decode into a fresh buffer
+            decoded = None
+    if decoded is None:
+        decoded = cv2.imread(img_path, flags)
+    if decoded is None:
+        raise ValueError(f"Could not read image at path: {img_path}")
+
+    h, w = decoded.shape[:2]
+    if header is not None:
+        orig_w, orig_h = header.width, header.height
+        # imread applies EXIF orientation, the header does not
+        if (orig_w > orig_h) != (w > h):
+            orig_w, orig_h = orig_h, orig_w
+    else:
+        orig_w, orig_h = w, h
+
+    return decoded, orig_w, orig_h
+
 
 class ImageProcessor:
     _detector_model = None
 
-    def __init__(self, img_path: str, user_id: int):
+    @staticmethod
+    def load_detector():
         if ImageProcessor._detector_model is None:
+            threading_config.apply()
             try:
                 model_path = str(file_manager.get_detector_model_path())
                 loaded = tf.saved_model.load(model_path)
@@ -21,22 +113,62 @@ class ImageProcessor:
                 print("Detector loaded successfully")
             except Exception as e:
                 print(f"Error on loading model: {e}")
+        return ImageProcessor._detector_model
 
-        self.detect_fn = ImageProcessor._detector_model
+    def __init__(self, img_path: str | None, user_id: int, tag: str = "", work_dir: Path = None,
+                 image: np.ndarray = None, timings: StageTimings = None, original_size: tuple[int, int] = None):
+        self.detect_fn = ImageProcessor.load_detector()
         self.user_id = user_id
-        self.image = cv2.imread(img_path)
-
-        if self.image is None:
-            raise ValueError(f"Could not read image at path: {img_path}")
+        self.tag = tag
+        self.work_dir = work_dir if work_dir is not None else Path(img_path).parent if img_path else None
+        self.peak_memory_bytes = 0
+        self.timings = timings if timings is not None else StageTimings()
+        self.image = None
+        with self.timings.stage("decode"):
+            if image is not None:
+                self.set_working_image(image, *(original_size or (image.shape[1], image.shape[0])))
+            else:
+                self.load_working_image(img_path)
+
+    def load_working_image(self, img_path: str):
+        self.set_working_image(*decode_image(img_path))
+
+    def set_working_image(self, decoded: np.ndarray, orig_w: int, orig_h: int):
+        h, w = decoded.shape[:2]
+        work_w, work_h = get_working_size(w, h)
+        if (work_w, work_h) != (w, h):
+            self.image = cv2.resize(decoded, (work_w, work_h), interpolation=cv2.INTER_AREA)
+            self.track_buffers(decoded)
+        else:
+            self.image = decoded
+            self.track_buffers()
+
+        self.original_size = (orig_w, orig_h)
+        self.scale_x = orig_w / work_w
+        self.scale_y = orig_h / work_h
+
+    def track_buffers(self, *buffers: np.ndarray, extra_bytes: int = 0):
+        live = sum(buffer.nbytes for buffer in buffers) + extra_bytes
+        if self.image is not None:
+            live += self.image.nbytes
+        self.peak_memory_bytes = max(self.peak_memory_bytes, live)
+
+    def release_image(self):
+        self.image = None
 
     def process_image(self):
-        skin_mask = self.get_advanced_skin_mask()
-        skin_pixels = cv2.countNonZero(skin_mask)
+        self.ensure_skin_present()
+        return self.build_process_result(self.get_interesting_crops())
+
+    def ensure_skin_present(self):
+        with self.timings.stage("skin_mask"):
+            skin_mask = self.get_advanced_skin_mask()
+            skin_pixels = cv2.countNonZero(skin_mask)
+            del skin_mask
         if skin_pixels < (self.image.shape[0] * self.image.shape[1] * 0.01):
             raise SkinNotFound("attentions.analysis.skin_not_found")
 
-        crops = self.get_interesting_crops()
-
+    def build_process_result(self, crops: list[CropData]) -> ProcessImageResult:
         if not crops:
             return ProcessImageResult(
                 status=ProcessImageStatus.CLEANED,
@@ -48,14 +180,47 @@ class ImageProcessor:
             crops=crops
         )
 
-    def get_interesting_crops(self, padding: int = 5) -> list:
-        h_orig, w_orig = self.image.shape[:2]
+    def write_detector_input(self, out: np.ndarray):
+        resized = cv2.resize(self.image, (DETECTOR_SIZE, DETECTOR_SIZE), dst=tensor_buffers.detector_resized)
+        # BGR -> RGB through a reversed view and normalisation in the same pass, straight into the batch slot
+        np.divide(resized[..., ::-1], np.float32(255), out=out)
+        self.track_buffers(resized, out)
 
-        img_640 = cv2.resize(self.image, (640, 640))
-        input_tensor = tf.cast(cv2.cvtColor(img_640, cv2.COLOR_BGR2RGB), tf.float32) / 255.0
+    def detect(self) -> np.ndarray:
+        with self.timings.stage("detect"):
+            batch = tensor_buffers.detector_batch(1)
+            self.write_detector_input(batch[0])
+            return self.detect_fn(tf.convert_to_tensor(batch))['output_0'].numpy()[0]
 
-        outputs = self.detect_fn(input_tensor[tf.newaxis, ...])
-        raw_data = outputs['output_0'].numpy()[0]
+    def get_interesting_crops(self, padding: int = 5) -> list:
+        return self.extract_crops(self.detect(), padding)
+
+    @staticmethod
+    def detect_batch(processors: list["ImageProcessor"]) -> list[np.ndarray]:
+        if not processors:
+            return []
+
+        try:
+            started = time.perf_counter()
+            batch = tensor_buffers.detector_batch(len(processors))
+            for processor, slot in zip(processors, batch):
+                processor.write_detector_input(slot)
+            raw_batch = np.concatenate([
+                ImageProcessor._detector_model(tf.convert_to_tensor(batch[chunk]))['output_0'].numpy()
+                for chunk in threading_config.profile.split(len(batch))
+            ])
+            if raw_batch.shape[0] == len(processors):
+                share = (time.perf_counter() - started) / len(processors)
+                for processor in processors:
+                    processor.timings.add("detect", share)
+                return list(raw_batch)
+        except Exception as e:
+            print(f"Batched detection failed, falling back to single images: {e}")
+
+        return [processor.detect() for processor in processors]
+
+    def select_boxes(self, raw_data: np.ndarray, padding: int = 5) -> list[tuple[int, int, int, int, int]]:
+        h_orig, w_orig = self.image.shape[:2]
 
         boxes, confidences = [], []
 
@@ -73,8 +238,9 @@ class ImageProcessor:
             boxes.append([x1, y1, w, h])
             confidences.append(float(conf))
 
-        indices = cv2.dnn.NMSBoxes(boxes, confidences, 0.45, 0.4)
-        crops = []
+        with self.timings.stage("nms"):
+            indices = cv2.dnn.NMSBoxes(boxes, confidences, 0.45, 0.4)
+        selected = []
 
         if len(indices) > 0:
             for i in indices.flatten():
@@ -85,23 +251,54 @@ class ImageProcessor:
                 x_end = min(w_orig, x + w + padding)
                 y_end = min(h_orig, y + h + padding)
 
-                crop_img = self.image[y_start:y_end, x_start:x_end]
-                if crop_img.size == 0: continue
+                if x_end <= x_start or y_end <= y_start: continue
+                selected.append((int(i), x_start, y_start, x_end - x_start, y_end - y_start))
 
-                path = file_manager.ensure_crops_directory(self.user_id) / f"crop_{i}.png"
-                cv2.imwrite(str(path), crop_img)
-
-                crops.append(CropData(path=path, x=x_start, y=y_start, w=(x_end - x_start), h=(y_end - y_start)))
+        return selected
 
+    def extract_crops(self, raw_data: np.ndarray, padding: int = 5) -> list[CropData]:
+        crops = []
+        boxes = self.select_boxes(raw_data, padding)
+        with self.timings.stage("crop_extract"):
+            for i, x, y, w, h in boxes:
+                path = self.work_dir / f"{self.tagged_name('crop')}_{i}.png"
+                cv2.imwrite(str(path), self.image[y:y + h, x:x + w])
+                crops.append(CropData(path=path, x=x, y=y, w=w, h=h))
         return crops
 
+    def detect_regions(self, padding: int = 5) -> list[tuple[CropData, np.ndarray]]:
+        return [
+            (CropData(path=None, x=x, y=y, w=w, h=h), self.image[y:y + h, x:x + w])
+            for _, x, y, w, h in self.select_boxes(self.detect(), padding)
+        ]
+
     def get_advanced_skin_mask(self) -> np.ndarray:
         ycrcb = cv2.cvtColor(self.image, cv2.COLOR_BGR2YCrCb)
         mask = cv2.inRange(ycrcb, np.array([0, 133, 77]), np.array([255, 173, 127]))
+        self.track_buffers(ycrcb, mask)
+        del ycrcb
 
         kernel = np.ones((15, 15), np.uint8)
-        mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
-        return mask
+        closed = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
+        self.track_buffers(mask, closed)
+        return closed
+
+    def map_to_original(self, analysis_results: list[AnalysisResult]) -> list[AnalysisResult]:
+        orig_w, orig_h = self.original_size
+        mapped = []
+        for result in analysis_results:
+            crop = result.crop
+            x = min(orig_w, round(crop.x * self.scale_x))
+            y = min(orig_h, round(crop.y * self.scale_y))
+            crop = CropData(
+                path=crop.path,
+                x=x,
+                y=y,
+                w=min(orig_w - x, round(crop.w * self.scale_x)),
+                h=min(orig_h - y, round(crop.h * self.scale_y))
+            )
+            mapped.append(AnalysisResult(crop=crop, label=result.label, confidence=result.confidence))
+        return mapped
 
     def is_lip_or_red_spot(self, roi: np.ndarray) -> bool:
         if roi.size == 0: return True
@@ -115,12 +312,20 @@ class ImageProcessor:
         mean_val = np.mean(gray_roi)
         return mean_val < 40
 
+    def tagged_name(self, name: str) -> str:
+        return f"{name}_{self.tag}" if self.tag else name
+
     def resize_for_model(self, image, target_size: tuple[int, int] = (224, 224)):
         return cv2.resize(image, target_size, interpolation=cv2.INTER_LINEAR)
 
-    def annotate_image(self, analysis_results: list[AnalysisResult]):
+    def annotate_image(self, analysis_results: list[AnalysisResult]) -> Path:
+        with self.timings.stage("annotate"):
+            return self.draw_annotations(analysis_results)
+
+    def draw_annotations(self, analysis_results: list[AnalysisResult]) -> Path:
         print("\nAnnotating image")
-        annotated_img = self.image.copy()
+        # draw in place: the working image is not needed after annotation
+        annotated_img = self.image
 
         h_orig, w_orig = self.image.shape[:2]
         thickness = clip(int(w_orig / 150), 1, 4)
@@ -160,8 +365,9 @@ class ImageProcessor:
                         cv2.FONT_HERSHEY_SIMPLEX, font_scale,
                         (color.red, color.green, color.blue), thickness)
 
-        output_path = file_manager.get_user_folder(self.user_id) / f"result_{self.user_id}.png"
+        output_path = self.work_dir / f"{self.tagged_name(f'result_{self.user_id}')}.png"
         cv2.imwrite(str(output_path), annotated_img)
+        self.release_image()
         return output_path
 
 def clip(n, smallest, largest):
@@ -0,0 +1,56 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from dotenv import load_dotenv
+
+load_dotenv()
+ANALYSIS_MEMORY_BUDGET_BYTES = int(os.getenv("ANALYSIS_MEMORY_BUDGET_BYTES", 1024 * 1024 * 1024))
+
+
+class MemoryBudget:
+    def __init__(self, budget_bytes: int = ANALYSIS_MEMORY_BUDGET_BYTES):
+        self.budget_bytes = budget_bytes
+        self.reserved_bytes = 0
+        self.peak_reserved_bytes = 0
+        self.waiting = 0
+        self._condition: asyncio.Condition | None = None
+
+    def _get_condition(self) -> asyncio.Condition:
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    def _fits(self, nbytes: int) -> bool:
+        return self.reserved_bytes == 0 or self.reserved_bytes + nbytes <= self.budget_bytes
+
+    @asynccontextmanager
+    async def reserve(self, nbytes: int) -> AsyncIterator[None]:
+        condition = self._get_condition()
+        async with condition:
+            self.waiting += 1
+            try:
+                await condition.wait_for(lambda: self._fits(nbytes))
+            finally:
+                self.waiting -= 1
+            self.reserved_bytes += nbytes
+            self.peak_reserved_bytes = max(self.peak_reserved_bytes, self.reserved_bytes)
+
+        try:
+            yield
+        finally:
+            async with condition:
+                self.reserved_bytes -= nbytes
+                condition.notify_all()
+
+    def get_stats(self) -> dict[str, int]:
+        return {
+            "budget_bytes": self.budget_bytes,
+            "reserved_bytes": self.reserved_bytes,
+            "peak_reserved_bytes": self.peak_reserved_bytes,
+            "waiting": self.waiting
+        }
+
+
+memory_budget = MemoryBudget()
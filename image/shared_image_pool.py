@@ -0,0 +1,161 @@
+import multiprocessing
+import os
+import time
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+import cv2
+import numpy as np
+from dotenv import load_dotenv
+
+from files.file_manager import is_process_alive
+from image.image_processor import MAX_WORKING_SIDE, decode_image, get_decoded_size, get_working_size, \
+    read_image_header
+
+load_dotenv()
+SHARED_IMAGE_SLOTS = int(os.getenv("SHARED_IMAGE_SLOTS", 8))
+SHARED_IMAGE_SLOT_BYTES = int(os.getenv("SHARED_IMAGE_SLOT_BYTES", max(MAX_WORKING_SIDE, 640) ** 2 * 3))
+SHARED_IMAGE_HANDOFF_TIMEOUT = float(os.getenv("SHARED_IMAGE_HANDOFF_TIMEOUT", 600))
+
+
+class SharedImage(NamedTuple):
+    slot: int
+    generation: int
+    width: int
+    height: int
+    original_size: tuple[int, int]
+
+
+class SharedImagePool:
+    def __init__(self, slots: int = SHARED_IMAGE_SLOTS, slot_bytes: int = SHARED_IMAGE_SLOT_BYTES,
+                 handoff_timeout: float = SHARED_IMAGE_HANDOFF_TIMEOUT):
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.handoff_timeout = handoff_timeout
+        self.fallbacks = 0
+        self._memory: list[SharedMemory] = []
+        self._lock = None
+        self._acquired_at = None
+        self._generations = None
+        self._holders = None
+        self._viewed = None
+        self._owner_pid: Optional[int] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._memory)
+
+    def create(self):
+        # must run in the supervisor before forking: children inherit the mappings, the lock and the slot table
+        if self.slots <= 0:
+            return
+        context = multiprocessing.get_context("fork")
+        self._lock = context.Lock()
+        self._acquired_at = context.RawArray("d", self.slots)
+        self._generations = context.RawArray("Q", self.slots)
+        self._holders = context.RawArray("q", self.slots)
+        self._viewed = context.RawArray("b", self.slots)
+        self._memory = [SharedMemory(create=True, size=self.slot_bytes) for _ in range(self.slots)]
+        self._owner_pid = os.getpid()
+
+    def acquire(self) -> Optional[tuple[int, int]]:
+        now = time.time()
+        with self._lock:
+            free = next((slot for slot in range(self.slots) if self._acquired_at[slot] == 0), None)
+            if free is None:
+                free = next((slot for slot in range(self.slots) if self._is_abandoned(slot, now)), None)
+                if free is None:
+                    return None
+                print(f"Reclaiming shared image slot {free} held by process {self._holders[free]} "
+                      f"for {now - self._acquired_at[free]:.0f}s")
+            self._acquired_at[free] = now
+            self._generations[free] += 1
+            self._holders[free] = os.getpid()
+            self._viewed[free] = 0
+            return free, self._generations[free]
+
+    def _is_abandoned(self, slot: int, now: float) -> bool:
+        # a holder that died never releases its slot, and a job lost before any worker viewed it leaves the slot
+        # with a live API process; a slot a worker is analysing is never taken, however long that runs
+        if not is_process_alive(self._holders[slot]):
+            return True
+        return not self._viewed[slot] and now - self._acquired_at[slot] > self.handoff_timeout
+
+    def release(self, shared_image: Optional[SharedImage]):
+        if shared_image is None or not self.enabled:
+            return
+        self._release(shared_image.slot, shared_image.generation)
+
+    def _release(self, slot: int, generation: int):
+        with self._lock:
+            if self._generations[slot] == generation:
+                self._acquired_at[slot] = 0
+                self._holders[slot] = 0
+                self._viewed[slot] = 0
+
+    def store(self, img_path: Path | str) -> Optional[SharedImage]:
+        if (acquired := self.acquire()) is None:
+            self.fallbacks += 1
+            return None
+        slot, generation = acquired
+
+        # an image already within the working size is decoded straight into the slot; a larger one needs its
+        # decode buffer anyway and is resized into the slot from there
+        target = None
+        size = get_decoded_size(read_image_header(str(img_path)))
+        if size is not None and get_working_size(*size) == size and size[0] * size[1] * 3 <= self.slot_bytes:
+            target = np.ndarray((size[1], size[0], 3), dtype=np.uint8, buffer=self._memory[slot].buf)
+        try:
+            decoded, original_w, original_h = decode_image(str(img_path), target)
+        except (ValueError, cv2.error):
+            # left to the worker, which reports undecodable uploads like any other analysis error
+            self._release(slot, generation)
+            self.fallbacks += 1
+            return None
+
+        width, height = get_working_size(decoded.shape[1], decoded.shape[0])
+        if decoded is not target:
+            if width * height * 3 > self.slot_bytes:
+                self._release(slot, generation)
+                self.fallbacks += 1
+                return None
+            view = np.ndarray((height, width, 3), dtype=np.uint8, buffer=self._memory[slot].buf)
+            if (width, height) != (decoded.shape[1], decoded.shape[0]):
+                cv2.resize(decoded, (width, height), dst=view, interpolation=cv2.INTER_AREA)
+            else:
+                np.copyto(view, decoded)
+        return SharedImage(slot, generation, width, height, (original_w, original_h))
+
+    def view(self, shared_image: SharedImage) -> Optional[np.ndarray]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            if self._generations[shared_image.slot] != shared_image.generation:
+                return None
+            # the analysing worker takes the slot over, so it is only reclaimed if that worker dies
+            self._holders[shared_image.slot] = os.getpid()
+            self._viewed[shared_image.slot] = 1
+        return np.ndarray((shared_image.height, shared_image.width, 3), dtype=np.uint8,
+                          buffer=self._memory[shared_image.slot].buf)
+
+    def close(self):
+        for memory in self._memory:
+            memory.close()
+            if os.getpid() == self._owner_pid:
+                memory.unlink()
+        self._memory = []
+
+    def get_stats(self) -> dict:
+        if not self.enabled:
+            return {"slots": 0}
+        in_use = sum(1 for slot in range(self.slots) if self._acquired_at[slot] != 0)
+        return {
+            "slots": self.slots,
+            "slot_bytes": self.slot_bytes,
+            "in_use": in_use,
+            "fallbacks": self.fallbacks
+        }
+
+
+shared_image_pool = SharedImagePool()
@@ -0,0 +1,193 @@
+import asyncio
+import os
+import signal
+import sys
+import tracemalloc
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+WORKER_MAX_TASKS = int(os.getenv("WORKER_MAX_TASKS", 0))
+WORKER_MAX_RSS_BYTES = int(os.getenv("WORKER_MAX_RSS_BYTES", 0))
+WATCHDOG_TRACEMALLOC_FRAMES = int(os.getenv("WATCHDOG_TRACEMALLOC_FRAMES", 0))
+WATCHDOG_WARMUP_TASKS = int(os.getenv("WATCHDOG_WARMUP_TASKS", 5))
+WATCHDOG_LEAK_SUSPECTS = int(os.getenv("WATCHDOG_LEAK_SUSPECTS", 10))
+WATCHDOG_DRAIN_TIMEOUT = float(os.getenv("WATCHDOG_DRAIN_TIMEOUT", 300))
+WATCHDOG_RECYCLE = os.getenv("WATCHDOG_RECYCLE", "false").lower() == "true"
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+_IGNORED_TRACES = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+)
+
+
+def get_rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        import resource
+
+        # peak rather than current RSS, but the only figure available without /proc
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def terminate_self():
+    os.kill(os.getpid(), signal.SIGTERM)
+
+
+class MemoryWatchdog:
+    def __init__(self, max_tasks: int = WORKER_MAX_TASKS, max_rss_bytes: int = WORKER_MAX_RSS_BYTES,
+                 tracemalloc_frames: int = WATCHDOG_TRACEMALLOC_FRAMES, warmup_tasks: int = WATCHDOG_WARMUP_TASKS,
+                 leak_suspects: int = WATCHDOG_LEAK_SUSPECTS, drain_timeout: float = WATCHDOG_DRAIN_TIMEOUT,
+                 recycle: bool = WATCHDOG_RECYCLE, on_recycle: Callable[[], None] = terminate_self):
+        self.max_tasks = max_tasks
+        self.max_rss_bytes = max_rss_bytes
+        self.tracemalloc_frames = tracemalloc_frames
+        self.warmup_tasks = warmup_tasks
+        self.leak_suspects = leak_suspects
+        self.drain_timeout = drain_timeout
+        self.recycle = recycle
+        self.on_recycle = on_recycle
+
+        self.tasks = 0
+        self.in_flight = 0
+        self.start_rss_bytes = get_rss_bytes()
+        self.baseline_rss_bytes: Optional[int] = None
+        self.recent = deque(maxlen=100)
+        self.growth_by_label: dict[str, int] = {}
+        self.recycle_reason: Optional[str] = None
+        self.limit_reason: Optional[str] = None
+        self.suspects: list[dict] = []
+        self._baseline_snapshot: Optional[tracemalloc.Snapshot] = None
+        self._drained: Optional[asyncio.Event] = None
+        self._recycle_task: Optional[asyncio.Task] = None
+
+    @property
+    def draining(self) -> bool:
+        return self.recycle_reason is not None
+
+    def enable_recycling(self):
+        # only safe when something restarts the process, which the supervisor does for its children
+        self.recycle = True
+
+    def start(self):
+        if self.tracemalloc_frames and not tracemalloc.is_tracing():
+            tracemalloc.start(self.tracemalloc_frames)
+
+    def _get_drained(self) -> asyncio.Event:
+        if self._drained is None:
+            self._drained = asyncio.Event()
+        return self._drained
+
+    @asynccontextmanager
+    async def track(self, label: str) -> AsyncIterator[None]:
+        self.in_flight += 1
+        tracing = tracemalloc.is_tracing()
+        rss_before = get_rss_bytes()
+        traced_before = tracemalloc.get_traced_memory()[0] if tracing else 0
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self.tasks += 1
+            rss = get_rss_bytes()
+            self.recent.append({
+                "label": label,
+                "rss_delta_bytes": rss - rss_before,
+                "traced_delta_bytes": tracemalloc.get_traced_memory()[0] - traced_before if tracing else 0
+            })
+            self.growth_by_label[label] = self.growth_by_label.get(label, 0) + rss - rss_before
+            self.check(rss)
+            if self.draining and self.in_flight == 0:
+                self._get_drained().set()
+
+    def check(self, rss: int):
+        if self.tasks == self.warmup_tasks:
+            # models and TF graphs are built lazily, so growth is measured from after the first few analyses
+            self.baseline_rss_bytes = rss
+            if tracemalloc.is_tracing():
+                self._baseline_snapshot = tracemalloc.take_snapshot().filter_traces(_IGNORED_TRACES)
+
+        if self.draining:
+            return
+        if self.max_tasks and self.tasks >= self.max_tasks:
+            self.request_recycle(f"served {self.tasks} analyses (limit {self.max_tasks})")
+        elif self.max_rss_bytes and rss >= self.max_rss_bytes:
+            self.request_recycle(f"RSS {rss / (1024 * 1024):.0f} MB over {self.max_rss_bytes / (1024 * 1024):.0f} MB")
+
+    def request_recycle(self, reason: str):
+        if self.draining or self.limit_reason:
+            return
+        self.suspects = self.find_leak_suspects()
+        if not self.recycle:
+            # without a process manager a recycled worker would stay down, taking an in-process bot with it
+            self.limit_reason = reason
+            print(f"Worker {os.getpid()} {reason}, not recycling without a process manager (WATCHDOG_RECYCLE)")
+            return
+        self.recycle_reason = reason
+
+        print(f"Recycling worker {os.getpid()}: {reason}, draining {self.in_flight} in-flight analyses")
+        for suspect in self.suspects:
+            print(f"  leak suspect {suspect['location']}: +{suspect['size_diff_bytes'] / 1024:.1f} KB "
+                  f"in {suspect['count_diff']:+d} blocks")
+
+        self._recycle_task = asyncio.get_running_loop().create_task(self._recycle())
+
+    async def _recycle(self):
+        if self.in_flight:
+            try:
+                await asyncio.wait_for(self._get_drained().wait(), self.drain_timeout)
+            except asyncio.TimeoutError:
+                print(f"Drain timed out with {self.in_flight} analyses still running")
+        self.on_recycle()
+
+    def find_leak_suspects(self) -> list[dict]:
+        if self._baseline_snapshot is None or not tracemalloc.is_tracing():
+            growth = sorted(self.growth_by_label.items(), key=lambda item: item[1], reverse=True)
+            return [
+                {"location": label, "size_diff_bytes": size, "count_diff": 0}
+                for label, size in growth[:self.leak_suspects] if size > 0
+            ]
+
+        snapshot = tracemalloc.take_snapshot().filter_traces(_IGNORED_TRACES)
+        suspects = []
+        for stat in snapshot.compare_to(self._baseline_snapshot, "lineno")[:self.leak_suspects]:
+            if stat.size_diff <= 0:
+                continue
+            frame = stat.traceback[0]
+            suspects.append({
+                "location": f"{frame.filename}:{frame.lineno}",
+                "size_diff_bytes": stat.size_diff,
+                "count_diff": stat.count_diff
+            })
+        return suspects
+
+    def get_stats(self) -> dict:
+        rss = get_rss_bytes()
+        recent_rss = [sample["rss_delta_bytes"] for sample in self.recent]
+        return {
+            "pid": os.getpid(),
+            "tasks": self.tasks,
+            "in_flight": self.in_flight,
+            "rss_bytes": rss,
+            "start_rss_bytes": self.start_rss_bytes,
+            "growth_since_warmup_bytes": rss - self.baseline_rss_bytes if self.baseline_rss_bytes else None,
+            "mean_rss_delta_bytes": sum(recent_rss) // len(recent_rss) if recent_rss else 0,
+            "max_tasks": self.max_tasks,
+            "max_rss_bytes": self.max_rss_bytes,
+            "tracemalloc": tracemalloc.is_tracing(),
+            "recycle_enabled": self.recycle,
+            "recycling": self.recycle_reason,
+            "limit_exceeded": self.limit_reason,
+            "leak_suspects": self.suspects
+        }
+
+
+memory_watchdog = MemoryWatchdog()
@@ -0,0 +1,166 @@
+import functools
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Iterable, Iterator
+
+from dotenv import load_dotenv
+
+from monitoring.tracing import tracer
+
+load_dotenv()
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+MEMORY_BUCKETS = tuple(float(mb * 1024 * 1024) for mb in (16, 32, 64, 128, 256, 512, 1024, 2048))
+
+
+class Histogram:
+    def __init__(self, name: str, description: str, label_names: tuple[str, ...],
+                 buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.buckets = buckets
+        self.series: dict[tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, *labels: str):
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += seconds
+            series[2] += 1
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def snapshot(self) -> list[list]:
+        with self._lock:
+            return [[list(labels), list(counts), total, count] for labels, (counts, total, count) in self.series.items()]
+
+    def render(self, snapshots: Iterable[list[list]] = ()) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        merged: dict[tuple[str, ...], list] = {}
+        for snapshot in [self.snapshot(), *snapshots]:
+            for labels, counts, total, count in snapshot:
+                series = merged.setdefault(tuple(labels), [[0] * len(counts), 0.0, 0])
+                series[0] = [a + b for a, b in zip(series[0], counts)]
+                series[1] += total
+                series[2] += count
+        series = [(labels, counts, total, count) for labels, (counts, total, count) in merged.items()]
+
+        for labels, counts, total, count in sorted(series):
+            label_text = ",".join(f'{name}="{value}"' for name, value in zip(self.label_names, labels))
+            prefix = f"{label_text}," if label_text else ""
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {count}')
+            suffix = f"{{{label_text}}}" if label_text else ""
+            lines.append(f"{self.name}_sum{suffix} {total}")
+            lines.append(f"{self.name}_count{suffix} {count}")
+        return lines
+
+
+class StageTimings:
+    def __init__(self):
+        self.durations: dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            with tracer.span(f"analysis.{name}"):
+                yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def add(self, name: str, seconds: float):
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+
+    def merge(self, other: "StageTimings"):
+        for name, seconds in other.durations.items():
+            self.add(name, seconds)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.stage_seconds = Histogram(
+            "skin_analysis_stage_seconds", "Time spent in each analysis stage",
+            ("stage", "platform", "outcome")
+        )
+        self.analysis_seconds = Histogram(
+            "skin_analysis_seconds", "End-to-end analysis time",
+            ("platform", "outcome")
+        )
+        self.db_seconds = Histogram(
+            "skin_db_call_seconds", "DatabaseWorker call latency",
+            ("operation", "outcome")
+        )
+        self.redis_seconds = Histogram(
+            "skin_redis_command_seconds", "Redis command latency",
+            ("command",)
+        )
+        self.queue_wait_seconds = Histogram(
+            "skin_queue_wait_seconds", "Time work waited before it started",
+            ("queue", "platform")
+        )
+        self.peak_memory_bytes = Histogram(
+            "skin_analysis_peak_memory_bytes", "Peak tracked image buffer memory per analysis",
+            ("platform",), MEMORY_BUCKETS
+        )
+        self.histograms = [
+            self.stage_seconds, self.analysis_seconds, self.db_seconds, self.redis_seconds, self.queue_wait_seconds,
+            self.peak_memory_bytes
+        ]
+
+    def observe_analysis(self, timings: StageTimings, platform: str, outcome: str, total_seconds: float,
+                         peak_memory_bytes: int = 0):
+        for stage, seconds in timings.durations.items():
+            self.stage_seconds.observe(seconds, stage, platform, outcome)
+        self.analysis_seconds.observe(total_seconds, platform, outcome)
+        if peak_memory_bytes:
+            self.peak_memory_bytes.observe(peak_memory_bytes, platform)
+
+    def snapshot(self) -> dict[str, list[list]]:
+        return {histogram.name: histogram.snapshot() for histogram in self.histograms}
+
+    def render(self, snapshots: Iterable[dict[str, list[list]]] = ()) -> str:
+        snapshots = list(snapshots)
+        lines = []
+        for histogram in self.histograms:
+            lines.extend(histogram.render(snapshot.get(histogram.name, []) for snapshot in snapshots))
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+def timed_db_call(func):
+    operation = func.__name__
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            with tracer.span(f"db.{operation}"):
+                result = await func(*args, **kwargs)
+            outcome = "success"
+            return result
+        finally:
+            metrics.db_seconds.observe(time.perf_counter() - started, operation, outcome)
+
+    return wrapper
@@ -0,0 +1,100 @@
+import asyncio
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from files.file_manager import is_process_alive
+from monitoring.memory_watchdog import memory_watchdog
+from monitoring.metrics import metrics
+from monitoring.profiling import profiler
+
+load_dotenv()
+PROCESS_STATS_PATH = os.getenv("PROCESS_STATS_PATH", "files/process_stats")
+PROCESS_STATS_INTERVAL = float(os.getenv("PROCESS_STATS_INTERVAL", 5))
+
+
+class ProcessStats:
+    # under the supervisor every child keeps its own metrics, watchdog and profiler state, so each one
+    # publishes a snapshot here and whichever API worker serves /metrics or /health merges its peers in
+    def __init__(self, path: str = PROCESS_STATS_PATH, interval: float = PROCESS_STATS_INTERVAL):
+        self.path = Path(path)
+        self.interval = interval
+        self.role: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.role is not None
+
+    def reset(self):
+        # runs in the supervisor before forking, snapshots of a previous run would be counted twice otherwise
+        shutil.rmtree(self.path, ignore_errors=True)
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def enable(self, role: str):
+        self.role = role
+
+    def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await asyncio.to_thread(self.write)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.write)
+            except Exception as e:
+                print(f"Process stats write error: {e}")
+            await asyncio.sleep(self.interval)
+
+    def collect(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "role": self.role,
+            "updated_at": time.time(),
+            "histograms": metrics.snapshot(),
+            "watchdog": memory_watchdog.get_stats(),
+            "profiling": profiler.get_stats()
+        }
+
+    def write(self):
+        path = self.path / f"{self.role}-{os.getpid()}.json"
+        temp_path = path.with_suffix(".tmp")
+        temp_path.write_text(json.dumps(self.collect()))
+        os.replace(temp_path, path)
+
+    def read_peers(self) -> list[dict]:
+        if not self.enabled:
+            return []
+
+        # snapshots of exited children are kept so their counts do not vanish from the merged histograms
+        peers = []
+        for path in self.path.glob("*.json"):
+            try:
+                peer = json.loads(path.read_text())
+            except (OSError, ValueError) as e:
+                print(f"Skipping process stats {path.name}: {e}")
+                continue
+            if peer["pid"] == os.getpid():
+                continue
+            peer["alive"] = is_process_alive(peer["pid"])
+            peers.append(peer)
+        return sorted(peers, key=lambda peer: (peer["role"], peer["pid"]))
+
+
+process_stats = ProcessStats()
@@ -0,0 +1,131 @@
+import cProfile
+import io
+import os
+import pstats
+import random
+import re
+import secrets
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Iterator, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0.0))
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+PROFILE_PATH = os.getenv("PROFILE_PATH", "files/profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", 50))
+
+_PROFILE_NAME = re.compile(r"^[\w.-]+\.prof$")
+_session: ContextVar[Optional[cProfile.Profile]] = ContextVar("profile_session", default=None)
+
+
+class RequestProfiler:
+    def __init__(self, path: Path | str = PROFILE_PATH, sample_rate: float = PROFILE_SAMPLE_RATE,
+                 token: Optional[str] = PROFILE_TOKEN, max_files: int = PROFILE_MAX_FILES):
+        self.path = Path(path)
+        self.sample_rate = sample_rate
+        self.token = token
+        self.max_files = max_files
+        self.skipped = 0
+        self.active = 0
+
+    def is_authorized(self, token: Optional[str]) -> bool:
+        return bool(self.token and token) and secrets.compare_digest(token.encode(), self.token.encode())
+
+    def should_profile(self, token: Optional[str] = None) -> bool:
+        if token and self.is_authorized(token):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    @contextmanager
+    def profile(self, name: str, ref_id: Optional[str] = None) -> Iterator[cProfile.Profile]:
+        # only code run inside section() is recorded: time spent awaiting Redis, the queue or result uploads,
+        # and work handed to other threads, never shows up in the saved profile
+        profiler = cProfile.Profile()
+        token = _session.set(profiler)
+        self.active += 1
+        started = time.time()
+        try:
+            yield profiler
+        finally:
+            _session.reset(token)
+            self.active -= 1
+            self.save(profiler, name, ref_id, started)
+
+    @contextmanager
+    def section(self) -> Iterator[None]:
+        # cProfile hooks the whole thread, so it is only switched on around synchronous pipeline code;
+        # left on across an await it would record whatever other requests the event loop ran meanwhile
+        profiler = _session.get()
+        if profiler is None:
+            yield
+            return
+        try:
+            profiler.enable()
+        except ValueError as e:
+            self.skipped += 1
+            print(f"Profiler unavailable: {e}")
+            yield
+            return
+        try:
+            yield
+        finally:
+            profiler.disable()
+
+    def save(self, profiler: cProfile.Profile, name: str, ref_id: Optional[str], started: float):
+        try:
+            self.path.mkdir(parents=True, exist_ok=True)
+            file_name = f"{int(started * 1000)}_{name}_{ref_id or secrets.token_hex(4)}.prof"
+            profiler.dump_stats(str(self.path / re.sub(r"[^\w.-]", "-", file_name)))
+            self.prune()
+        except OSError as e:
+            print(f"Failed to save profile {name}: {e}")
+
+    def prune(self):
+        profiles = sorted(self.path.glob("*.prof"), key=lambda p: p.stat().st_mtime)
+        for stale in profiles[:max(0, len(profiles) - self.max_files)]:
+            stale.unlink(missing_ok=True)
+
+    def list_profiles(self) -> list[dict]:
+        if not self.path.exists():
+            return []
+
+        profiles = []
+        for path in sorted(self.path.glob("*.prof"), key=lambda p: p.stat().st_mtime, reverse=True):
+            stat = path.stat()
+            name, _, ref_id = path.stem.partition("_")[2].rpartition("_")
+            profiles.append({
+                "name": path.name,
+                "profile": name,
+                "ref_id": ref_id,
+                "size_bytes": stat.st_size,
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(stat.st_mtime))
+            })
+        return profiles
+
+    def get_profile_path(self, file_name: str) -> Optional[Path]:
+        if not _PROFILE_NAME.match(file_name):
+            return None
+        path = self.path / file_name
+        return path if path.is_file() else None
+
+    @staticmethod
+    def render_text(path: Path, sort: str = "cumulative", limit: int = 40) -> str:
+        output = io.StringIO()
+        pstats.Stats(str(path), stream=output).strip_dirs().sort_stats(sort).print_stats(limit)
+        return output.getvalue()
+
+    def get_stats(self) -> dict:
+        return {
+            "sample_rate": self.sample_rate,
+            "header_enabled": bool(self.token),
+            "active": self.active,
+            "skipped": self.skipped
+        }
+
+
+profiler = RequestProfiler()
@@ -0,0 +1,267 @@
+import json
+import os
+import random
+import re
+import secrets
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Iterator, NamedTuple, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none").lower()
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", 0.1))
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "skin-analysis")
+TRACE_JSONL_PATH = os.getenv("TRACE_JSONL_PATH", "files/traces/spans.jsonl")
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+TRACE_EXPORT_INTERVAL = float(os.getenv("TRACE_EXPORT_INTERVAL", 2.0))
+TRACE_MAX_QUEUE = int(os.getenv("TRACE_MAX_QUEUE", 4096))
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+class TraceContext(NamedTuple):
+    trace_id: str
+    span_id: Optional[str]
+    sampled: bool
+
+    def to_traceparent(self) -> Optional[str]:
+        if self.span_id is None:
+            return None
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    @staticmethod
+    def from_traceparent(header: Optional[str]) -> Optional["TraceContext"]:
+        match = _TRACEPARENT.match(header.strip().lower()) if header else None
+        if match is None:
+            return None
+        trace_id, span_id, flags = match.groups()
+        return TraceContext(trace_id, span_id, bool(int(flags, 16) & 1))
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes
+        self.error = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": (self.end_ns - self.start_ns) / 1_000_000,
+            "attributes": self.attributes,
+            "error": self.error
+        }
+
+
+class SpanExporter(ABC):
+    @abstractmethod
+    def export(self, spans: list[Span]):
+        pass
+
+    def shutdown(self):
+        pass
+
+
+class JsonlSpanExporter(SpanExporter):
+    def __init__(self, path: Path | str = TRACE_JSONL_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def export(self, spans: list[Span]):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for span in spans:
+                f.write(json.dumps(span.to_dict(), default=str) + "\n")
+
+
+class OtlpHttpSpanExporter(SpanExporter):
+    def __init__(self, endpoint: str = TRACE_OTLP_ENDPOINT, service_name: str = TRACE_SERVICE_NAME):
+        import httpx
+
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.client = httpx.Client(timeout=5)
+
+    @staticmethod
+    def to_any_value(value: Any) -> dict[str, Any]:
+        if isinstance(value, bool):
+            return {"boolValue": value}
+        if isinstance(value, int):
+            return {"intValue": str(value)}
+        if isinstance(value, float):
+            return {"doubleValue": value}
+        return {"stringValue": str(value)}
+
+    def to_otlp_span(self, span: Span) -> dict[str, Any]:
+        attributes = dict(span.attributes)
+        if span.error:
+            attributes["exception.message"] = span.error
+
+        otlp_span = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": 1,
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": [{"key": key, "value": self.to_any_value(value)} for key, value in attributes.items()],
+            "status": {"code": 2 if span.error else 1}
+        }
+        if span.parent_id:
+            otlp_span["parentSpanId"] = span.parent_id
+        return otlp_span
+
+    def export(self, spans: list[Span]):
+        payload = {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+                "scopeSpans": [{
+                    "scope": {"name": "skin-analysis.tracing"},
+                    "spans": [self.to_otlp_span(span) for span in spans]
+                }]
+            }]
+        }
+        try:
+            self.client.post(self.endpoint, json=payload).raise_for_status()
+        except Exception as e:
+            print(f"Span export to {self.endpoint} failed: {e}")
+
+    def shutdown(self):
+        self.client.close()
+
+
+class BatchSpanProcessor:
+    def __init__(self, exporter: SpanExporter, interval: float = TRACE_EXPORT_INTERVAL, max_queue: int = TRACE_MAX_QUEUE):
+        self.exporter = exporter
+        self.interval = interval
+        self.max_queue = max_queue
+        self.queue: list[Span] = []
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def on_end(self, span: Span):
+        with self._lock:
+            if len(self.queue) >= self.max_queue:
+                self.dropped += 1
+                return
+            self.queue.append(span)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+                self._thread.start()
+
+    def _drain(self) -> list[Span]:
+        with self._lock:
+            spans, self.queue = self.queue, []
+        return spans
+
+    def flush(self):
+        spans = self._drain()
+        if spans:
+            self.exporter.export(spans)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Span export failed: {e}")
+
+    def shutdown(self):
+        self.flush()
+        self.exporter.shutdown()
+
+
+_current_context: ContextVar[Optional[TraceContext]] = ContextVar("trace_context", default=None)
+
+
+class Tracer:
+    def __init__(self, processor: Optional[BatchSpanProcessor], sample_rate: float = TRACE_SAMPLE_RATE):
+        self.processor = processor
+        self.sample_rate = sample_rate if processor is not None else 0.0
+
+    def new_context(self, traceparent: Optional[str] = None) -> TraceContext:
+        parent = TraceContext.from_traceparent(traceparent)
+        if parent is not None:
+            return TraceContext(parent.trace_id, parent.span_id, parent.sampled and self.processor is not None)
+        return TraceContext(secrets.token_hex(16), None, random.random() < self.sample_rate)
+
+    def get_context(self) -> Optional[TraceContext]:
+        return _current_context.get()
+
+    def get_trace_id(self) -> Optional[str]:
+        context = _current_context.get()
+        return context.trace_id if context is not None else None
+
+    @contextmanager
+    def trace(self, name: str, context: Optional[TraceContext], **attributes: Any) -> Iterator[Optional[Span]]:
+        token = _current_context.set(context)
+        try:
+            with self.span(name, **attributes) as span:
+                yield span
+        finally:
+            _current_context.reset(token)
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+        context = _current_context.get()
+        if context is None or not context.sampled:
+            yield None
+            return
+
+        span = Span(name, context.trace_id, context.span_id, attributes)
+        token = _current_context.set(TraceContext(context.trace_id, span.span_id, True))
+        try:
+            yield span
+        except BaseException as e:
+            span.error = repr(e)
+            raise
+        finally:
+            _current_context.reset(token)
+            span.end_ns = time.time_ns()
+            self.processor.on_end(span)
+
+    def shutdown(self):
+        if self.processor is not None:
+            self.processor.shutdown()
+
+
+def create_span_exporter(exporter: str = TRACE_EXPORTER) -> Optional[SpanExporter]:
+    match exporter:
+        case "jsonl":
+            return JsonlSpanExporter()
+        case "otlp":
+            return OtlpHttpSpanExporter()
+        case _:
+            return None
+
+
+def create_tracer() -> Tracer:
+    exporter = create_span_exporter()
+    return Tracer(BatchSpanProcessor(exporter) if exporter is not None else None)
+
+
+tracer = create_tracer()
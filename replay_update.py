@@ -0,0 +1,47 @@
+import json
+import os
+import sys
+import urllib.request
+
+from dotenv import load_dotenv
+
+load_dotenv()
+API_HOST = os.getenv("API_HOST", "127.0.0.1")
+API_PORT = int(os.getenv("API_PORT", 8000))
+WEBHOOK_PATH = os.getenv("TELEGRAM_WEBHOOK_PATH", "/telegram/webhook")
+WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET", "")
+
+
+def post_update(url: str, update: dict) -> int:
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(update).encode("utf-8"),
+        headers={
+            "Content-Type": "application/json",
+            "X-Telegram-Bot-Api-Secret-Token": WEBHOOK_SECRET
+        },
+        method="POST"
+    )
+    with urllib.request.urlopen(request) as response:
+        return response.status
+
+
+def main(paths: list[str]):
+    host = "127.0.0.1" if API_HOST == "0.0.0.0" else API_HOST
+    url = f"http://{host}:{API_PORT}{WEBHOOK_PATH}"
+
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        updates = data if isinstance(data, list) else [data]
+        for update in updates:
+            status = post_update(url, update)
+            print(f"{path}: update {update.get('update_id')} -> {status}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python replay_update.py <update.json> [update.json ...]")
+        sys.exit(1)
+    main(sys.argv[1:])
@@ -3,13 +3,15 @@ import uvicorn
 import asyncio
 from dotenv import load_dotenv
 
-from bot_core import build_bot_application, start_polling_bot
+from bot_core import BOT_MODE, build_bot_application, start_polling_bot
 from api.main import app as fastapi_app
+from data.enums import BotMode
 
 load_dotenv()
 TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 API_HOST = os.getenv("API_HOST", "0.0.0.0")
 API_PORT = int(os.getenv("API_PORT", 8000))
+RUN_MODE = os.getenv("RUN_MODE", "single").lower()
 
 
 async def start_api_server_async():
@@ -31,6 +33,11 @@ async def run_all():
         print("ERROR: TELEGRAM_BOT_TOKEN not found.")
         return
 
+    if BOT_MODE == BotMode.WEBHOOK:
+        print("Bot running in webhook mode, updates are served by the API")
+        await start_api_server_async()
+        return
+
     application = build_bot_application(TOKEN)
 
     bot_task = asyncio.create_task(start_polling_bot(application))
@@ -48,6 +55,11 @@ async def start_bot_only_async():
 
 
 def main():
+    if RUN_MODE == "supervisor":
+        from supervisor import main as run_supervisor
+        run_supervisor()
+        return
+
     try:
         asyncio.run(run_all())
     except Exception as e:
@@ -1,65 +1,254 @@
+import time
 from pathlib import Path
+from typing import Awaitable, Callable, Optional
 
-from data.enums import ProcessImageStatus
-from data.image_processing_results import AnalysisResult, AnalyseServiceResult
+from data.enums import ProcessImageStatus, Platform
+from data.image_processing_results import AnalysisResult, AnalyseServiceResult, CropData
+from data.model_results import ModelPredictResult
 from engine.inference_engine import inference_engine
-from image.image_processor import ImageProcessor
+from files.result_store import result_store
+from image.image_processor import ImageProcessor, estimate_analysis_bytes, read_image_header
+from image.memory_budget import memory_budget
+from image.shared_image_pool import SharedImage, shared_image_pool
 from image.skin_not_found import SkinNotFound
+from monitoring.memory_watchdog import memory_watchdog
+from monitoring.metrics import metrics, StageTimings
+from monitoring.profiling import profiler
+from tasks.task_cancellation import TaskCancelled
+
+Checkpoint = Callable[[str], Awaitable[None]]
+
+OUTCOMES = {
+    ProcessImageStatus.SUCCESS: "success",
+    ProcessImageStatus.ERROR: "error",
+    ProcessImageStatus.CLEANED: "cleaned"
+}
 
 
 class AnalysisService:
     @staticmethod
-    async def analyze(user_id: int, photo_path: Path | str) -> AnalyseServiceResult:
+    def load_models():
+        inference_engine.model
+        ImageProcessor.load_detector()
+
+    @staticmethod
+    async def reach(checkpoint: Optional[Checkpoint], stage: str):
+        if checkpoint is not None:
+            await checkpoint(stage)
+
+    @staticmethod
+    def create_processor(photo_path: Path | str, shared_image: Optional[SharedImage], user_id: int,
+                         work_dir: Optional[Path], **kwargs) -> ImageProcessor:
+        image = shared_image_pool.view(shared_image) if shared_image is not None else None
+        if image is None:
+            return ImageProcessor(str(photo_path), user_id, work_dir=work_dir, **kwargs)
+        return ImageProcessor(None, user_id, work_dir=work_dir or Path(photo_path).parent, image=image,
+                              original_size=shared_image.original_size, **kwargs)
+
+    @staticmethod
+    async def analyze(user_id: int, photo_path: Path | str, scratch_dir: Path = None,
+                      ref_id: str = None, checkpoint: Checkpoint = None,
+                      platform: Platform = Platform.API, shared_image: SharedImage = None) -> AnalyseServiceResult:
         if isinstance(photo_path, str): photo_path = Path(photo_path)
 
-        processor = ImageProcessor(str(photo_path), user_id)
+        timings = StageTimings()
+        started = time.perf_counter()
+        result = None
+        outcome = "error"
+        try:
+            async with memory_watchdog.track("analyze"), \
+                    memory_budget.reserve(estimate_analysis_bytes(read_image_header(photo_path))):
+                metrics.queue_wait_seconds.observe(time.perf_counter() - started, "memory_budget", platform.value)
+                result = await AnalysisService._analyze(user_id, photo_path, scratch_dir, ref_id, checkpoint, timings,
+                                                        shared_image)
+            outcome = OUTCOMES[result.get_status()]
+            return result
+        except TaskCancelled:
+            outcome = "cancelled"
+            raise
+        finally:
+            metrics.observe_analysis(timings, platform.value, outcome, time.perf_counter() - started,
+                                     result.get_peak_memory_bytes() if result else 0)
 
+    @staticmethod
+    async def _analyze(user_id: int, photo_path: Path, scratch_dir: Path, ref_id: Optional[str],
+                       checkpoint: Optional[Checkpoint], timings: StageTimings,
+                       shared_image: Optional[SharedImage] = None) -> AnalyseServiceResult:
         try:
-            process_result = processor.process_image()
+            await AnalysisService.reach(checkpoint, "decode")
+            with profiler.section():
+                processor = AnalysisService.create_processor(photo_path, shared_image, user_id, scratch_dir,
+                                                             timings=timings)
+
+            await AnalysisService.reach(checkpoint, "skin_mask")
+            with profiler.section():
+                processor.ensure_skin_present()
+
+            await AnalysisService.reach(checkpoint, "detect")
+            with profiler.section():
+                process_result = processor.build_process_result(processor.get_interesting_crops())
             if process_result.status == ProcessImageStatus.CLEANED:
                 return AnalyseServiceResult(
                     status=process_result.status,
                     message_key=process_result.message_key,
+                    peak_memory_bytes=processor.peak_memory_bytes
                 )
 
-            analysis_results: list[AnalysisResult] = []
-            for crop in process_result.crops:
-                model_res = inference_engine.predict_crop(crop.path)
-
-                if model_res.get_confidence() < 0.40:
-                    continue
-
-                if model_res.get_label() == "healthy" and model_res.get_confidence() < 0.60:
-                    continue
+            await AnalysisService.reach(checkpoint, "classify")
+            with profiler.section(), timings.stage("classify"):
+                predictions = inference_engine.predict_crops([crop.path for crop in process_result.crops])
+            analysis_results = AnalysisService.select_results(process_result.crops, predictions)
 
-                analysis_results.append(AnalysisResult(
-                    crop=crop,
-                    label=model_res.get_label(),
-                    confidence=model_res.get_confidence()
-                ))
-
-            annotated_image_path = processor.annotate_image(analysis_results)
+            await AnalysisService.reach(checkpoint, "annotate")
+            with profiler.section():
+                annotated_path = processor.annotate_image(analysis_results)
+            stored = await result_store.put_file(user_id, annotated_path, ref_id)
 
             return AnalyseServiceResult(
                 status=ProcessImageStatus.SUCCESS,
-                image_path=annotated_image_path,
-                analysis_results=analysis_results
+                image_path=stored.path,
+                image_name=stored.get_image_name(),
+                analysis_results=processor.map_to_original(analysis_results),
+                peak_memory_bytes=processor.peak_memory_bytes
             )
 
-        except SkinNotFound as se:
+        except TaskCancelled:
+            raise
+        except Exception as e:
+            return AnalysisService.error_result(e)
+
+    @staticmethod
+    async def analyze_batch(user_id: int, photo_paths: list[Path | str], scratch_dir: Path = None,
+                            ref_ids: list[str] = None, checkpoint: Checkpoint = None,
+                            platform: Platform = Platform.API,
+                            shared_images: list[Optional[SharedImage]] = None) -> list[AnalyseServiceResult]:
+        estimate = sum(estimate_analysis_bytes(read_image_header(photo_path)) for photo_path in photo_paths)
+        timings = [StageTimings() for _ in photo_paths]
+        started = time.perf_counter()
+        results = None
+        outcome = "error"
+        try:
+            async with memory_watchdog.track("analyze_batch"), memory_budget.reserve(estimate):
+                metrics.queue_wait_seconds.observe(time.perf_counter() - started, "memory_budget", platform.value)
+                results = await AnalysisService._analyze_batch(user_id, photo_paths, scratch_dir, ref_ids, checkpoint,
+                                                               timings, shared_images)
+            return results
+        except TaskCancelled:
+            outcome = "cancelled"
+            raise
+        finally:
+            share = (time.perf_counter() - started) / max(1, len(photo_paths))
+            for index, image_timings in enumerate(timings):
+                image_outcome = OUTCOMES[results[index].get_status()] if results else outcome
+                metrics.observe_analysis(image_timings, platform.value, image_outcome, share,
+                                         results[index].get_peak_memory_bytes() if results else 0)
+
+    @staticmethod
+    async def _analyze_batch(user_id: int, photo_paths: list[Path | str], scratch_dir: Path, ref_ids: Optional[list[str]],
+                             checkpoint: Optional[Checkpoint], timings: list[StageTimings],
+                             shared_images: list[Optional[SharedImage]] = None) -> list[AnalyseServiceResult]:
+        results: list[AnalyseServiceResult | None] = [None] * len(photo_paths)
+        processors: dict[int, ImageProcessor] = {}
+
+        await AnalysisService.reach(checkpoint, "decode")
+        for index, photo_path in enumerate(photo_paths):
+            try:
+                with profiler.section():
+                    processor = AnalysisService.create_processor(
+                        photo_path, shared_images[index] if shared_images else None, user_id, scratch_dir,
+                        tag=str(index), timings=timings[index]
+                    )
+                await AnalysisService.reach(checkpoint, "skin_mask")
+                with profiler.section():
+                    processor.ensure_skin_present()
+                processors[index] = processor
+            except TaskCancelled:
+                raise
+            except Exception as e:
+                results[index] = AnalysisService.error_result(e)
+
+        try:
+            await AnalysisService.reach(checkpoint, "detect")
+            crops_by_index: dict[int, list[CropData]] = {}
+            with profiler.section():
+                detections = ImageProcessor.detect_batch(list(processors.values()))
+                for (index, processor), raw_data in zip(processors.items(), detections):
+                    process_result = processor.build_process_result(processor.extract_crops(raw_data))
+                    if process_result.status == ProcessImageStatus.CLEANED:
+                        results[index] = AnalyseServiceResult(
+                            status=process_result.status,
+                            message_key=process_result.message_key,
+                            peak_memory_bytes=processor.peak_memory_bytes
+                        )
+                        continue
+                    crops_by_index[index] = process_result.crops
+
+            all_crops = [crop for crops in crops_by_index.values() for crop in crops]
+            await AnalysisService.reach(checkpoint, "classify")
+            classify_started = time.perf_counter()
+            with profiler.section():
+                predictions = iter(inference_engine.predict_crops([crop.path for crop in all_crops]))
+            classify_seconds = time.perf_counter() - classify_started
+            for index, crops in crops_by_index.items():
+                timings[index].add("classify", classify_seconds * len(crops) / max(1, len(all_crops)))
+
+            await AnalysisService.reach(checkpoint, "annotate")
+            for index, crops in crops_by_index.items():
+                analysis_results = AnalysisService.select_results(crops, [next(predictions) for _ in crops])
+                with profiler.section():
+                    annotated_path = processors[index].annotate_image(analysis_results)
+                stored = await result_store.put_file(user_id, annotated_path, ref_ids[index] if ref_ids else None)
+                results[index] = AnalyseServiceResult(
+                    status=ProcessImageStatus.SUCCESS,
+                    image_path=stored.path,
+                    image_name=stored.get_image_name(),
+                    analysis_results=processors[index].map_to_original(analysis_results),
+                    peak_memory_bytes=processors[index].peak_memory_bytes
+                )
+
+        except TaskCancelled:
+            raise
+        except Exception as e:
+            for index in processors:
+                if results[index] is None:
+                    results[index] = AnalysisService.error_result(e)
+
+        return results
+
+    @staticmethod
+    def select_results(crops: list[CropData], predictions: list[ModelPredictResult]) -> list[AnalysisResult]:
+        analysis_results: list[AnalysisResult] = []
+        for crop, model_res in zip(crops, predictions):
+            if model_res.get_confidence() < 0.40:
+                continue
+
+            if model_res.get_label() == "healthy" and model_res.get_confidence() < 0.60:
+                continue
+
+            analysis_results.append(AnalysisResult(
+                crop=crop,
+                label=model_res.get_label(),
+                confidence=model_res.get_confidence()
+            ))
+
+        return analysis_results
+
+    @staticmethod
+    def error_result(error: Exception) -> AnalyseServiceResult:
+        if isinstance(error, SkinNotFound):
             return AnalyseServiceResult(
                 status=ProcessImageStatus.ERROR,
-                message_key=str(se),
+                message_key=str(error),
             )
-        except ValueError as ve:
-            print(ve)
+        if isinstance(error, ValueError):
+            print(error)
             return AnalyseServiceResult(
                 status=ProcessImageStatus.ERROR,
                 message_key="success.analysis.cleaned"
             )
-        except Exception as e:
-            print(e)
-            return AnalyseServiceResult(
-                status=ProcessImageStatus.ERROR,
-                message_key="errors.analysis.unexpected_error"
-            )
\ No newline at end of file
+
+        print(error)
+        return AnalyseServiceResult(
+            status=ProcessImageStatus.ERROR,
+            message_key="errors.analysis.unexpected_error"
+        )
@@ -0,0 +1,171 @@
+import asyncio
+import os
+import time
+from typing import Optional
+
+import cv2
+import numpy as np
+from dotenv import load_dotenv
+
+from engine.inference_engine import inference_engine
+from image.image_header import InvalidImageHeader, sniff_image_header
+from image.image_processor import HEADER_PROBE_BYTES, ImageProcessor, estimate_analysis_bytes
+from image.memory_budget import memory_budget
+from service.analysis_service import AnalysisService
+from tasks.inference_queue import inference_queue
+
+load_dotenv()
+STREAM_MAX_FRAME_BYTES = int(os.getenv("STREAM_MAX_FRAME_BYTES", 512 * 1024))
+STREAM_DIFF_THRESHOLD = float(os.getenv("STREAM_DIFF_THRESHOLD", 6.0))
+STREAM_MAX_REUSE_FRAMES = int(os.getenv("STREAM_MAX_REUSE_FRAMES", 30))
+STREAM_MAX_SESSIONS = int(os.getenv("STREAM_MAX_SESSIONS", 8))
+
+SIGNATURE_SIZE = (64, 64)
+
+
+class FrameRejected(Exception):
+    def __init__(self, reason: str):
+        self.reason = reason
+        super().__init__(self.reason)
+
+
+def decode_frame(frame: bytes) -> np.ndarray:
+    image = cv2.imdecode(np.frombuffer(frame, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise FrameRejected("unsupported_format")
+    return image
+
+
+def detect(user_id: int, image: np.ndarray) -> list[dict]:
+    processor = ImageProcessor(None, user_id, image=image)
+    regions = processor.detect_regions()
+    analysis_results = AnalysisService.select_results(
+        [crop for crop, _ in regions],
+        inference_engine.predict_images([region for _, region in regions])
+    )
+
+    return [
+        {
+            "label": result.get_label(),
+            "confidence": result.confidence,
+            "box": {"x": result.crop.x, "y": result.crop.y, "w": result.crop.w, "h": result.crop.h}
+        }
+        for result in processor.map_to_original(analysis_results)
+    ]
+
+
+async def detect_frame(user_id: int, frame: bytes, image: Optional[np.ndarray] = None) -> list[dict]:
+    # runs on an inference worker when the queue is enabled, which decodes the frame again on its side
+    if image is None:
+        image = decode_frame(frame)
+    try:
+        header = sniff_image_header(frame[:HEADER_PROBE_BYTES])
+    except InvalidImageHeader:
+        header = None
+    async with memory_budget.reserve(estimate_analysis_bytes(header)):
+        return await asyncio.to_thread(detect, user_id, image)
+
+
+class CameraStreamSession:
+    active = 0
+
+    def __init__(self, user_id: int, diff_threshold: float = STREAM_DIFF_THRESHOLD,
+                 max_reuse_frames: int = STREAM_MAX_REUSE_FRAMES):
+        self.user_id = user_id
+        self.diff_threshold = diff_threshold
+        self.max_reuse_frames = max_reuse_frames
+
+        self.latest_frame: Optional[bytes] = None
+        self.latest_index = 0
+        self.frame_ready = asyncio.Event()
+        self.closed = False
+
+        self.received = 0
+        self.dropped = 0
+        self.detected = 0
+        self.reused = 0
+
+        self.last_signature: Optional[np.ndarray] = None
+        self.last_boxes: list[dict] = []
+        self.reuse_streak = 0
+
+    @classmethod
+    def is_full(cls) -> bool:
+        return cls.active >= STREAM_MAX_SESSIONS
+
+    def submit(self, frame: bytes):
+        if len(frame) > STREAM_MAX_FRAME_BYTES:
+            raise FrameRejected("frame_too_large")
+
+        self.received += 1
+        if self.latest_frame is not None:
+            self.dropped += 1
+        self.latest_frame = frame
+        self.latest_index = self.received
+        self.frame_ready.set()
+
+    def close(self):
+        self.closed = True
+        self.frame_ready.set()
+
+    async def next_frame(self) -> Optional[tuple[int, bytes]]:
+        while self.latest_frame is None:
+            if self.closed:
+                return None
+            self.frame_ready.clear()
+            await self.frame_ready.wait()
+
+        frame, self.latest_frame = self.latest_frame, None
+        return self.latest_index, frame
+
+    @staticmethod
+    def get_signature(image: np.ndarray) -> np.ndarray:
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        return cv2.resize(gray, SIGNATURE_SIZE, interpolation=cv2.INTER_AREA)
+
+    def get_frame_diff(self, signature: np.ndarray) -> Optional[float]:
+        if self.last_signature is None:
+            return None
+        return float(np.mean(cv2.absdiff(signature, self.last_signature)))
+
+    async def analyze_frame(self, index: int, frame: bytes) -> dict:
+        started = time.perf_counter()
+
+        image = decode_frame(frame)
+        signature = self.get_signature(image)
+        diff = self.get_frame_diff(signature)
+
+        reuse = diff is not None and diff < self.diff_threshold and self.reuse_streak < self.max_reuse_frames
+        if reuse:
+            self.reused += 1
+            self.reuse_streak += 1
+        else:
+            if inference_queue.enabled:
+                # API workers under the supervisor never load the models, detection runs on an inference worker
+                self.last_boxes = await inference_queue.run(detect_frame, user_id=self.user_id, frame=frame)
+            else:
+                self.last_boxes = await detect_frame(self.user_id, frame, image)
+            self.last_signature = signature
+            self.detected += 1
+            self.reuse_streak = 0
+
+        return {
+            "type": "result",
+            "frame": index,
+            "width": image.shape[1],
+            "height": image.shape[0],
+            "reused": reuse,
+            "diff": diff,
+            "results": self.last_boxes,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+            "dropped": self.dropped
+        }
+
+    def get_stats(self) -> dict:
+        return {
+            "type": "stats",
+            "received": self.received,
+            "dropped": self.dropped,
+            "detected": self.detected,
+            "reused": self.reused
+        }
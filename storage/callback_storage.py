@@ -1,16 +1,35 @@
+import os
 import secrets
 from typing import Optional
 
+from dotenv import load_dotenv
 from redis.asyncio import Redis
 
+from storage.callback_token import CallbackTokenSigner, derive_secret
+from storage.redis_client import redis_connection
+
+load_dotenv()
+CALLBACK_SECRET = os.getenv("CALLBACK_SECRET")
+TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+
+SIGNED_ACTIONS = ("disconnect_device", "confirm_disconnect")
+
 
 class CallbackStorage:
     def __init__(self, prefix: str = "cb:", ttl_days: int = 1):
-        self.redis = Redis(host='localhost', port=6379, db=0)
         self.prefix = prefix
         self.ttl_seconds = ttl_days * 86400
+        self.signer = CallbackTokenSigner(derive_secret(CALLBACK_SECRET, TOKEN), SIGNED_ACTIONS)
+
+    @property
+    def redis(self) -> Redis:
+        return redis_connection.client
 
     async def store(self, payload: str) -> str:
+        token = self.signer.sign(payload, self.ttl_seconds)
+        if token is not None:
+            return token
+
         key = secrets.token_urlsafe(6)
         full_key = f"{self.prefix}{key}"
         await self.redis.set(full_key, payload, ex=self.ttl_seconds)
@@ -18,15 +37,23 @@ class CallbackStorage:
 
 
     async def get(self, key: str) -> Optional[str]:
-        value = await self.redis.get(key)
+        if self.signer.is_token(key):
+            return self.signer.verify(key)
+
+        value = await self.redis.getdel(key)
         if value is None:
             return None
         return value.decode('utf-8')
 
     async def delete(self, key: str) -> None:
+        if self.signer.is_token(key):
+            return
         await self.redis.delete(key)
 
     def get_prefix(self) -> str:
         return self.prefix
 
+    def is_stored(self, data: str) -> bool:
+        return data.startswith(self.prefix) or self.signer.is_token(data)
+
 callback_storage = CallbackStorage()
@@ -0,0 +1,120 @@
+import base64
+import hashlib
+import hmac
+import secrets
+import struct
+import time
+import uuid
+from typing import Optional
+
+TELEGRAM_CALLBACK_DATA_LIMIT = 64
+
+_UUID_ARG = 0x01
+_TEXT_ARG = 0x02
+
+
+class CallbackTokenSigner:
+    def __init__(self, secret: bytes, actions: tuple[str, ...], prefix: str = "~", mac_size: int = 6):
+        self.secret = secret
+        self.actions = actions
+        self.prefix = prefix
+        self.mac_size = mac_size
+
+    def sign(self, payload: str, ttl_seconds: int) -> Optional[str]:
+        action, *args = payload.split(":")
+        if action not in self.actions:
+            return None
+
+        body = bytearray(struct.pack(">BI", self.actions.index(action), int(time.time()) + ttl_seconds))
+        for arg in args:
+            packed_uuid = self._pack_uuid(arg)
+            if packed_uuid is not None:
+                body += bytes([_UUID_ARG]) + packed_uuid
+                continue
+
+            encoded = arg.encode("utf-8")
+            if len(encoded) > 255:
+                return None
+            body += bytes([_TEXT_ARG, len(encoded)]) + encoded
+
+        token = self.prefix + self._b64encode(bytes(body) + self._mac(bytes(body)))
+        if len(token.encode("utf-8")) > TELEGRAM_CALLBACK_DATA_LIMIT:
+            return None
+        return token
+
+    def verify(self, token: str) -> Optional[str]:
+        if not token.startswith(self.prefix):
+            return None
+
+        try:
+            raw = self._b64decode(token[len(self.prefix):])
+        except ValueError:
+            return None
+
+        if len(raw) < 5 + self.mac_size:
+            return None
+
+        body, mac = raw[:-self.mac_size], raw[-self.mac_size:]
+        if not hmac.compare_digest(mac, self._mac(body)):
+            return None
+
+        action_index, expires_at = struct.unpack(">BI", body[:5])
+        if expires_at < time.time() or action_index >= len(self.actions):
+            return None
+
+        parts = [self.actions[action_index]]
+        offset = 5
+        try:
+            while offset < len(body):
+                kind = body[offset]
+                if kind == _UUID_ARG:
+                    parts.append(str(uuid.UUID(bytes=body[offset + 1:offset + 17])))
+                    offset += 17
+                elif kind == _TEXT_ARG:
+                    length = body[offset + 1]
+                    parts.append(body[offset + 2:offset + 2 + length].decode("utf-8"))
+                    offset += 2 + length
+                else:
+                    return None
+        except (ValueError, IndexError):
+            return None
+
+        return ":".join(parts)
+
+    def is_token(self, data: str) -> bool:
+        return data.startswith(self.prefix)
+
+    def _mac(self, body: bytes) -> bytes:
+        return hmac.new(self.secret, body, hashlib.sha256).digest()[:self.mac_size]
+
+    @staticmethod
+    def _pack_uuid(value: str) -> Optional[bytes]:
+        if len(value) != 36:
+            return None
+        try:
+            parsed = uuid.UUID(value)
+        except ValueError:
+            return None
+        return parsed.bytes if str(parsed) == value else None
+
+    @staticmethod
+    def _b64encode(data: bytes) -> str:
+        return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+    @staticmethod
+    def _b64decode(data: str) -> bytes:
+        try:
+            return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+        except (ValueError, TypeError) as e:
+            raise ValueError(str(e))
+
+
+def derive_secret(secret: Optional[str], bot_token: Optional[str], purpose: str = "callback-token") -> bytes:
+    if secret:
+        return secret.encode("utf-8")
+    if bot_token:
+        return hashlib.sha256(f"{purpose}:{bot_token}".encode("utf-8")).digest()
+
+    print(f"No secret configured for {purpose} and TELEGRAM_BOT_TOKEN is not set, "
+          f"signatures will not survive restarts")
+    return secrets.token_bytes(32)
@@ -0,0 +1,76 @@
+import asyncio
+import json
+from typing import Awaitable, Callable
+
+from redis.asyncio.client import Pipeline
+from telegram import Bot, Message
+
+from storage.redis_client import redis_connection
+
+
+class MediaGroupStorage:
+    # parts of one album can reach different API replicas in webhook mode, so they are collected in Redis;
+    # every part bumps the group's version and only the replica holding the latest part flushes it
+    def __init__(self, prefix: str = "album:", window_seconds: float = 1.5, max_items: int = 10,
+                 ttl_seconds: int = 60):
+        self.prefix = prefix
+        self.window_seconds = window_seconds
+        self.max_items = max_items
+        self.ttl_seconds = ttl_seconds
+        self._timers: dict[str, asyncio.Task] = {}
+
+    async def add(self, message: Message, on_ready: Callable[[list[Message]], Awaitable[None]]) -> None:
+        key = f"{self.prefix}{message.chat_id}:{message.media_group_id}"
+
+        async with redis_connection.pipeline(transaction=True) as pipe:
+            pipe.rpush(f"{key}:messages", message.to_json())
+            pipe.expire(f"{key}:messages", self.ttl_seconds)
+            pipe.incr(f"{key}:version")
+            pipe.expire(f"{key}:version", self.ttl_seconds)
+            count, _, version, _ = await redis_connection.execute_pipeline(pipe)
+
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+
+        delay = 0 if count >= self.max_items else self.window_seconds
+        self._timers[key] = asyncio.create_task(self._flush_later(key, version, delay, message.get_bot(), on_ready))
+
+    async def _flush_later(self, key: str, version: int, delay: float, bot: Bot,
+                           on_ready: Callable[[list[Message]], Awaitable[None]]) -> None:
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            return
+
+        self._timers.pop(key, None)
+        try:
+            messages = [Message.de_json(json.loads(data), bot) for data in await self.claim(key, version)]
+        except Exception as e:
+            print(f"Media group claim error: {e}")
+            return
+        if not messages:
+            return
+
+        messages.sort(key=lambda message: message.message_id)
+        try:
+            await on_ready(messages)
+        except Exception as e:
+            print(f"Media group handling error: {e}")
+
+    async def claim(self, key: str, version: int) -> list[bytes]:
+        messages_key, version_key = f"{key}:messages", f"{key}:version"
+
+        async def take(pipe: Pipeline) -> list[bytes]:
+            current = await pipe.get(version_key)
+            if current is None or int(current) != version:
+                return []
+            messages = await pipe.lrange(messages_key, 0, -1)
+            pipe.multi()
+            pipe.delete(messages_key, version_key)
+            return messages
+
+        return await redis_connection.transaction(take, version_key)
+
+
+media_group_storage = MediaGroupStorage()
@@ -0,0 +1,136 @@
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+
+from dotenv import load_dotenv
+from redis.asyncio import Redis, BlockingConnectionPool
+from redis.asyncio.client import Pipeline
+from redis.asyncio.retry import Retry
+from redis.backoff import ExponentialBackoff
+from redis.exceptions import ConnectionError, TimeoutError
+
+from monitoring.metrics import metrics
+from monitoring.tracing import tracer
+
+load_dotenv()
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", 5))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", 2))
+REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", 2))
+REDIS_RETRY_ATTEMPTS = int(os.getenv("REDIS_RETRY_ATTEMPTS", 3))
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", 30))
+
+
+class RedisStats:
+    def __init__(self):
+        self.commands: dict[str, list[float]] = {}
+
+    def observe(self, command: str, seconds: float):
+        metrics.redis_seconds.observe(seconds, command)
+        stats = self.commands.get(command)
+        if stats is None:
+            self.commands[command] = [1, seconds, seconds]
+            return
+        stats[0] += 1
+        stats[1] += seconds
+        if seconds > stats[2]:
+            stats[2] = seconds
+
+    def snapshot(self) -> dict[str, dict[str, float]]:
+        return {
+            command: {
+                "count": int(count),
+                "avg_ms": total / count * 1000,
+                "max_ms": max_seconds * 1000
+            }
+            for command, (count, total, max_seconds) in self.commands.items()
+        }
+
+
+class InstrumentedRedis(Redis):
+    def __init__(self, *args, stats: RedisStats, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = stats
+
+    async def execute_command(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            with tracer.span(f"redis.{str(args[0]).upper()}"):
+                return await super().execute_command(*args, **options)
+        finally:
+            self.stats.observe(str(args[0]).upper(), time.perf_counter() - started)
+
+
+class RedisConnection:
+    def __init__(self, url: str = REDIS_URL):
+        self.url = url
+        self.stats = RedisStats()
+        self._pool: Optional[BlockingConnectionPool] = None
+        self._client: Optional[InstrumentedRedis] = None
+
+    @property
+    def client(self) -> Redis:
+        if self._client is None:
+            self._pool = BlockingConnectionPool.from_url(
+                self.url,
+                max_connections=REDIS_MAX_CONNECTIONS,
+                timeout=REDIS_POOL_TIMEOUT,
+                socket_timeout=REDIS_SOCKET_TIMEOUT,
+                socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+                health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+                retry=Retry(ExponentialBackoff(cap=1, base=0.05), REDIS_RETRY_ATTEMPTS),
+                retry_on_error=[ConnectionError, TimeoutError],
+            )
+            self._client = InstrumentedRedis(connection_pool=self._pool, stats=self.stats)
+        return self._client
+
+    @asynccontextmanager
+    async def pipeline(self, transaction: bool = True) -> AsyncIterator[Pipeline]:
+        async with self.client.pipeline(transaction=transaction) as pipe:
+            yield pipe
+
+    async def execute_pipeline(self, pipe: Pipeline) -> list[Any]:
+        started = time.perf_counter()
+        try:
+            return await pipe.execute()
+        finally:
+            self.stats.observe("MULTI" if pipe.is_transaction else "PIPELINE", time.perf_counter() - started)
+
+    async def transaction(self, func: Callable[[Pipeline], Awaitable[Any]], *watches: str) -> Any:
+        started = time.perf_counter()
+        try:
+            return await self.client.transaction(func, *watches, value_from_callable=True)
+        finally:
+            self.stats.observe("MULTI", time.perf_counter() - started)
+
+    async def ping(self) -> bool:
+        try:
+            return bool(await self.client.ping())
+        except (ConnectionError, TimeoutError):
+            return False
+
+    def get_pool_usage(self) -> dict[str, int]:
+        if self._pool is None:
+            return {"max": REDIS_MAX_CONNECTIONS, "in_use": 0, "idle": 0}
+        return {
+            "max": self._pool.max_connections,
+            "in_use": len(getattr(self._pool, "_in_use_connections", ())),
+            "idle": len(getattr(self._pool, "_available_connections", ())),
+        }
+
+    def get_stats(self) -> dict[str, Any]:
+        return {
+            "pool": self.get_pool_usage(),
+            "commands": self.stats.snapshot()
+        }
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose(close_connection_pool=True)
+        self._client = None
+        self._pool = None
+
+
+redis_connection = RedisConnection()
@@ -0,0 +1,254 @@
+import asyncio
+import os
+import signal
+import socket
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Optional
+
+from dotenv import load_dotenv
+
+from engine.threading_profile import threading_config
+
+load_dotenv()
+TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+API_HOST = os.getenv("API_HOST", "0.0.0.0")
+API_PORT = int(os.getenv("API_PORT", 8000))
+API_WORKERS = int(os.getenv("API_WORKERS", 2))
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS") or threading_config.profile.inference_workers or 1)
+SUPERVISOR_RESTART_DELAY = float(os.getenv("SUPERVISOR_RESTART_DELAY", 1.0))
+SUPERVISOR_MAX_RESTART_DELAY = float(os.getenv("SUPERVISOR_MAX_RESTART_DELAY", 30.0))
+SUPERVISOR_STABLE_SECONDS = float(os.getenv("SUPERVISOR_STABLE_SECONDS", 60.0))
+SUPERVISOR_SHUTDOWN_TIMEOUT = float(os.getenv("SUPERVISOR_SHUTDOWN_TIMEOUT", 30.0))
+
+
+@dataclass
+class Child:
+    role: str
+    index: int
+    target: Callable[[], None]
+    pid: Optional[int] = None
+    started_at: float = 0.0
+    restarts: int = 0
+    restart_at: Optional[float] = None
+    delay: float = field(default=SUPERVISOR_RESTART_DELAY)
+
+    @property
+    def name(self) -> str:
+        return f"{self.role}-{self.index}"
+
+
+def warm_model_files():
+    from files.file_manager import file_manager
+
+    # children load their own weights (TF is not fork-safe once its runtime has started),
+    # so the parent reads the files once to serve every child's load from the shared page cache
+    total = 0
+    for root in (file_manager.get_detector_model_path(), file_manager.get_classification_model_path()):
+        paths = [root] if root.is_file() else [path for path in Path(root).rglob("*") if path.is_file()]
+        for path in paths:
+            with open(path, "rb") as f:
+                while chunk := f.read(1024 * 1024):
+                    total += len(chunk)
+    print(f"Warmed {total / (1024 * 1024):.1f} MB of model files")
+
+
+def preload():
+    started = time.perf_counter()
+    import tensorflow
+    import api.main
+    import bot_core
+
+    warm_model_files()
+    print(f"Preloaded application modules in {time.perf_counter() - started:.1f}s")
+
+
+def reset_signals():
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, signal.SIG_DFL)
+
+
+def run_api_worker(sock: socket.socket):
+    import uvicorn
+    from api.main import app
+
+    server = uvicorn.Server(uvicorn.Config(app, log_level="info", reload=False))
+    asyncio.run(server.serve(sockets=[sock]))
+
+
+async def serve_inference_jobs():
+    from files.file_manager import file_manager
+    from monitoring.memory_watchdog import memory_watchdog
+    from monitoring.process_stats import process_stats
+    from service.analysis_service import AnalysisService
+    from tasks.inference_queue import inference_queue
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop.set)
+
+    memory_watchdog.start()
+    process_stats.start()
+    await asyncio.to_thread(AnalysisService.load_models)
+    print(f"Inference worker {os.getpid()} ready")
+
+    # jobs are taken one at a time so a stop or a watchdog recycle never strands a dequeued task
+    while not stop.is_set() and not memory_watchdog.draining:
+        job = await inference_queue.get()
+        if job is None:
+            continue
+        func, kwargs = job
+        if "scratch_dir" in kwargs:
+            try:
+                file_manager.claim_scratch(kwargs["scratch_dir"])
+            except OSError as e:
+                print(f"Could not claim scratch {kwargs['scratch_dir']}: {e}")
+        try:
+            await func(**kwargs)
+        except Exception as e:
+            print(f"Inference job {func.__name__} failed: {e}")
+
+    await process_stats.stop()
+    from storage.redis_client import redis_connection
+    await redis_connection.close()
+
+
+def run_inference_worker(index: int, workers: int):
+    threading_config.pin_worker(index, workers)
+    asyncio.run(serve_inference_jobs())
+
+
+def run_bot():
+    from bot_core import build_bot_application, start_polling_bot
+
+    asyncio.run(start_polling_bot(build_bot_application(TOKEN)))
+
+
+class Supervisor:
+    def __init__(self, api_workers: int = API_WORKERS, inference_workers: int = INFERENCE_WORKERS):
+        self.api_workers = api_workers
+        self.inference_workers = inference_workers
+        self.children: list[Child] = []
+        self.stopping = False
+
+    def spawn(self, child: Child):
+        pid = os.fork()
+        if pid == 0:
+            from monitoring.memory_watchdog import memory_watchdog
+            from monitoring.process_stats import process_stats
+
+            reset_signals()
+            memory_watchdog.enable_recycling()
+            process_stats.enable(child.role)
+            code = 0
+            try:
+                child.target()
+            except BaseException as e:
+                print(f"{child.name} exited with error: {e}")
+                code = 1
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code)
+
+        child.pid = pid
+        child.started_at = time.monotonic()
+        child.restart_at = None
+        print(f"Started {child.name} (pid {pid})")
+
+    def on_exit(self, child: Child, status: int):
+        child.pid = None
+        code = os.waitstatus_to_exitcode(status)
+        if self.stopping:
+            print(f"{child.name} stopped ({code})")
+            return
+
+        # crash loops back off exponentially, a child that stayed up long enough starts from the base delay again
+        uptime = time.monotonic() - child.started_at
+        child.delay = SUPERVISOR_RESTART_DELAY if uptime >= SUPERVISOR_STABLE_SECONDS \
+            else min(child.delay * 2, SUPERVISOR_MAX_RESTART_DELAY)
+        child.restarts += 1
+        child.restart_at = time.monotonic() + child.delay
+        print(f"{child.name} exited ({code}) after {uptime:.0f}s, restarting in {child.delay:.1f}s")
+
+    def stop(self, signum, frame):
+        if self.stopping:
+            return
+        self.stopping = True
+        print(f"Supervisor received signal {signum}, stopping children")
+        for child in self.children:
+            if child.pid is not None:
+                os.kill(child.pid, signal.SIGTERM)
+
+    def run(self):
+        from bot_core import BOT_MODE
+        from data.enums import BotMode
+        from image.shared_image_pool import shared_image_pool
+        from monitoring.process_stats import process_stats
+        from tasks.inference_queue import inference_queue
+
+        preload()
+        process_stats.reset()
+        if self.inference_workers > 0:
+            inference_queue.create()
+            shared_image_pool.create()
+
+        sock = socket.create_server((API_HOST, API_PORT), reuse_port=False, backlog=2048)
+        sock.set_inheritable(True)
+        print(f"Supervisor {os.getpid()} listening on http://{API_HOST}:{API_PORT} with {self.api_workers} API "
+              f"and {self.inference_workers} inference workers")
+
+        self.children = [Child("api", i, lambda: run_api_worker(sock)) for i in range(self.api_workers)]
+        self.children += [
+            Child("inference", i, lambda i=i: run_inference_worker(i, self.inference_workers))
+            for i in range(self.inference_workers)
+        ]
+        if TOKEN and BOT_MODE == BotMode.POLLING:
+            self.children.append(Child("bot", 0, run_bot))
+
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for child in self.children:
+            self.spawn(child)
+
+        deadline = None
+        while any(child.pid is not None for child in self.children) or not self.stopping:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                pid, status = 0, 0
+            if pid:
+                child = next((child for child in self.children if child.pid == pid), None)
+                if child is not None:
+                    self.on_exit(child, status)
+                continue
+
+            if self.stopping:
+                deadline = deadline or time.monotonic() + SUPERVISOR_SHUTDOWN_TIMEOUT
+                if time.monotonic() > deadline:
+                    for child in self.children:
+                        if child.pid is not None:
+                            print(f"{child.name} did not stop in time, killing")
+                            os.kill(child.pid, signal.SIGKILL)
+            else:
+                now = time.monotonic()
+                for child in self.children:
+                    if child.pid is None and child.restart_at is not None and now >= child.restart_at:
+                        self.spawn(child)
+            time.sleep(0.2)
+
+        inference_queue.close()
+        shared_image_pool.close()
+        sock.close()
+        print("Supervisor stopped")
+
+
+def main():
+    Supervisor().run()
+
+
+if __name__ == "__main__":
+    main()
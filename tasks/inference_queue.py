@@ -0,0 +1,93 @@
+import asyncio
+import multiprocessing
+import os
+import pickle
+import queue
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Optional
+
+from dotenv import load_dotenv
+
+from storage.redis_client import redis_connection
+
+load_dotenv()
+INFERENCE_CALL_TIMEOUT = float(os.getenv("INFERENCE_CALL_TIMEOUT", 300))
+
+Job = tuple[Callable[..., Awaitable[Any]], dict[str, Any]]
+
+
+def get_reply_key(call_id: str) -> str:
+    return f"inference:reply:{call_id}"
+
+
+async def run_call(call_id: str, func: Callable[..., Awaitable[Any]], kwargs: dict[str, Any]):
+    try:
+        reply = (True, await func(**kwargs))
+    except Exception as e:
+        reply = (False, e)
+    try:
+        payload = pickle.dumps(reply)
+    except Exception as e:
+        payload = pickle.dumps((False, RuntimeError(f"{func.__name__} returned an unpicklable value: {e}")))
+
+    key = get_reply_key(call_id)
+    async with redis_connection.pipeline(transaction=True) as pipe:
+        pipe.rpush(key, payload)
+        pipe.expire(key, 60)
+        await redis_connection.execute_pipeline(pipe)
+
+
+class InferenceQueue:
+    def __init__(self):
+        self._queue: Optional[multiprocessing.Queue] = None
+        self.owner_pid: Optional[int] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._queue is not None
+
+    def create(self):
+        # must run in the supervisor before forking so every worker inherits the same pipe
+        self._queue = multiprocessing.get_context("fork").Queue()
+        self.owner_pid = os.getpid()
+
+    def submit(self, job: Callable[..., Awaitable[Any]], **kwargs: Any) -> bool:
+        if self._queue is None:
+            return False
+        self._queue.put((job, kwargs))
+        return True
+
+    async def run(self, func: Callable[..., Awaitable[Any]], **kwargs: Any) -> Any:
+        if not self.enabled:
+            return await func(**kwargs)
+
+        # callers that need the result (the bot handlers) get it back through Redis, since the worker
+        # that runs the job can be any inference process
+        call_id = uuid.uuid4().hex
+        self.submit(run_call, call_id=call_id, func=func, kwargs=kwargs)
+
+        deadline = time.monotonic() + INFERENCE_CALL_TIMEOUT
+        while time.monotonic() < deadline:
+            # short blocking pops stay under the shared client's socket timeout
+            reply = await redis_connection.client.blpop([get_reply_key(call_id)], timeout=1)
+            if reply is None:
+                continue
+            ok, value = pickle.loads(reply[1])
+            if not ok:
+                raise value
+            return value
+        raise TimeoutError(f"{func.__name__} got no reply from an inference worker in {INFERENCE_CALL_TIMEOUT:.0f}s")
+
+    async def get(self, timeout: float = 1.0) -> Optional[Job]:
+        try:
+            return await asyncio.get_running_loop().run_in_executor(None, self._queue.get, True, timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        if self._queue is not None:
+            self._queue.close()
+
+
+inference_queue = InferenceQueue()
@@ -0,0 +1,28 @@
+import time
+from typing import Optional
+
+from tasks.task_manager import task_manager
+
+
+class TaskCancelled(Exception):
+    def __init__(self, message_key: str, stage: str):
+        self.message_key = message_key
+        self.stage = stage
+        super().__init__(self.message_key)
+
+
+class TaskCheckpoint:
+    def __init__(self, task_id: str, deadline: Optional[float] = None):
+        self.task_id = task_id
+        self.deadline = deadline
+
+    def is_expired(self) -> bool:
+        return self.deadline is not None and time.time() > self.deadline
+
+    async def __call__(self, stage: str):
+        if self.is_expired():
+            print(f"Task {self.task_id} dropped at {stage}: deadline exceeded")
+            raise TaskCancelled("errors.tasks.deadline_exceeded", stage)
+        if await task_manager.is_cancelled(self.task_id):
+            print(f"Task {self.task_id} dropped at {stage}: cancelled")
+            raise TaskCancelled("errors.tasks.task_cancelled", stage)
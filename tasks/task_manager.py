@@ -1,20 +1,34 @@
 import json
+import os
 import uuid
 from datetime import datetime, timedelta
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 
-import redis.asyncio as redis
+from dotenv import load_dotenv
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
 
 from data.schemas import TaskStatus
+from storage.redis_client import redis_connection
+
+load_dotenv()
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", 900))
+
+IN_FLIGHT_STATUSES = (TaskStatus.PENDING, TaskStatus.PROCESSING)
 
 
 class TaskManager:
-    def __init__(self):
-        self.redis = redis.Redis(host='localhost', port=6379, db=0)
+    def __init__(self, ttl_seconds: int = 3600, dedupe_ttl_seconds: int = IDEMPOTENCY_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.dedupe_ttl_seconds = dedupe_ttl_seconds
 
-    async def create_task(self, user_id: int) -> str:
-        task_id = str(uuid.uuid4())
+    @property
+    def redis(self) -> Redis:
+        return redis_connection.client
 
+    def build_task_data(self, task_id: str, user_id: int, parent_id: Optional[str] = None,
+                        children: Optional[List[str]] = None, deadline: Optional[float] = None,
+                        trace_id: Optional[str] = None) -> Dict:
         task_data = {
             'task_id': task_id,
             'user_id': user_id,
@@ -24,38 +38,120 @@ class TaskManager:
             'updated_at': datetime.now().isoformat(),
             'progress': 0
         }
+        if parent_id:
+            task_data['parent_id'] = parent_id
+        if children:
+            task_data['children'] = children
+        if deadline is not None:
+            task_data['deadline'] = deadline
+        if trace_id:
+            task_data['trace_id'] = trace_id
+        return task_data
+
+    async def create_task(self, user_id: int, deadline: Optional[float] = None, trace_id: Optional[str] = None) -> str:
+        task_id = str(uuid.uuid4())
 
         await self.redis.setex(
             f"task:{task_id}",
-            3600,
-            json.dumps(task_data)
+            self.ttl_seconds,
+            json.dumps(self.build_task_data(task_id, user_id, deadline=deadline, trace_id=trace_id))
         )
 
         return task_id
 
+    @staticmethod
+    def get_dedupe_key(user_id: int, dedupe_key: str) -> str:
+        return f"dedupe:task:{user_id}:{dedupe_key}"
+
+    @staticmethod
+    def can_attach(status: TaskStatus, replay_completed: bool) -> bool:
+        # an explicit Idempotency-Key replays the finished task, identical content only joins a running one:
+        # a completed result may already be evicted by the result store quotas
+        return status in IN_FLIGHT_STATUSES or (replay_completed and status == TaskStatus.COMPLETED)
+
+    async def find_dedupe_task(self, user_id: int, dedupe_key: str, replay_completed: bool = True) -> Optional[Dict]:
+        task_id = await self.redis.get(self.get_dedupe_key(user_id, dedupe_key))
+        if not task_id:
+            return None
+
+        task = await self.get_task(task_id.decode("utf-8"))
+        if not task or not self.can_attach(task['status'], replay_completed):
+            return None
+        return task
+
+    async def create_or_attach_task(self, user_id: int, dedupe_key: str, deadline: Optional[float] = None,
+                                    trace_id: Optional[str] = None,
+                                    replay_completed: bool = True) -> tuple[Dict, bool]:
+        key = self.get_dedupe_key(user_id, dedupe_key)
+
+        while True:
+            task_id = str(uuid.uuid4())
+            task_data = self.build_task_data(task_id, user_id, deadline=deadline, trace_id=trace_id)
+            await self.redis.setex(f"task:{task_id}", self.ttl_seconds, json.dumps(task_data))
+            if await self.redis.set(key, task_id, nx=True, ex=self.dedupe_ttl_seconds):
+                return task_data, True
+
+            await self.redis.delete(f"task:{task_id}")
+            existing = await self.find_dedupe_task(user_id, dedupe_key, replay_completed)
+            if existing:
+                return existing, False
+
+            async def drop_stale(pipe: Pipeline):
+                stale_id = await pipe.get(key)
+                existing_task = await pipe.get(f"task:{stale_id.decode('utf-8')}") if stale_id else None
+                if existing_task and self.can_attach(json.loads(existing_task)['status'], replay_completed):
+                    return
+                pipe.multi()
+                pipe.delete(key)
+
+            await redis_connection.transaction(drop_stale, key)
+
+    async def create_batch_task(self, user_id: int, count: int, deadline: Optional[float] = None,
+                                trace_id: Optional[str] = None) -> tuple[str, List[str]]:
+        task_id = str(uuid.uuid4())
+        child_ids = [str(uuid.uuid4()) for _ in range(count)]
+
+        async with redis_connection.pipeline(transaction=True) as pipe:
+            pipe.setex(f"task:{task_id}", self.ttl_seconds,
+                       json.dumps(self.build_task_data(task_id, user_id, children=child_ids, deadline=deadline,
+                                                       trace_id=trace_id)))
+            for child_id in child_ids:
+                pipe.setex(f"task:{child_id}", self.ttl_seconds,
+                           json.dumps(self.build_task_data(child_id, user_id, parent_id=task_id, deadline=deadline,
+                                                           trace_id=trace_id)))
+            await redis_connection.execute_pipeline(pipe)
+
+        return task_id, child_ids
+
     async def update_task(self, task_id: str, status: Optional[TaskStatus] = None, message: Optional[str] = None,
                           progress: Optional[int] = None, result: Optional[Dict] = None) -> bool:
         key = f"task:{task_id}"
-        raw_data = await self.redis.get(key)
 
-        if not raw_data:
-            return False
+        async def apply(pipe: Pipeline) -> bool:
+            raw_data = await pipe.get(key)
+            if not raw_data:
+                return False
+
+            task_data = json.loads(raw_data)
+            if task_data['status'] == TaskStatus.CANCELLED and status != TaskStatus.CANCELLED:
+                return False
 
-        task_data = json.loads(raw_data)
+            if status:
+                task_data['status'] = status
+            if message:
+                task_data['message'] = message
+            if progress is not None:
+                task_data['progress'] = progress
+            if result:
+                task_data['result'] = result
 
-        if status:
-            task_data['status'] = status
-        if message:
-            task_data['message'] = message
-        if progress is not None:
-            task_data['progress'] = progress
-        if result:
-            task_data['result'] = result
+            task_data['updated_at'] = datetime.now().isoformat()
 
-        task_data['updated_at'] = datetime.now().isoformat()
+            pipe.multi()
+            pipe.setex(key, self.ttl_seconds, json.dumps(task_data))
+            return True
 
-        await self.redis.setex(key, 3600, json.dumps(task_data))
-        return True
+        return await redis_connection.transaction(apply, key)
 
     async def get_task(self, task_id: str) -> Optional[Dict]:
         raw_data = await self.redis.get(f"task:{task_id}")
@@ -63,17 +159,45 @@ class TaskManager:
             return None
         return json.loads(raw_data)
 
+    async def cancel_task(self, task_id: str, message: str) -> Optional[Dict]:
+        task = await self.get_task(task_id)
+        if not task:
+            return None
+        if task['status'] in (TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED):
+            return task
+
+        for child_id in [task_id, *task.get('children', [])]:
+            await self.update_task(child_id, status=TaskStatus.CANCELLED, message=message)
+        return await self.get_task(task_id)
+
+    async def is_cancelled(self, task_id: str) -> bool:
+        task = await self.get_task(task_id)
+        return task is not None and task['status'] == TaskStatus.CANCELLED
+
+    async def get_tasks(self, task_ids: List[str]) -> List[Optional[Dict]]:
+        if not task_ids:
+            return []
+        return [json.loads(raw_data) if raw_data else None
+                for raw_data in await self.redis.mget([f"task:{task_id}" for task_id in task_ids])]
+
     async def cleanup_old_tasks(self, hours_old: int = 24):
         cutoff = datetime.now().timestamp() - (hours_old * 3600)
 
+        keys = [key async for key in self.redis.scan_iter("task:*", count=500)]
+        if not keys:
+            return
+
         tasks_to_remove = []
-        async for task_id in self.redis.scan_iter("task:*"):
-            task = await self.redis.get(f"task:{task_id}")
-            created_at = datetime.fromisoformat(task['created_at']).timestamp()
+        for key, raw_data in zip(keys, await self.redis.mget(keys)):
+            if not raw_data:
+                continue
+            created_at = datetime.fromisoformat(json.loads(raw_data)['created_at']).timestamp()
             if created_at < cutoff:
-                tasks_to_remove.append(task_id)
+                tasks_to_remove.append(key)
 
-        for task_id in tasks_to_remove:
-            await self.redis.delete(f"task:{task_id}")
+        async with redis_connection.pipeline(transaction=False) as pipe:
+            for key in tasks_to_remove:
+                pipe.delete(key)
+            await redis_connection.execute_pipeline(pipe)
 
 task_manager = TaskManager()
\ No newline at end of file
@@ -0,0 +1,100 @@
+import asyncio
+
+import fakeredis
+import pytest
+
+from files.file_manager import FileManager
+from files.result_store import ResultStore
+from files.storage_backend import MemoryStorageBackend
+from storage.redis_client import redis_connection
+
+
+@pytest.fixture
+def fake_redis():
+    redis_connection._client = fakeredis.FakeAsyncRedis()
+    yield
+    redis_connection._client = None
+
+
+def collect(backend, key: str, **kwargs) -> bytes:
+    async def read():
+        return b"".join([chunk async for chunk in backend.iter_chunks(key, **kwargs)])
+    return asyncio.run(read())
+
+
+def test_memory_backend_put_exists_delete(tmp_path):
+    backend = MemoryStorageBackend()
+    file_path = tmp_path / "result.png"
+    file_path.write_bytes(b"from file")
+
+    asyncio.run(backend.put_bytes("a/bytes.png", b"from bytes"))
+    asyncio.run(backend.put_file("a/file.png", file_path))
+
+    assert asyncio.run(backend.exists("a/bytes.png"))
+    assert asyncio.run(backend.get_bytes("a/file.png")) == b"from file"
+
+    asyncio.run(backend.delete("a/bytes.png"))
+    asyncio.run(backend.delete("a/missing.png"))
+    assert not asyncio.run(backend.exists("a/bytes.png"))
+    assert asyncio.run(backend.exists("a/file.png"))
+
+
+def test_memory_backend_ranged_chunks():
+    backend = MemoryStorageBackend()
+    data = bytes(range(256)) * 4
+    asyncio.run(backend.put_bytes("blob", data))
+
+    assert collect(backend, "blob", chunk_size=100) == data
+    assert collect(backend, "blob", chunk_size=7, start=10, length=50) == data[10:60]
+    assert collect(backend, "blob", start=1000) == data[1000:]
+    assert collect(backend, "blob", start=10, length=0) == b""
+
+    async def chunk_sizes():
+        return [len(chunk) async for chunk in backend.iter_chunks("blob", chunk_size=300, start=24)]
+    assert asyncio.run(chunk_sizes()) == [300, 300, 300, 100]
+
+
+def test_result_written_on_one_node_is_read_on_another(tmp_path, fake_redis):
+    # two nodes with their own local directories sharing one object store and one Redis
+    shared = MemoryStorageBackend()
+    writer_manager = FileManager(base_path=str(tmp_path / "writer"))
+    reader_manager = FileManager(base_path=str(tmp_path / "reader"))
+    writer_manager.results_backend = shared
+    reader_manager.results_backend = shared
+    writer, reader = ResultStore(writer_manager), ResultStore(reader_manager)
+
+    async def scenario():
+        stored = await writer.put(7, b"annotated image", ref_id="ref1")
+        assert stored.path is None
+
+        resolved = await reader.resolve(7, "ref1")
+        assert resolved is not None and resolved.key == stored.key
+        assert await reader.read_image(7, "ref1.png") == b"annotated image"
+        assert await reader.resolve(8, "ref1") is None
+
+        assert await reader.release("ref1")
+        assert not await shared.exists(stored.key)
+        assert await writer.resolve(7, "ref1") is None
+
+    asyncio.run(scenario())
+
+
+def test_shared_blob_survives_until_last_ref_is_released(fake_redis, tmp_path):
+    shared = MemoryStorageBackend()
+    managers = [FileManager(base_path=str(tmp_path / name)) for name in ("a", "b")]
+    for manager in managers:
+        manager.results_backend = shared
+    first, second = (ResultStore(manager) for manager in managers)
+
+    async def scenario():
+        stored = await first.put(1, b"same bytes", ref_id="one")
+        await second.put(2, b"same bytes", ref_id="two")
+        assert list(shared.objects) == [stored.key]
+
+        await second.release("one")
+        assert await first.read_image(2, "two.png") == b"same bytes"
+
+        await first.release("two")
+        assert not shared.objects
+
+    asyncio.run(scenario())
@@ -1,4 +1,6 @@
+import json
 from abc import ABC, abstractmethod
+from functools import lru_cache
 from pathlib import Path
 from typing import Dict, Any
 
@@ -15,10 +17,14 @@ class BaseTranslator(ABC):
         pass
 
 class JsonTranslator(BaseTranslator):
-    def __init__(self, translations_path: str = "locales"):
+    def __init__(self, translations_path: str = "locales", default_lang: str = "en"):
         self.translations_path = Path(translations_path)
+        self.default_lang = default_lang
         self._cache: Dict[str, Dict[str, Any]] = {}
+        self._index: Dict[tuple[Platform, str, str], str] = {}
         self._load_all()
+        self._compile_index()
+        self.negotiate = lru_cache(maxsize=512)(self._negotiate)
 
     def _load_all(self):
         for lang_dir in self.translations_path.iterdir():
@@ -29,34 +35,79 @@ class JsonTranslator(BaseTranslator):
                     file_path = lang_dir / f"{platform.value}.json"
                     if file_path.exists():
                         with open(file_path, 'r', encoding='utf-8') as f:
-                            import json
                             self._cache[lang][platform.value] = json.load(f)
 
-    def translate(self, key: str, platform: Platform, lang: str = "en", **params) -> str:
-        translations = self._cache.get(lang, {}).get(platform.value, {})
-        parts = key.split(".")
-        value = translations
+    def _compile_index(self):
+        flat: Dict[tuple[str, str], Dict[str, str]] = {}
+        for lang, platforms in self._cache.items():
+            for platform, translations in platforms.items():
+                flat[(platform, lang)] = dict(self._flatten(translations))
+
+        for lang in self._cache:
+            for platform in Platform:
+                templates = dict(flat.get((platform.value, self.default_lang), {}))
+                templates.update(flat.get((platform.value, lang), {}))
+                for key, template in templates.items():
+                    self._index[(platform, lang, key)] = template
 
-        for part in parts:
+    @staticmethod
+    def _flatten(translations: Dict[str, Any], prefix: str = ""):
+        for name, value in translations.items():
+            key = f"{prefix}{name}"
             if isinstance(value, dict):
-                value = value.get(part)
-            else:
-                value = None
-                break
+                yield from JsonTranslator._flatten(value, f"{key}.")
+            elif isinstance(value, str):
+                yield key, value
+
+    def _negotiate(self, accept_language: str) -> str:
+        candidates = []
+        for position, part in enumerate(accept_language.split(",")):
+            tag, _, params = part.partition(";")
+            tag = tag.strip().lower()
+            if not tag:
+                continue
+
+            quality = 1.0
+            for param in params.split(";"):
+                name, _, value = param.partition("=")
+                if name.strip() == "q":
+                    try:
+                        quality = float(value)
+                    except ValueError:
+                        quality = 0.0
+
+            if quality > 0:
+                candidates.append((-quality, position, tag))
+
+        for _, _, tag in sorted(candidates):
+            if tag == "*":
+                return self.default_lang
+            if tag in self._cache:
+                return tag
+            primary = tag.split("-")[0].split("_")[0]
+            if primary in self._cache:
+                return primary
+
+        return self.default_lang
+
+    def translate(self, key: str, platform: Platform, lang: str = "en", **params) -> str:
+        template = self._index.get((platform, lang, key))
 
-        if value is None and lang != "en":
-            return self.translate(key, platform, "en", **params)
+        if template is None:
+            template = self._index.get((platform, self.negotiate(lang or self.default_lang), key))
+            if template is None:
+                return key
 
-        if value is None or not isinstance(value, str):
-            return key
+        if not params:
+            return template
 
         try:
-            return value.format(**params) if params else value
+            return template.format(**params)
         except KeyError:
-            return value
+            return template
 
     def get_available_languages(self) -> list[str]:
         return list(self._cache.keys())
 
 
-translator = JsonTranslator(translations_path="locales")
\ No newline at end of file
+translator = JsonTranslator(translations_path="locales")